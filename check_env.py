@@ -69,7 +69,20 @@ def check_modules():
         'jellyfin_client.py', 
         'movie_nfo_updater.py',
         'nfo_writer.py',
-        'sync_v2_simple.py'
+        'sync_v2_simple.py',
+        'tag_table.py',
+        'sync_planner.py',
+        'metadata_parser.py',
+        'nfo_state.py',
+        'multi_sync.py',
+        'profiling.py',
+        'log_utils.py',
+        'work_queue.py',
+        'queue_sync.py',
+        'nfo_watcher.py',
+        'refresh_planner.py',
+        'listing_cache.py',
+        'eagle_api_reader.py'
     ]
     
     all_ok = True
@@ -6,6 +6,13 @@ EagleToJellyfin 主入口
 用法示例：
   python main.py sync                      # 使用默认 simple 模式（推荐）
   python main.py sync --dry-run            # 模拟运行
+  python main.py sync --repair             # 只修复被Jellyfin重写的movie.nfo
+  python main.py sync --plan               # 只计算变更集合与刷新策略（报告写入 v2/state/plan.json）
+  python main.py sync --profile            # 分阶段剖析（报告写入 v2/profiles/）
+  python main.py sync --eagle-folder 电影  # 只同步某个Eagle文件夹（另有 --tag、--path-prefix）
+  python main.py sync --since-last-sync    # 只同步上次完整同步之后在Eagle中修改过的条目
+  python main.py sync --time-budget 600    # 限时运行，剩余变更留给下次
+  python main.py sync --enqueue            # 变更写入任务队列，多个进程/主机运行 sync --worker 分担
   python main.py sync --mode legacy        # 旧流程（仅供兼容）
   python main.py schedule                  # 创建计划任务（调用 v2/setup_task.ps1）
   
@@ -16,7 +23,6 @@ EagleToJellyfin 主入口
 import argparse
 import sys
 from pathlib import Path
-import subprocess
 
 # 将 v2 目录加入路径
 ROOT = Path(__file__).parent
@@ -26,17 +32,15 @@ if str(V2_DIR) not in sys.path:
 
 
 def run_sync_simple(extra_args=None) -> int:
-    """运行 v2 简化版同步脚本"""
-    cmd = [sys.executable, str(V2_DIR / 'sync_v2_simple.py')]
-    if extra_args:
-        cmd.extend(extra_args)
-    proc = subprocess.run(cmd)
-    return proc.returncode
+    """在当前进程内运行 v2 简化版同步（避免再启动一个解释器）"""
+    import sync_v2_simple
+    return sync_v2_simple.main(extra_args or [])
 
 
 def run_sync_legacy(extra_args=None) -> int:
     """运行 v2 旧流程（包含同名NFO与两段刷新）"""
     # 兼容：保留 v2/sync.py，可选择使用
+    import subprocess
     cmd = [sys.executable, str(V2_DIR / 'sync.py')]
     if extra_args:
         cmd.extend(extra_args)
@@ -51,6 +55,7 @@ def run_schedule() -> int:
         print(f"找不到脚本: {ps1}")
         return 1
     # 使用 PowerShell 执行脚本
+    import subprocess
     cmd = [
         'pwsh',
         '-NoProfile',
@@ -67,6 +72,20 @@ def main():
     p_sync = sub.add_parser('sync', help='执行标签同步')
     p_sync.add_argument('--mode', choices=['simple', 'legacy'], default='simple', help='同步模式（默认simple）')
     p_sync.add_argument('--dry-run', action='store_true', help='模拟运行')
+    p_sync.add_argument('--repair', action='store_true', help='只修复被Jellyfin重写的movie.nfo（仅simple模式）')
+    p_sync.add_argument('--plan', action='store_true', help='只计算变更集合、刷新策略与预计请求数（仅simple模式）')
+    p_sync.add_argument('--plan-format', choices=['json', 'csv'], default='json', help='计划报告格式')
+    p_sync.add_argument('--plan-output', help='计划报告路径（- 表示标准输出）')
+    p_sync.add_argument('--eagle-folder', action='append', default=[], help='只同步该Eagle文件夹（含子文件夹），可重复')
+    p_sync.add_argument('--tag', action='append', default=[], help='只同步带有该标签的条目，可重复')
+    p_sync.add_argument('--path-prefix', action='append', default=[], help='只同步路径以该前缀开头的条目，可重复')
+    p_sync.add_argument('--since-last-sync', action='store_true', help='只同步上次完整同步之后修改过的条目（仅simple模式）')
+    p_sync.add_argument('--time-budget', type=float, help='时间预算（秒），按修改时间从新到旧处理变更（仅simple模式）')
+    p_sync.add_argument('--enqueue', action='store_true', help='计算变更并写入任务队列（仅simple模式）')
+    p_sync.add_argument('--worker', action='store_true', help='领取并执行任务队列中的任务（仅simple模式）')
+    p_sync.add_argument('--queue', help='任务队列文件路径')
+    p_sync.add_argument('--profile', action='store_true', help='分阶段 cProfile 剖析（仅simple模式）')
+    p_sync.add_argument('--profile-memory', action='store_true', help='剖析时同时记录内存分配（tracemalloc）')
     p_sync.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
 
     sub.add_parser('schedule', help='创建计划任务')
@@ -77,6 +96,43 @@ def main():
         extra = []
         if args.dry_run:
             extra.append('--dry-run')
+        if args.repair:
+            if args.mode != 'simple':
+                parser.error('--repair 仅支持 simple 模式')
+            extra.append('--repair')
+        if args.plan:
+            if args.mode != 'simple':
+                parser.error('--plan 仅支持 simple 模式')
+            extra.extend(['--plan', '--plan-format', args.plan_format])
+            if args.plan_output:
+                extra.extend(['--plan-output', args.plan_output])
+        subset_args = (
+            [('--eagle-folder', value) for value in args.eagle_folder]
+            + [('--tag', value) for value in args.tag]
+            + [('--path-prefix', value) for value in args.path_prefix]
+        )
+        if subset_args and args.mode != 'simple':
+            parser.error('--eagle-folder/--tag/--path-prefix 仅支持 simple 模式')
+        for option, value in subset_args:
+            extra.extend([option, value])
+        if args.since_last_sync:
+            if args.mode != 'simple':
+                parser.error('--since-last-sync 仅支持 simple 模式')
+            extra.append('--since-last-sync')
+        if args.time_budget is not None:
+            if args.mode != 'simple':
+                parser.error('--time-budget 仅支持 simple 模式')
+            extra.extend(['--time-budget', str(args.time_budget)])
+        if args.enqueue or args.worker:
+            if args.mode != 'simple':
+                parser.error('--enqueue/--worker 仅支持 simple 模式')
+            extra.append('--enqueue' if args.enqueue else '--worker')
+            if args.queue:
+                extra.extend(['--queue', args.queue])
+        if args.profile or args.profile_memory:
+            if args.mode != 'simple':
+                parser.error('--profile 仅支持 simple 模式')
+            extra.append('--profile-memory' if args.profile_memory else '--profile')
         if args.log_level:
             extra.extend(['--log-level', args.log_level])
         if args.mode == 'simple':
@@ -0,0 +1,864 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准测试脚本
+使用合成数据衡量各模块在大型库上的表现
+
+用法示例：
+  python benchmark.py memory                     # 10万条目的内存占用对比
+  python benchmark.py memory --items 200000
+  python benchmark.py memory --library E:\\Medias.library   # 使用真实Eagle库
+  python benchmark.py tagdiff                    # 标签对比耗时对比
+  python benchmark.py importtime                 # 检查导入耗时预算（超出时返回非零）
+  python benchmark.py metadata                   # metadata.json 解析耗时对比
+  python benchmark.py logging                    # 逐条目日志：同步写入 vs 队列 + 批量汇总
+  python benchmark.py eagleapi                   # 扫描库目录 vs 通过替身Eagle API分页读取
+  python benchmark.py regress                    # 回归基准：记录历史并与基线比较（回归时返回非零）
+  python benchmark.py regress --set-baseline     # 把本次结果设为新的基线
+"""
+
+import argparse
+import gc
+import io
+import json
+import logging
+import os
+import platform
+import queue
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import metadata_parser
+from eagle_reader import EagleReader, MediaItem
+from log_utils import DATE_FORMAT, LOG_FORMAT, BatchedChangeLog
+from tag_table import TagTable
+
+# 导入同步模块时不应加载的重量级模块（只在进入Jellyfin阶段时才需要）
+LAZY_MODULES = ('requests', 'jellyfin_client')
+
+
+def make_raw_records(count: int, seed: int = 42) -> List[Tuple[str, str, str, List[str]]]:
+    """
+    生成模拟 metadata.json 内容的原始记录
+
+    Returns:
+        (.info文件夹名, 媒体文件名, item名称, 标签列表) 的列表
+    """
+    rng = random.Random(seed)
+    vocabulary = [f'标签{i:04d}' for i in range(2000)]
+    records = []
+    for i in range(count):
+        item_name = f'video_{i:07d}'
+        tags = rng.sample(vocabulary, rng.randint(0, 8))
+        records.append((f'K{i:012X}.info', f'{item_name}.mp4', item_name, tags))
+    return records
+
+
+def _parsed(text: str) -> str:
+    """模拟逐个 json.load 时每个文件都会生成新的字符串对象"""
+    return text.encode('utf-8').decode('utf-8')
+
+
+def build_dict_items(records, root: str) -> List[dict]:
+    """按旧的字典结构构造媒体项"""
+    return [
+        {
+            'file_path': os.path.join(root, folder_name, file_name),
+            'file_name': _parsed(file_name),
+            'tags': [_parsed(tag) for tag in tags],
+            'item_name': _parsed(item_name),
+            'folder_path': os.path.join(root, folder_name)
+        }
+        for folder_name, file_name, item_name, tags in records
+    ]
+
+
+def build_compact_items(records, root: str) -> List[MediaItem]:
+    """按紧凑结构构造媒体项"""
+    table = TagTable()
+    return [
+        MediaItem(root, _parsed(folder_name), _parsed(file_name), _parsed(item_name),
+                  table.encode(_parsed(tag) for tag in tags), table)
+        for folder_name, file_name, item_name, tags in records
+    ]
+
+
+def measure_memory(builder: Callable, *args) -> int:
+    """返回构造结果常驻的内存占用（字节）"""
+    gc.collect()
+    tracemalloc.start()
+    result = builder(*args)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def bench_memory(args) -> int:
+    """对比旧字典结构与紧凑结构的内存占用"""
+    if args.library:
+        root = str(Path(args.library) / 'images')
+        records = [(item.folder_name, item.file_name, item.item_name, list(item.tags))
+                   for item in EagleReader(args.library).read_all_media_files()]
+    else:
+        root = 'E:\\Medias.library\\images'
+        records = make_raw_records(args.items, seed=args.seed)
+
+    dict_bytes = measure_memory(build_dict_items, records, root)
+    compact_bytes = measure_memory(build_compact_items, records, root)
+
+    count = len(records)
+    print(f"媒体项数量: {count}")
+    print(f"字典结构:   {dict_bytes / 1024 / 1024:8.2f} MB  ({dict_bytes / max(count, 1):.0f} B/项)")
+    print(f"紧凑结构:   {compact_bytes / 1024 / 1024:8.2f} MB  ({compact_bytes / max(count, 1):.0f} B/项)")
+    if dict_bytes:
+        print(f"减少:       {(1 - compact_bytes / dict_bytes) * 100:8.1f} %")
+    return 0
+
+
+def bench_tag_diff(args) -> int:
+    """对比字符串集合与整数Id元组两种标签对比方式的耗时"""
+    records = make_raw_records(args.items, seed=args.seed)
+    table = TagTable()
+    # 模拟"Eagle当前标签"与"NFO已有标签"，约 1% 的条目有变化
+    rng = random.Random(args.seed)
+    pairs = []
+    for _, _, _, tags in records:
+        existing = list(tags)
+        if existing and rng.random() < 0.01:
+            existing.pop()
+        pairs.append((tags, existing))
+
+    start = time.perf_counter()
+    changed = 0
+    for current, existing in pairs:
+        current_set = set(current)
+        existing_set = set(existing)
+        if current_set - existing_set or existing_set - current_set:
+            changed += 1
+    str_elapsed = time.perf_counter() - start
+
+    # Eagle当前标签在读取时已编码；NFO中的已有标签是字符串，构造集合计入耗时
+    current_ids = [table.encode(current) for current, _ in pairs]
+    start = time.perf_counter()
+    id_changed = 0
+    for ids, (_, existing) in zip(current_ids, pairs):
+        added, removed = table.diff(ids, set(existing))
+        if added or removed:
+            id_changed += 1
+    id_elapsed = time.perf_counter() - start
+
+    assert changed == id_changed
+    print(f"媒体项数量: {len(pairs)}，有变化: {changed}")
+    print(f"字符串集合: {str_elapsed * 1000:8.1f} ms")
+    print(f"Id元组:     {id_elapsed * 1000:8.1f} ms")
+    return 0
+
+
+def bench_import_time(args) -> int:
+    """
+    用 python -X importtime 测量导入同步模块的耗时，超出预算或提前导入了重量级模块时返回非零
+    """
+    v2_dir = Path(__file__).parent
+    code = f"import sys; sys.path.insert(0, {str(v2_dir)!r}); import sync_v2_simple"
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        print(proc.stderr)
+        return 1
+
+    # 每行格式: import time: self [us] | cumulative | imported package（包名前的缩进表示嵌套层级）
+    timings = {}
+    top_level = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = int(cumulative)
+        if not name[1:].startswith(' '):
+            top_level[name.strip()] = int(cumulative)
+
+    total_ms = timings.get('sync_v2_simple', 0) / 1000
+    print(f"导入 sync_v2_simple 耗时: {total_ms:.1f} ms（预算 {args.budget_ms:.0f} ms）")
+    print("最慢的顶层模块:")
+    for name, us in sorted(top_level.items(), key=lambda kv: kv[1], reverse=True)[:10]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    ok = True
+    eager = [name for name in LAZY_MODULES if name in timings]
+    if eager:
+        print(f"✗ 以下模块应延迟导入: {', '.join(eager)}")
+        ok = False
+    if total_ms > args.budget_ms:
+        print("✗ 超出导入耗时预算")
+        ok = False
+    if ok:
+        print("✓ 导入耗时检查通过")
+    return 0 if ok else 1
+
+
+def make_metadata(index: int, rng: random.Random) -> dict:
+    """生成一份贴近真实Eagle的 metadata.json 内容（含 palettes、annotation、url 等大字段）"""
+    return {
+        'id': f'K{index:012X}',
+        'name': f'video_{index:07d}',
+        'size': rng.randint(10 ** 6, 10 ** 10),
+        'btime': 1700000000000 + index,
+        'mtime': 1700000000000 + index,
+        'ext': 'mp4',
+        'tags': rng.sample([f'标签{i:04d}' for i in range(200)], rng.randint(0, 8)),
+        'folders': [f'F{rng.randint(0, 50):08X}'],
+        'isDeleted': False,
+        'url': 'https://example.com/' + 'x' * rng.randint(50, 400),
+        'annotation': '注释' * rng.randint(0, 1000),
+        'modificationTime': 1700000000000 + index,
+        'duration': rng.random() * 7200,
+        'height': 1080,
+        'width': 1920,
+        'lastModified': 1700000000000 + index,
+        'palettes': [
+            {'color': [rng.randint(0, 255) for _ in range(3)], 'ratio': rng.randint(1, 60), '$$hashKey': f'object:{i}'}
+            for i in range(rng.randint(5, 12))
+        ]
+    }
+
+
+def make_synthetic_library(library_path: str, count: int, seed: int = 42) -> Path:
+    """
+    在磁盘上生成合成Eagle库（images/*.info/metadata.json + 媒体文件 + 缩略图）
+
+    Returns:
+        Eagle库路径
+    """
+    rng = random.Random(seed)
+    library = Path(library_path)
+    images = library / 'images'
+    images.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        metadata = make_metadata(i, rng)
+        info_dir = images / f"{metadata['id']}.info"
+        info_dir.mkdir(exist_ok=True)
+        with open(info_dir / 'metadata.json', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        (info_dir / f"{metadata['name']}.mp4").write_bytes(b'')
+        (info_dir / f"{metadata['name']}_thumbnail.png").write_bytes(b'')
+    return library
+
+
+def bench_metadata(args) -> int:
+    """对比逐个 json.load 与解析层（各后端）读取 metadata.json 的耗时"""
+    with tempfile.TemporaryDirectory() as tmp:
+        library = Path(args.library) if args.library else make_synthetic_library(tmp, args.files, args.seed)
+        files = [str(p) for p in (library / 'images').glob('*.info/metadata.json')]
+        total_bytes = sum(os.path.getsize(p) for p in files)
+        print(f"metadata.json 数量: {len(files)}，平均 {total_bytes / max(len(files), 1) / 1024:.1f} KB")
+
+        def run_baseline():
+            for path in files:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                data.get('name'), data.get('ext'), data.get('tags')
+
+        def run_parser():
+            for path in files:
+                metadata_parser.read_metadata(path)
+
+        candidates = [('json.load（原实现）', None, run_baseline)]
+        for backend in metadata_parser.available_backends():
+            candidates.append((f'解析层 [{backend}]', backend, run_parser))
+
+        original_backend = metadata_parser.get_backend()
+        try:
+            for label, backend, func in candidates:
+                if backend:
+                    metadata_parser.set_backend(backend)
+                func()  # 预热文件系统缓存
+                elapsed = min(_timed(func) for _ in range(args.repeat))
+                print(f"{label:<20} {elapsed * 1000:8.1f} ms  {len(files) / elapsed:10.0f} 文件/秒")
+        finally:
+            metadata_parser.set_backend(original_backend)
+    return 0
+
+
+class _SlowStream(io.TextIOBase):
+    """模拟较慢的输出目标（Windows 控制台、网络盘上的日志文件）：每次写入固定延迟"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def write(self, text: str) -> int:
+        time.sleep(self.latency)
+        return len(text)
+
+
+def bench_logging(args) -> int:
+    """
+    对比同步合成变更日志的三种方式在热循环中的耗时：
+    每条目同步写入（原实现）、每条目经队列写入、经队列并按批汇总
+    """
+    from logging.handlers import QueueHandler, QueueListener
+
+    latency = args.sink_latency_ms / 1000
+    lines = [f"[video_{i:07d}.mp4] 新增2个, 删除1个" for i in range(args.items)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def make_handlers():
+            formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+            handlers = [
+                logging.FileHandler(os.path.join(tmp, 'bench.log'), encoding='utf-8'),
+                logging.StreamHandler(_SlowStream(latency))
+            ]
+            for handler in handlers:
+                handler.setFormatter(formatter)
+            return handlers
+
+        def run(label: str, queued: bool, batched: bool):
+            logger = logging.getLogger(f'benchmark.logging.{label}')
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            handlers = make_handlers()
+            listener = None
+            if queued:
+                log_queue = queue.Queue(-1)
+                logger.addHandler(QueueHandler(log_queue))
+                listener = QueueListener(log_queue, *handlers)
+                listener.start()
+            else:
+                for handler in handlers:
+                    logger.addHandler(handler)
+
+            start = time.perf_counter()
+            if batched:
+                with BatchedChangeLog(logger, "检测到标签变更") as change_log:
+                    for line in lines:
+                        change_log.add(line)
+            else:
+                for line in lines:
+                    logger.info(f"检测到标签变更 {line}")
+            loop_elapsed = time.perf_counter() - start
+            if listener is not None:
+                listener.stop()
+            total_elapsed = time.perf_counter() - start
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+            for handler in handlers:
+                handler.close()
+            return loop_elapsed, total_elapsed
+
+        print(f"变更条目: {args.items}，模拟控制台写入延迟: {args.sink_latency_ms} ms")
+        baseline = None
+        for label, queued, batched in (('同步逐条（原实现）', False, False),
+                                       ('队列逐条', True, False),
+                                       ('队列 + 批量汇总', True, True)):
+            loop_elapsed, total_elapsed = run(label, queued, batched)
+            if baseline is None:
+                baseline = loop_elapsed
+            print(f"{label:<14} 循环 {loop_elapsed * 1000:9.1f} ms（{baseline / loop_elapsed:6.1f}x）"
+                  f"  含后台写完 {total_elapsed * 1000:9.1f} ms")
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# 回归基准：固定的合成数据集，结果写入历史文件并与基线比较
+# ---------------------------------------------------------------------------
+
+REGRESS_STAGES = ('eagle_reader', 'nfo_writer', 'movie_nfo_create', 'movie_nfo_update', 'jellyfin_client')
+DEFAULT_HISTORY = str(Path(__file__).parent / 'state' / 'benchmark_history.jsonl')
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """当前进程的内存峰值（MB），无法获取时为None"""
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为KB
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class _Counters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = _Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / 1024 / 1024
+    return None
+
+
+class _StandInJellyfinHandler(BaseHTTPRequestHandler):
+    """本地替身Jellyfin服务器：/System/Info、分页 /Items 与逐项刷新，每个请求固定延迟"""
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, data, status: int = 200):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == '/System/Info':
+            return self._send_json({'ServerName': 'benchmark', 'Version': '10.9.0'})
+        if url.path == '/Items':
+            start = int(query.get('StartIndex', 0))
+            limit = int(query.get('Limit', len(self.server.items)))
+            return self._send_json({'Items': self.server.items[start:start + limit],
+                                    'TotalRecordCount': len(self.server.items)})
+        self._send_json({}, 404)
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        if self.path.split('?')[0].endswith('/Refresh'):
+            self.send_response(204)
+            self.end_headers()
+            return
+        self._send_json({}, 404)
+
+
+def start_stand_in_jellyfin(items: List[dict], latency_ms: float = 2.0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    在后台线程启动替身Jellyfin服务器
+
+    Returns:
+        (服务器, 地址)，用完后调用 server.shutdown()
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StandInJellyfinHandler)
+    server.daemon_threads = True
+    server.items = items
+    server.latency = latency_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def bench_eagle_api(args) -> int:
+    """对比扫描库目录（EagleReader）与通过替身Eagle API分页读取（EagleApiReader）的耗时，并核对输出一致"""
+    from eagle_api_check import contract, start_stand_in_eagle
+    from eagle_api_reader import EagleApiReader
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library = Path(args.library) if args.library else make_synthetic_library(tmp, args.items, args.seed)
+        server, url = start_stand_in_eagle(library, args.api_latency_ms)
+        logging.getLogger('eagle_reader').setLevel(logging.WARNING)
+        logging.getLogger('eagle_api_reader').setLevel(logging.WARNING)
+        try:
+            results = {}
+
+            # 预热：文件系统缓存与替身API的页缓存
+            EagleApiReader(str(library), url, page_size=args.page_size).read_all_media_files()
+
+            def run_scanner():
+                results['scanner'] = EagleReader(str(library)).read_all_media_files()
+
+            def run_api():
+                reader = EagleApiReader(str(library), url, page_size=args.page_size)
+                results['api'] = reader.read_all_media_files()
+                results['requests'] = reader.request_count
+
+            scanner_time = min(_timed(run_scanner) for _ in range(args.repeat))
+            api_time = min(_timed(run_api) for _ in range(args.repeat))
+        finally:
+            server.shutdown()
+
+    count = len(results['scanner'])
+    print(f"条目数: {count}（替身API延迟 {args.api_latency_ms} ms/请求，每页 {args.page_size}）")
+    print(f"扫描库目录   {scanner_time * 1000:8.1f} ms  {count / scanner_time:10.0f} 条目/秒")
+    print(f"Eagle API    {api_time * 1000:8.1f} ms  {count / api_time:10.0f} 条目/秒  "
+          f"（{results['requests']} 个请求）")
+    print(f"加速比: {scanner_time / api_time:.2f}x（本地磁盘；网络共享盘上扫描目录更慢）")
+    if contract(results['scanner']) != contract(results['api']):
+        print("✗ 两种读取方式的输出不一致")
+        return 1
+    print("✓ 两种读取方式的输出一致")
+    return 0
+
+
+def _read_items(library: Path) -> List[MediaItem]:
+    """读取合成库（不使用文件名缓存）"""
+    return EagleReader(str(library)).read_all_media_files()
+
+
+def run_regress_stage(stage: str, items: int, repeat: int, seed: int,
+                      server_latency_ms: float) -> dict:
+    """
+    在当前进程中执行一个回归基准阶段（由 bench_regress 在独立子进程中调用，使内存峰值按阶段统计）
+
+    Returns:
+        阶段指标：seconds（多次中最快一次）、items_per_sec、peak_rss_mb，
+        jellyfin_client 另有 requests（每次执行的请求数）
+    """
+    # 被测模块输出的 INFO 日志不计入耗时
+    logging.disable(logging.INFO)
+    from movie_nfo_updater import MovieNFOUpdater
+    from nfo_writer import NFOWriter
+
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        library = make_synthetic_library(tmp, items, seed)
+        timings = []
+        if stage == 'eagle_reader':
+            for _ in range(repeat):
+                timings.append(_timed(lambda: _read_items(library)))
+        elif stage == 'nfo_writer':
+            media_items = _read_items(library)
+            for _ in range(repeat):
+                for nfo in (library / 'images').glob('*.info/*.mp4.nfo'):
+                    nfo.unlink()
+                timings.append(_timed(lambda: NFOWriter.write_all_sidecar_nfos(media_items)))
+        elif stage in ('movie_nfo_create', 'movie_nfo_update'):
+            media_items = _read_items(library)
+            tag_table = media_items[0].tag_table if media_items else TagTable()
+            # 更新阶段在两组标签之间交替（每个条目删除一个标签并新增一个），每次都是完整的更新
+            changed_items = [
+                MediaItem(item.root, item.folder_name, item.file_name, item.item_name,
+                          tag_table.encode(item.tags[1:] + ('基准新增',)), tag_table)
+                for item in media_items
+            ]
+            MovieNFOUpdater.batch_update_movie_nfos(media_items)
+            for index in range(repeat):
+                if stage == 'movie_nfo_create':
+                    for nfo in (library / 'images').glob('*.info/movie.nfo'):
+                        nfo.unlink()
+                    batch = media_items
+                else:
+                    batch = changed_items if index % 2 == 0 else media_items
+                timings.append(_timed(lambda: MovieNFOUpdater.batch_update_movie_nfos(batch)))
+        elif stage == 'jellyfin_client':
+            from jellyfin_client import JellyfinClient
+            media_items = _read_items(library)
+            jellyfin_items = [{'Id': f'{index:032x}', 'Path': item.file_path}
+                              for index, item in enumerate(media_items)]
+            server, url = start_stand_in_jellyfin(jellyfin_items, server_latency_ms)
+            try:
+                for _ in range(repeat):
+                    client = JellyfinClient(url, 'benchmark', 'library')
+
+                    def run_client():
+                        listed = client.get_library_items(fields=['Path'], page_size=500)
+                        client.refresh_items([item['Id'] for item in listed])
+
+                    timings.append(_timed(run_client))
+                    result['requests'] = client.get_metrics()['requests']
+            finally:
+                server.shutdown()
+        else:
+            raise ValueError(f"未知的基准阶段: {stage}")
+
+    seconds = min(timings)
+    result.update({
+        'seconds': round(seconds, 4),
+        'items_per_sec': round(items / seconds, 1) if seconds else None,
+        'peak_rss_mb': _peak_rss_mb()
+    })
+    if result['peak_rss_mb'] is not None:
+        result['peak_rss_mb'] = round(result['peak_rss_mb'], 1)
+    return result
+
+
+def load_history(history_file: str) -> List[dict]:
+    """读取基准历史（JSON Lines，每行一次运行）"""
+    if not os.path.exists(history_file):
+        return []
+    records = []
+    with open(history_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def append_history(history_file: str, record: dict):
+    """追加一次运行的结果到历史文件"""
+    Path(history_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(history_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+BASELINE_METRICS = ('seconds', 'peak_rss_mb', 'requests')
+
+
+def find_baselines(records: List[dict], dataset: dict, stages: List[str],
+                   window: int = 5) -> Dict[str, dict]:
+    """
+    各阶段的基线：同一数据集与平台上最近 window 次记录的中位数
+    （只取最近一次被设为基线的运行及其之后的记录；中位数不受个别偏快或偏慢的样本影响，
+    真正的回归要在超过一半的样本中出现后才会进入基线）
+
+    Returns:
+        阶段名 -> {'metrics': 各指标的中位数, 'runs': 样本数, 'since': 最早样本的时间, 'commit': 最早样本的提交}
+        （没有基线的阶段不包含在内）
+    """
+    samples: Dict[str, List[dict]] = {stage: [] for stage in stages}
+    closed = set()
+    for record in reversed(records):
+        if record.get('dataset') != dataset or record.get('platform') != sys.platform:
+            continue
+        for stage in stages:
+            if stage in closed or stage not in record.get('stages', {}):
+                continue
+            samples[stage].append(record)
+            if stage in record.get('baseline_stages', []) or len(samples[stage]) >= window:
+                closed.add(stage)
+
+    baselines: Dict[str, dict] = {}
+    for stage, stage_records in samples.items():
+        if not stage_records:
+            continue
+        metrics = {}
+        for key in BASELINE_METRICS:
+            values = [r['stages'][stage][key] for r in stage_records if r['stages'][stage].get(key) is not None]
+            if values:
+                metrics[key] = statistics.median(values)
+        baselines[stage] = {'metrics': metrics, 'runs': len(stage_records),
+                            'since': stage_records[-1]['time'], 'commit': stage_records[-1].get('commit', '')}
+    return baselines
+
+
+def compare_to_baseline(current: dict, baselines: Dict[str, dict], time_tolerance: float,
+                        memory_tolerance: float, request_tolerance: float,
+                        time_floor: float = 0.0, min_runs: int = 1) -> List[str]:
+    """
+    与基线比较，返回回归说明列表（为空表示没有回归）
+
+    Args:
+        current: 本次各阶段指标（每个阶段为多次执行中最快一次）
+        baselines: 阶段名 -> 基线（见 find_baselines）
+        time_tolerance: 耗时允许的相对增幅（0.25 表示 25%）
+        memory_tolerance: 内存峰值允许的相对增幅
+        request_tolerance: 请求数允许的相对增幅
+        time_floor: 耗时允许的最小绝对增幅（秒），避免亚秒级阶段的计时抖动被判为回归
+        min_runs: 基线样本少于该次数时不比较耗时（单次样本的计时不可靠；内存与请求数照常比较）
+    """
+    checks = (('seconds', time_tolerance, time_floor, '耗时'),
+              ('peak_rss_mb', memory_tolerance, 0.0, '内存峰值'),
+              ('requests', request_tolerance, 0.0, '请求数'))
+    regressions = []
+    for stage, metrics in current.items():
+        if stage not in baselines:
+            continue
+        base = baselines[stage]['metrics']
+        for key, tolerance, floor, label in checks:
+            value, base_value = metrics.get(key), base.get(key)
+            if value is None or not base_value:
+                continue
+            if key == 'seconds' and baselines[stage]['runs'] < min_runs:
+                continue
+            if value - base_value > max(base_value * tolerance, floor):
+                regressions.append(f"{stage} {label}: {base_value:g} -> {value:g}"
+                                   f"（+{(value / base_value - 1) * 100:.0f}%，允许 +{tolerance * 100:.0f}%）")
+    return regressions
+
+
+def _better_metrics(first: dict, second: dict) -> dict:
+    """两次测量中各指标较好（较小）的值"""
+    merged = dict(second)
+    for key in BASELINE_METRICS:
+        values = [m[key] for m in (first, second) if m.get(key) is not None]
+        if values:
+            merged[key] = min(values)
+    if merged.get('seconds'):
+        merged['items_per_sec'] = max(first.get('items_per_sec') or 0, second.get('items_per_sec') or 0)
+    return merged
+
+
+def _git_commit() -> str:
+    """当前代码的提交（不在git仓库中时为空）"""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=str(Path(__file__).parent),
+                                capture_output=True, text=True, timeout=10)
+        return result.stdout.strip() if result.returncode == 0 else ''
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def bench_regress(args) -> int:
+    """
+    回归基准：在固定的合成数据集上逐阶段测量（每个阶段一个子进程），
+    结果追加到历史文件并与基线比较，超出容差时返回非零
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    stages = args.stage or list(REGRESS_STAGES)
+    dataset = {'items': args.items, 'seed': args.seed, 'server_latency_ms': args.server_latency_ms}
+    print(f"回归基准: {args.items} 个条目（种子 {args.seed}），每阶段 {args.repeat} 次取最快")
+
+    context = multiprocessing.get_context('spawn')
+
+    def measure(stage: str) -> dict:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            metrics = executor.submit(run_regress_stage, stage, args.items, args.repeat,
+                                      args.seed, args.server_latency_ms).result()
+        extra = f"  请求 {metrics['requests']}" if 'requests' in metrics else ''
+        rss = f"{metrics['peak_rss_mb']:.1f} MB" if metrics['peak_rss_mb'] is not None else '-'
+        print(f"  {stage:<18} {metrics['seconds'] * 1000:9.1f} ms  {metrics['items_per_sec']:10.0f} 条目/秒"
+              f"  内存峰值 {rss}{extra}")
+        return metrics
+
+    results = {stage: measure(stage) for stage in stages}
+
+    history = load_history(args.history)
+    baselines = {} if args.set_baseline else find_baselines(history, dataset, stages, args.baseline_window)
+    # 没有基线的阶段以本次结果作为基线
+    baseline_stages = [stage for stage in stages if stage not in baselines]
+
+    def compare(current: dict) -> List[str]:
+        return compare_to_baseline(current, baselines, args.time_tolerance, args.memory_tolerance,
+                                   args.request_tolerance, args.time_floor_ms / 1000,
+                                   args.min_baseline_runs)
+
+    # 疑似回归的阶段重新测量，取较好的一次，排除偶发的机器负载
+    for stage in stages:
+        for _ in range(args.confirm_runs):
+            if not compare({stage: results[stage]}):
+                break
+            print(f"  {stage} 疑似回归，重新测量确认...")
+            results[stage] = _better_metrics(results[stage], measure(stage))
+    regressions = compare(results)
+    record = {
+        'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': sys.platform,
+        'dataset': dataset,
+        'stages': results,
+        'baseline_stages': baseline_stages
+    }
+
+    for stage, base in baselines.items():
+        pending = f"，不足 {args.min_baseline_runs} 次，暂不比较耗时" if base['runs'] < args.min_baseline_runs else ''
+        print(f"  {stage} 基线: 最近 {base['runs']} 次记录的中位数（自 {base['since']}，"
+              f"{base['commit'] or '未知提交'}{pending}）")
+    if not args.no_record:
+        append_history(args.history, record)
+        print(f"结果已追加到 {args.history}")
+        if baseline_stages:
+            print(f"  以下阶段以本次结果为基线: {', '.join(baseline_stages)}")
+
+    if regressions:
+        print("✗ 检测到性能回归:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("✓ 没有超出容差的回归")
+    return 0
+
+
+def _timed(func: Callable) -> float:
+    """执行一次并返回耗时（秒）"""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main(argv=None) -> int:
+    """主函数"""
+    parser = argparse.ArgumentParser(description='EagleToJellyfin 性能基准测试')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_memory = sub.add_parser('memory', help='媒体项内存占用对比')
+    p_memory.add_argument('--items', type=int, default=100000, help='合成媒体项数量（默认100000）')
+    p_memory.add_argument('--seed', type=int, default=42, help='随机种子')
+    p_memory.add_argument('--library', help='使用真实Eagle库代替合成数据')
+
+    p_tag_diff = sub.add_parser('tagdiff', help='标签对比耗时对比')
+    p_tag_diff.add_argument('--items', type=int, default=100000, help='合成媒体项数量（默认100000）')
+    p_tag_diff.add_argument('--seed', type=int, default=42, help='随机种子')
+
+    p_import = sub.add_parser('importtime', help='检查同步模块的导入耗时预算')
+    p_import.add_argument('--budget-ms', type=float, default=150, help='导入耗时预算（毫秒，默认150）')
+
+    p_metadata = sub.add_parser('metadata', help='metadata.json 解析耗时对比')
+    p_metadata.add_argument('--files', type=int, default=5000, help='合成 metadata.json 数量（默认5000）')
+    p_metadata.add_argument('--seed', type=int, default=42, help='随机种子')
+    p_metadata.add_argument('--repeat', type=int, default=3, help='重复次数，取最快一次')
+    p_metadata.add_argument('--library', help='使用真实Eagle库代替合成数据')
+
+    p_logging = sub.add_parser('logging', help='逐条目日志：同步写入 vs 队列 + 批量汇总')
+    p_logging.add_argument('--items', type=int, default=20000, help='变更条目数（默认20000）')
+    p_logging.add_argument('--sink-latency-ms', type=float, default=0.2,
+                           help='模拟每次控制台写入的延迟（毫秒，默认0.2）')
+
+    p_eagle_api = sub.add_parser('eagleapi', help='扫描库目录 vs 通过替身Eagle API分页读取')
+    p_eagle_api.add_argument('--items', type=int, default=5000, help='合成条目数（默认5000）')
+    p_eagle_api.add_argument('--seed', type=int, default=42, help='随机种子')
+    p_eagle_api.add_argument('--repeat', type=int, default=3, help='重复次数，取最快一次')
+    p_eagle_api.add_argument('--page-size', type=int, default=1000, help='API每页条目数（默认1000）')
+    p_eagle_api.add_argument('--api-latency-ms', type=float, default=1.0,
+                             help='替身Eagle API每个请求的延迟（毫秒，默认1）')
+    p_eagle_api.add_argument('--library', help='使用真实Eagle库代替合成数据（替身API读取该库的 metadata.json）')
+
+    p_regress = sub.add_parser('regress', help='回归基准：记录历史并与基线比较')
+    p_regress.add_argument('--items', type=int, default=2000, help='合成条目数（默认2000）')
+    p_regress.add_argument('--seed', type=int, default=42, help='随机种子')
+    p_regress.add_argument('--repeat', type=int, default=3, help='每阶段重复次数，取最快一次（默认3）')
+    p_regress.add_argument('--stage', action='append', choices=REGRESS_STAGES,
+                           help='只运行指定阶段（可重复，默认全部）')
+    p_regress.add_argument('--server-latency-ms', type=float, default=2.0,
+                           help='替身Jellyfin服务器每个请求的延迟（毫秒，默认2）')
+    p_regress.add_argument('--history', default=DEFAULT_HISTORY, help='历史文件（默认 state/benchmark_history.jsonl）')
+    p_regress.add_argument('--time-tolerance', type=float, default=0.25, help='耗时允许的增幅（默认0.25，即25%%）')
+    p_regress.add_argument('--memory-tolerance', type=float, default=0.20, help='内存峰值允许的增幅（默认0.20）')
+    p_regress.add_argument('--time-floor-ms', type=float, default=100,
+                           help='耗时允许的最小绝对增幅（毫秒，默认100），避免亚秒级阶段的计时抖动被判为回归')
+    p_regress.add_argument('--baseline-window', type=int, default=5,
+                           help='基线取最近多少次记录的中位数（默认5）')
+    p_regress.add_argument('--confirm-runs', type=int, default=1,
+                           help='疑似回归的阶段重新测量的次数，取较好的一次（默认1）')
+    p_regress.add_argument('--min-baseline-runs', type=int, default=3,
+                           help='基线样本达到该次数后才比较耗时（默认3）')
+    p_regress.add_argument('--request-tolerance', type=float, default=0.0, help='请求数允许的增幅（默认0）')
+    p_regress.add_argument('--set-baseline', action='store_true', help='把本次结果设为新的基线')
+    p_regress.add_argument('--no-record', action='store_true', help='只比较，不写入历史')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'memory':
+        return bench_memory(args)
+    if args.command == 'tagdiff':
+        return bench_tag_diff(args)
+    if args.command == 'importtime':
+        return bench_import_time(args)
+    if args.command == 'metadata':
+        return bench_metadata(args)
+    if args.command == 'logging':
+        return bench_logging(args)
+    if args.command == 'eagleapi':
+        return bench_eagle_api(args)
+    if args.command == 'regress':
+        return bench_regress(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Eagle API读取器的输出契约检查
+启动本地替身Eagle API，在合成库上分别用 EagleApiReader 与 EagleReader 读取（完整读取与各种子集过滤），
+输出不一致时返回非零；CI 中运行，读取器输出的回归会使检查失败
+
+约定：回收站中的条目（isDeleted）只由 EagleApiReader 排除，对比时从扫描结果中去掉
+
+用法：
+  python eagle_api_check.py
+  python eagle_api_check.py --items 2000 --page-size 100
+"""
+
+import argparse
+import json
+import logging
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from eagle_api_reader import EagleApiReader
+from eagle_reader import EagleReader, MediaItem, ScanFilter
+
+# 合成库的文件夹树：电影/动画 是 电影 的子文件夹
+FOLDERS = [
+    {'id': 'FMOVIE', 'name': '电影', 'children': [{'id': 'FANIME', 'name': '动画', 'children': []}]},
+    {'id': 'FCLIP', 'name': '片段', 'children': []}
+]
+BASE_TIME = 1700000000000
+
+
+class _StandInEagleHandler(BaseHTTPRequestHandler):
+    """本地替身Eagle API：/api/library/info 与分页的 /api/item/list（offset 为页码），每个请求固定延迟"""
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, data, status: int = 200):
+        self._send_body(json.dumps({'status': 'success', 'data': data}, ensure_ascii=False).encode('utf-8'),
+                        status)
+
+    def _send_body(self, body: bytes, status: int = 200):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == '/api/library/info':
+            return self._send_json({'folders': self.server.folders,
+                                    'library': {'path': self.server.library_path, 'name': 'stand-in'}})
+        if url.path == '/api/item/list':
+            # 页按查询缓存为编码后的字节：Eagle在自己的进程中序列化，不应计入读取方的耗时
+            cache_key = (query.get('orderBy', 'CREATEDATE'), query.get('limit', '200'), query.get('offset', '0'))
+            body = self.server.pages.get(cache_key)
+            if body is None:
+                order_by, limit, page = cache_key[0], int(cache_key[1]), int(cache_key[2])
+                key = {'CREATEDATE': 'btime', 'NAME': 'name', 'FILESIZE': 'size'}[order_by.lstrip('-')]
+                items = sorted(self.server.items, key=lambda item: item.get(key, 0), reverse=order_by.startswith('-'))
+                body = json.dumps({'status': 'success', 'data': items[page * limit:(page + 1) * limit]},
+                                  ensure_ascii=False).encode('utf-8')
+                self.server.pages[cache_key] = body
+            return self._send_body(body)
+        self._send_json(None, 404)
+
+
+def start_stand_in_eagle(library: Path, latency_ms: float = 1.0) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    在后台线程启动替身Eagle API（启动时读入库中全部 metadata.json，相当于Eagle的内存数据库）
+
+    Returns:
+        (服务器, 地址)，用完后调用 server.shutdown()
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _StandInEagleHandler)
+    server.daemon_threads = True
+    server.items = []
+    for path in (library / 'images').glob('*.info/metadata.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            server.items.append(json.load(f))
+    server.pages = {}
+    server.folders = []
+    if (library / 'metadata.json').exists():
+        with open(library / 'metadata.json', 'r', encoding='utf-8') as f:
+            server.folders = json.load(f).get('folders', [])
+    server.library_path = str(library)
+    server.latency = latency_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def contract(items: List[MediaItem]) -> List[tuple]:
+    """
+    两种读取方式必须一致的输出
+    标签Id按首次出现的顺序分配，两种方式的读取顺序不同，标签按字符串排序后比较
+    """
+    return sorted((item.folder_name, item.file_name, item.item_name, tuple(sorted(item.tags)),
+                   item.modification_time) for item in items)
+
+
+def make_contract_library(library_path: str, count: int, seed: int = 42) -> Path:
+    """
+    生成覆盖契约各方面的合成Eagle库：嵌套文件夹、无标签与回收站中的条目、非ASCII名称与标签、不同扩展名
+
+    Returns:
+        Eagle库路径
+    """
+    rng = random.Random(seed)
+    library = Path(library_path)
+    images = library / 'images'
+    images.mkdir(parents=True, exist_ok=True)
+    with open(library / 'metadata.json', 'w', encoding='utf-8') as f:
+        json.dump({'folders': FOLDERS}, f, ensure_ascii=False)
+    vocabulary = [f'标签{i:02d}' for i in range(30)] + ['tag with space', 'Ünïcödé']
+    folder_ids = ['FMOVIE', 'FANIME', 'FCLIP']
+    for i in range(count):
+        ext = rng.choice(['mp4', 'mkv', 'MP4'])
+        metadata = {
+            'id': f'K{i:012X}',
+            'name': f'视频 {i:05d}' if i % 3 else f'clip_{i:05d}',
+            'size': rng.randint(10 ** 6, 10 ** 9),
+            'btime': BASE_TIME + i,
+            'ext': ext,
+            'tags': rng.sample(vocabulary, rng.randint(0, 5)),
+            'folders': rng.sample(folder_ids, rng.randint(0, 2)),
+            'isDeleted': i % 17 == 0,
+            'modificationTime': BASE_TIME + i * 1000,
+            'palettes': [{'color': [rng.randint(0, 255) for _ in range(3)], 'ratio': rng.randint(1, 60)}]
+        }
+        info_dir = images / f"{metadata['id']}.info"
+        info_dir.mkdir(exist_ok=True)
+        with open(info_dir / 'metadata.json', 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        (info_dir / f"{metadata['name']}.{ext}").write_bytes(b'')
+        (info_dir / f"{metadata['name']}_thumbnail.png").write_bytes(b'')
+    return library
+
+
+def _deleted_folders(library: Path) -> set:
+    """回收站中条目的.info文件夹名"""
+    deleted = set()
+    for path in (library / 'images').glob('*.info/metadata.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            if json.load(f).get('isDeleted'):
+                deleted.add(path.parent.name)
+    return deleted
+
+
+def check_contract(library: Path, url: str, page_size: int) -> List[str]:
+    """
+    在各种过滤条件下对比两种读取方式的输出
+
+    Returns:
+        不一致的情形描述（全部一致时为空）
+    """
+    deleted = _deleted_folders(library)
+    since = BASE_TIME + len(list((library / 'images').glob('*.info'))) * 500
+    cases: List[Tuple[str, Optional[ScanFilter]]] = [
+        ('完整读取', None),
+        ('文件夹（名称，含子文件夹）', ScanFilter(folders=['电影'])),
+        ('文件夹（路径）', ScanFilter(folders=['电影/动画'])),
+        ('标签', ScanFilter(tags=['标签01', 'Ünïcödé'])),
+        ('路径前缀', ScanFilter(path_prefixes=[str(library / 'images' / 'K00000000001')])),
+        ('修改时间', ScanFilter(modified_since=since)),
+        ('组合条件', ScanFilter(folders=['片段'], tags=['tag with space'], modified_since=since))
+    ]
+    failures = []
+    for name, scan_filter in cases:
+        scanned = [item for item in EagleReader(str(library)).read_all_media_files(scan_filter)
+                   if item.folder_name not in deleted]
+        listed = EagleApiReader(str(library), url, page_size=page_size).read_all_media_files(scan_filter)
+        expected, actual = contract(scanned), contract(listed)
+        if expected != actual:
+            missing = len(set(expected) - set(actual))
+            extra = len(set(actual) - set(expected))
+            failures.append(f"{name}: 扫描 {len(expected)} 个，API {len(actual)} 个"
+                            f"（API缺少 {missing} 个，多出 {extra} 个）")
+        elif not expected and scan_filter is not None:
+            failures.append(f"{name}: 没有选中任何条目，合成库未覆盖该条件")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Eagle API读取器输出契约检查')
+    parser.add_argument('--items', type=int, default=500, help='合成库条目数')
+    parser.add_argument('--page-size', type=int, default=64, help='API每页条目数（小于条目数以覆盖分页）')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        library = make_contract_library(tmp, args.items, args.seed)
+        server, url = start_stand_in_eagle(library, latency_ms=0)
+        try:
+            failures = check_contract(library, url, args.page_size)
+        finally:
+            server.shutdown()
+
+    if failures:
+        print("✗ EagleApiReader 与 EagleReader 的输出不一致:")
+        for line in failures:
+            print(f"  {line}")
+        return 1
+    print(f"✓ EagleApiReader 与 EagleReader 的输出一致（{args.items} 个条目，每页 {args.page_size}）")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
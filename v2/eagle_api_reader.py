@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Eagle API读取模块
+通过Eagle客户端的本地HTTP API（/api/library/info、分页的 /api/item/list）读取条目，
+代替逐个读取 images/*.info/metadata.json 并列举.info文件夹（在网络共享盘上很慢）。
+输出与 EagleReader 相同的 MediaItem 列表；Eagle客户端必须正在运行并打开了配置中的库
+"""
+
+import logging
+import os
+from typing import Dict, Iterator, List, Optional
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import metadata_parser
+from eagle_reader import EagleReader, MediaItem, ScanFilter
+from tag_table import TagTable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'http://localhost:41595'
+
+
+class EagleApiReader(EagleReader):
+    """
+    基于Eagle HTTP API的读取器
+    媒体文件名按Eagle的存储规则取 <名称>.<扩展名>（不列举.info文件夹），回收站中的条目不返回
+    """
+
+    def __init__(self, library_path: str, api_url: str = DEFAULT_API_URL,
+                 tag_table: Optional[TagTable] = None, token: Optional[str] = None,
+                 page_size: int = 1000, order_by: str = 'CREATEDATE', timeout: float = 60):
+        """
+        Args:
+            library_path: Eagle库的根路径（用于拼出媒体文件路径，须与Eagle当前打开的库一致）
+            api_url: Eagle API地址
+            tag_table: 共享的全局标签表（可选）
+            token: API令牌（Eagle要求时提供）
+            page_size: 每页条目数
+            order_by: 分页排序（CREATEDATE、NAME 等，须为稳定顺序，分页期间新增的条目才不会打乱页）
+            timeout: 单个请求的超时（秒）
+        """
+        super().__init__(library_path, tag_table)
+        self.api_url = api_url.rstrip('/')
+        self.token = token
+        self.page_size = page_size
+        self.order_by = order_by
+        self.timeout = timeout
+        self.request_count = 0
+        self._library_info: Optional[Dict] = None
+
+    def _get(self, path: str, params: Optional[Dict] = None):
+        """
+        GET请求，返回响应的 data 字段
+
+        Raises:
+            ConnectionError: 请求失败或Eagle返回错误
+        """
+        params = dict(params or {})
+        if self.token:
+            params['token'] = self.token
+        url = f"{self.api_url}{path}"
+        if params:
+            url += '?' + urlencode(params)
+        self.request_count += 1
+        try:
+            with urlopen(url, timeout=self.timeout) as resp:
+                # 响应包含 palettes、annotation 等大字段，有 orjson 时用 orjson 解析
+                body = metadata_parser.loads(resp.read())
+        except (URLError, OSError, ValueError) as e:
+            raise ConnectionError(f"访问Eagle API失败 {path}（Eagle是否正在运行？）: {e}")
+        if body.get('status') != 'success':
+            raise ConnectionError(f"Eagle API返回错误 {path}: {body}")
+        return body.get('data')
+
+    def library_info(self) -> Dict:
+        """
+        当前打开的库的信息（/api/library/info，只请求一次）
+
+        Raises:
+            ConnectionError: Eagle当前打开的不是配置中的库
+        """
+        if self._library_info is None:
+            info = self._get('/api/library/info') or {}
+            opened = (info.get('library') or {}).get('path')
+            if opened and os.path.normcase(os.path.normpath(opened)) != \
+                    os.path.normcase(os.path.normpath(str(self.library_path))):
+                raise ConnectionError(f"Eagle当前打开的库是 {opened}，与配置的 {self.library_path} 不一致")
+            self._library_info = info
+        return self._library_info
+
+    def folder_tree(self) -> List[dict]:
+        """Eagle文件夹树（来自 /api/library/info）"""
+        return self.library_info().get('folders', [])
+
+    def iter_items(self) -> Iterator[dict]:
+        """
+        分页获取全部条目（Eagle的 offset 是页码，不是条目偏移）
+        """
+        page = 0
+        while True:
+            items = self._get('/api/item/list', {
+                'limit': self.page_size,
+                'offset': page,
+                'orderBy': self.order_by
+            }) or []
+            yield from items
+            if len(items) < self.page_size:
+                break
+            page += 1
+
+    def read_all_media_files(self, scan_filter: Optional[ScanFilter] = None) -> List[MediaItem]:
+        """
+        读取所有媒体文件及其标签信息（输出与 EagleReader.read_all_media_files 相同）
+
+        Args:
+            scan_filter: 子集过滤条件（可选）
+
+        Returns:
+            MediaItem列表
+        """
+        if not scan_filter:
+            scan_filter = None
+        self.library_info()
+        selected_folder_ids = None
+        if scan_filter is not None and scan_filter.folders:
+            selected_folder_ids = self.resolve_folder_ids(scan_filter.folders)
+
+        root = str(self.images_path)
+        media_items = []
+        skipped_count = 0
+        for data in self.iter_items():
+            if data.get('isDeleted'):
+                continue
+            folder_name = f"{data['id']}.info"
+            tags = data.get('tags') or []
+            modification_time = data.get('modificationTime') or 0
+            if scan_filter is not None and not (
+                    scan_filter.match_path(root, folder_name) and
+                    scan_filter.match_metadata(tags, data.get('folders') or [],
+                                               selected_folder_ids, modification_time)):
+                skipped_count += 1
+                continue
+            media_items.append(MediaItem(
+                root,
+                folder_name,
+                f"{data['name']}.{data['ext']}",
+                data['name'],
+                self.tag_table.encode(tags),
+                self.tag_table,
+                modification_time
+            ))
+
+        if scan_filter is not None:
+            logger.info(f"子集过滤（{scan_filter.describe()}）: 跳过 {skipped_count} 个条目")
+        logger.info(f"共找到 {len(media_items)} 个媒体文件（Eagle API，{self.request_count} 个请求）")
+        return media_items
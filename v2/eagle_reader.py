@@ -7,25 +7,252 @@ Eagle库标签读取模块
 
 import json
 import os
+from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Iterable, Tuple, Optional, Set
 import logging
 
+from metadata_parser import read_metadata
+from tag_table import TagTable, TagIds
+
 logger = logging.getLogger(__name__)
 
 
+class MediaItem:
+    """
+    紧凑的媒体项表示
+    路径相对于 images 目录保存（根路径字符串在所有媒体项间共享），
+    标签以全局标签表中的有序Id元组保存；同时兼容原有的字典式访问 item['file_path']
+    """
+    
+    __slots__ = ('root', 'folder_name', 'file_name', 'item_name', 'tag_ids', 'tag_table',
+                 'modification_time')
+    
+    _KEYS = ('file_path', 'file_name', 'tags', 'item_name', 'folder_path')
+    
+    def __init__(self, root: str, folder_name: str, file_name: str,
+                 item_name: str, tag_ids: TagIds, tag_table: TagTable,
+                 modification_time: int = 0):
+        """
+        Args:
+            root: images目录路径（所有媒体项共享同一个字符串对象）
+            folder_name: .info文件夹名
+            file_name: 媒体文件名
+            item_name: Eagle中的item名称
+            tag_ids: 有序的标签Id元组
+            tag_table: 标签Id所属的全局标签表
+            modification_time: Eagle中的修改时间（毫秒时间戳，metadata.json 的 modificationTime）
+        """
+        self.root = root
+        self.folder_name = folder_name
+        self.file_name = file_name
+        self.item_name = item_name
+        self.tag_ids = tag_ids
+        self.tag_table = tag_table
+        self.modification_time = modification_time
+    
+    @property
+    def tags(self) -> Tuple[str, ...]:
+        """标签字符串元组"""
+        return self.tag_table.decode(self.tag_ids)
+    
+    @property
+    def folder_path(self) -> str:
+        """.info文件夹的完整路径"""
+        return os.path.join(self.root, self.folder_name)
+    
+    @property
+    def file_path(self) -> str:
+        """媒体文件的完整路径"""
+        return os.path.join(self.root, self.folder_name, self.file_name)
+    
+    @property
+    def movie_nfo_path(self) -> str:
+        """该条目movie.nfo的完整路径"""
+        return os.path.join(self.root, self.folder_name, 'movie.nfo')
+    
+    def __getitem__(self, key: str):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key: str, default=None):
+        """兼容 dict.get"""
+        if key not in self._KEYS:
+            return default
+        return getattr(self, key)
+    
+    def to_dict(self) -> Dict:
+        """转换为原有的字典表示"""
+        return {key: getattr(self, key) for key in self._KEYS}
+    
+    def __repr__(self) -> str:
+        return f"MediaItem({self.folder_name!r}, {self.file_name!r}, tags={self.tags!r})"
+
+
+class PathCache:
+    """
+    .info文件夹 -> 媒体文件名 的持久缓存
+    以文件夹mtime校验：文件夹内文件增删或改名都会改变其mtime，此时才需要重新列举
+    """
+    
+    VERSION = 1
+    
+    def __init__(self, cache_file: str):
+        """
+        Args:
+            cache_file: 缓存文件路径（JSON）
+        """
+        self.cache_file = Path(cache_file)
+        self._entries: Dict[str, List] = {}
+        self._dirty = False
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == self.VERSION:
+                    self._entries = data.get('folders', {})
+            except Exception as e:
+                logger.warning(f"读取文件名缓存失败，将重新建立 {self.cache_file}: {e}")
+    
+    def get(self, folder_name: str, mtime_ns: int, file_ext: str) -> Optional[str]:
+        """
+        获取缓存的媒体文件名
+        
+        Returns:
+            文件夹mtime一致且扩展名匹配时返回缓存的文件名，否则返回None
+        """
+        entry = self._entries.get(folder_name)
+        if entry is None or entry[0] != mtime_ns:
+            return None
+        file_name = entry[1]
+        if not file_name.lower().endswith(f'.{file_ext.lower()}'):
+            return None
+        return file_name
+    
+    def put(self, folder_name: str, mtime_ns: int, file_name: str):
+        """记录文件夹的媒体文件名"""
+        self._entries[folder_name] = [mtime_ns, file_name]
+        self._dirty = True
+    
+    def prune(self, folder_names: Set[str]):
+        """移除已不存在的文件夹"""
+        stale = [name for name in self._entries if name not in folder_names]
+        for name in stale:
+            del self._entries[name]
+        if stale:
+            self._dirty = True
+    
+    def save(self):
+        """有变化时写回缓存文件（先写临时文件再替换，避免中断导致缓存损坏）"""
+        if not self._dirty:
+            return
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_name(self.cache_file.name + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'folders': self._entries}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"保存文件名缓存失败 {self.cache_file}: {e}")
+
+
+class ScanFilter:
+    """
+    读取Eagle库时的子集过滤条件
+    不同种类的条件之间为"且"，同一种类的多个值之间为"或"；
+    路径前缀在读取metadata.json之前判断，文件夹、标签与修改时间在列举.info文件夹之前判断
+    """
+    
+    def __init__(self, folders: Iterable[str] = (), tags: Iterable[str] = (),
+                 path_prefixes: Iterable[str] = (), modified_since: Optional[int] = None):
+        """
+        Args:
+            folders: Eagle文件夹（Id、名称或以 / 分隔的路径，包含全部子文件夹）
+            tags: 标签（条目带有其中任一标签即选中）
+            path_prefixes: .info文件夹路径前缀（绝对路径，或相对于 images 目录）
+            modified_since: 只选中Eagle修改时间（modificationTime，毫秒）不早于该值的条目
+        """
+        self.folders = list(folders)
+        self.tags = set(tags)
+        self.path_prefixes = [self._normalize(prefix) for prefix in path_prefixes]
+        self.modified_since = modified_since
+    
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return path.replace('\\', '/').casefold()
+    
+    def __bool__(self) -> bool:
+        return self.selects_subset or self.modified_since is not None
+    
+    @property
+    def selects_subset(self) -> bool:
+        """是否按文件夹、标签或路径选择了子集（只按修改时间过滤时为False）"""
+        return bool(self.folders or self.tags or self.path_prefixes)
+    
+    def describe(self) -> str:
+        """可读的过滤条件描述"""
+        parts = []
+        if self.folders:
+            parts.append(f"文件夹: {', '.join(self.folders)}")
+        if self.tags:
+            parts.append(f"标签: {', '.join(sorted(self.tags))}")
+        if self.path_prefixes:
+            parts.append(f"路径前缀: {', '.join(self.path_prefixes)}")
+        if self.modified_since is not None:
+            since = datetime.fromtimestamp(self.modified_since / 1000).strftime('%Y-%m-%d %H:%M:%S')
+            parts.append(f"修改时间不早于: {since}")
+        return '; '.join(parts)
+    
+    def match_path(self, root: str, folder_name: str) -> bool:
+        """.info文件夹路径是否匹配任一前缀（未设置前缀时总是匹配）"""
+        if not self.path_prefixes:
+            return True
+        relative = self._normalize(folder_name)
+        absolute = self._normalize(os.path.join(root, folder_name))
+        return any(relative.startswith(prefix) or absolute.startswith(prefix)
+                   for prefix in self.path_prefixes)
+    
+    def match_metadata(self, tags: List[str], folder_ids: List[str],
+                       selected_folder_ids: Optional[Set[str]], modification_time: int = 0) -> bool:
+        """
+        条目的标签、所属文件夹与修改时间是否满足条件
+        
+        Args:
+            tags: 条目的标签
+            folder_ids: 条目所属的Eagle文件夹Id
+            selected_folder_ids: 选中的文件夹Id（已展开子文件夹，未按文件夹过滤时为None）
+            modification_time: 条目的Eagle修改时间（毫秒）
+        """
+        if self.modified_since is not None and modification_time < self.modified_since:
+            return False
+        if self.tags and self.tags.isdisjoint(tags):
+            return False
+        if selected_folder_ids is not None and selected_folder_ids.isdisjoint(folder_ids):
+            return False
+        return True
+
+
 class EagleReader:
     """Eagle库读取器"""
     
-    def __init__(self, library_path: str):
+    def __init__(self, library_path: str, tag_table: Optional[TagTable] = None,
+                 path_cache_file: Optional[str] = None):
         """
         初始化Eagle读取器
         
         Args:
             library_path: Eagle库的根路径
+            tag_table: 共享的全局标签表（可选，默认使用库中的 tags.json 预先登记）
+            path_cache_file: 媒体文件名缓存文件路径（可选，不提供则每次都列举.info文件夹）
         """
         self.library_path = Path(library_path)
         self.images_path = self.library_path / "images"
+        if tag_table is None:
+            tag_table = TagTable.from_eagle_library(library_path)
+        self.tag_table = tag_table
+        self.path_cache = PathCache(path_cache_file) if path_cache_file else None
         
         if not self.library_path.exists():
             raise FileNotFoundError(f"Eagle库路径不存在: {library_path}")
@@ -33,65 +260,184 @@ class EagleReader:
         if not self.images_path.exists():
             raise FileNotFoundError(f"Eagle images路径不存在: {self.images_path}")
     
-    def read_all_media_files(self) -> List[Dict]:
+    def resolve_folder_ids(self, folders: Iterable[str]) -> Set[str]:
+        """
+        把文件夹Id、名称或路径解析为Id集合（包含全部子文件夹）
+        使用 folder_tree() 返回的文件夹树
+        
+        Args:
+            folders: 文件夹Id、名称或以 / 分隔的路径（如 "电影/动画"）
+            
+        Returns:
+            选中的文件夹Id集合
+            
+        Raises:
+            ValueError: 找不到某个文件夹
+        """
+        tree = self.folder_tree()
+        
+        # 展平文件夹树：(Id, 名称, 路径, 节点)
+        nodes = []
+        stack = [(folder, folder.get('name', '')) for folder in reversed(tree)]
+        while stack:
+            folder, path = stack.pop()
+            nodes.append((folder.get('id'), folder.get('name', ''), path, folder))
+            for child in reversed(folder.get('children') or []):
+                stack.append((child, f"{path}/{child.get('name', '')}"))
+        
+        def descendants(folder: dict) -> Set[str]:
+            ids = set()
+            pending = [folder]
+            while pending:
+                node = pending.pop()
+                ids.add(node.get('id'))
+                pending.extend(node.get('children') or [])
+            return ids
+        
+        selected: Set[str] = set()
+        for spec in folders:
+            key = spec.strip('/')
+            matched = [node for folder_id, name, path, node in nodes
+                       if key in (folder_id, name, path)]
+            if not matched:
+                raise ValueError(f"Eagle中找不到文件夹: {spec}")
+            for node in matched:
+                selected |= descendants(node)
+        return selected
+    
+    def folder_tree(self) -> List[dict]:
+        """
+        Eagle文件夹树（库根目录 metadata.json 中的 folders）
+        
+        Raises:
+            ValueError: 读取失败
+        """
+        library_metadata = self.library_path / 'metadata.json'
+        try:
+            with open(library_metadata, 'r', encoding='utf-8') as f:
+                return json.load(f).get('folders', [])
+        except Exception as e:
+            raise ValueError(f"读取Eagle文件夹树失败 {library_metadata}: {e}")
+    
+    @staticmethod
+    def find_media_file(info_dir: str, file_ext: str) -> Optional[str]:
+        """
+        列举.info文件夹，查找实际的媒体文件
+        
+        Args:
+            info_dir: .info文件夹路径
+            file_ext: metadata.json中的扩展名
+            
+        Returns:
+            媒体文件名，找不到返回None
+        """
+        suffix = f'.{file_ext.lower()}'
+        with os.scandir(info_dir) as entries:
+            for entry in entries:
+                name = entry.name.lower()
+                # 确保不是缩略图
+                if name.endswith(suffix) and '_thumbnail' not in name and entry.is_file():
+                    return entry.name
+        return None
+    
+    def read_all_media_files(self, scan_filter: Optional[ScanFilter] = None) -> List[MediaItem]:
         """
         读取所有媒体文件及其标签信息
         
+        启用文件名缓存时，mtime未变化的.info文件夹直接使用缓存的媒体文件名，
+        稳定状态下无需列举任何.info文件夹
+        
+        Args:
+            scan_filter: 子集过滤条件（可选），不匹配的条目在读取/列举前即被跳过
+        
         Returns:
-            包含媒体文件信息的字典列表，每个字典包含：
+            MediaItem列表，每项支持以下字段（属性或字典式访问）：
             - file_path: 媒体文件的完整路径
             - file_name: 媒体文件名（不含路径）
-            - tags: 标签列表
+            - tags: 标签元组
             - item_name: Eagle中的item名称
+            - folder_path: .info文件夹的完整路径
         """
         media_items = []
+        root = str(self.images_path)
+        cache = self.path_cache
+        listed_count = 0
+        skipped_count = 0
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if not scan_filter:
+            # 没有任何条件的过滤器等同于不过滤
+            scan_filter = None
+        selected_folder_ids = None
+        if scan_filter is not None and scan_filter.folders:
+            selected_folder_ids = self.resolve_folder_ids(scan_filter.folders)
         
         # 遍历所有.info文件夹
-        for info_dir in self.images_path.iterdir():
-            if not info_dir.is_dir() or not info_dir.name.endswith('.info'):
-                continue
-            
-            # 读取该文件夹中的metadata.json
-            metadata_file = info_dir / "metadata.json"
-            if not metadata_file.exists():
-                logger.warning(f"找不到metadata.json: {metadata_file}")
-                continue
-            
-            try:
-                with open(metadata_file, 'r', encoding='utf-8') as f:
-                    metadata = json.load(f)
+        with os.scandir(root) as info_entries:
+            for info_entry in info_entries:
+                folder_name = info_entry.name
+                if not folder_name.endswith('.info') or not info_entry.is_dir():
+                    continue
+                if scan_filter is not None and not scan_filter.match_path(root, folder_name):
+                    skipped_count += 1
+                    continue
                 
-                # 获取文件信息
-                item_name = metadata.get('name', '')
-                file_ext = metadata.get('ext', '')
-                tags = metadata.get('tags', [])
-                
-                # 查找实际的媒体文件
-                media_file = None
-                for file in info_dir.iterdir():
-                    if file.is_file() and file.suffix.lower() == f'.{file_ext.lower()}':
-                        # 确保不是缩略图
-                        if '_thumbnail' not in file.name.lower():
-                            media_file = file
-                            break
-                
-                if media_file and media_file.exists():
-                    media_items.append({
-                        'file_path': str(media_file),
-                        'file_name': media_file.name,
-                        'tags': tags,
-                        'item_name': item_name,
-                        'folder_path': str(info_dir)
-                    })
-                    logger.debug(f"找到媒体文件: {media_file.name}, 标签: {tags}")
-                else:
-                    logger.warning(f"在 {info_dir.name} 中找不到媒体文件 (ext={file_ext})")
+                # 读取该文件夹中的metadata.json
+                info_dir = info_entry.path
+                metadata_file = os.path.join(info_dir, "metadata.json")
+                try:
+                    # 只提取需要的字段（有 orjson 时自动使用）
+                    metadata = read_metadata(metadata_file)
+                    item_name = metadata.name
+                    file_ext = metadata.ext
+                    tags = metadata.tags
+                    if scan_filter is not None and not scan_filter.match_metadata(
+                            tags, metadata.folders, selected_folder_ids, metadata.modification_time):
+                        skipped_count += 1
+                        continue
                     
-            except json.JSONDecodeError as e:
-                logger.error(f"解析metadata.json失败 {metadata_file}: {e}")
-            except Exception as e:
-                logger.error(f"处理 {info_dir.name} 时出错: {e}")
+                    # 查找实际的媒体文件（文件夹mtime未变化时使用缓存）
+                    file_name = None
+                    mtime_ns = None
+                    if cache is not None:
+                        mtime_ns = info_entry.stat().st_mtime_ns
+                        file_name = cache.get(folder_name, mtime_ns, file_ext)
+                    if file_name is None:
+                        listed_count += 1
+                        file_name = self.find_media_file(info_dir, file_ext)
+                        if cache is not None and file_name:
+                            cache.put(folder_name, mtime_ns, file_name)
+                    
+                    if file_name:
+                        media_items.append(MediaItem(
+                            root,
+                            folder_name,
+                            file_name,
+                            item_name,
+                            self.tag_table.encode(tags),
+                            self.tag_table,
+                            metadata.modification_time
+                        ))
+                        if debug:
+                            logger.debug(f"找到媒体文件: {file_name}, 标签: {tags}")
+                    else:
+                        logger.warning(f"在 {folder_name} 中找不到媒体文件 (ext={file_ext})")
+                
+                except FileNotFoundError:
+                    logger.warning(f"找不到metadata.json: {metadata_file}")
+                except ValueError as e:
+                    logger.error(f"解析metadata.json失败 {metadata_file}: {e}")
+                except Exception as e:
+                    logger.error(f"处理 {folder_name} 时出错: {e}")
         
+        if cache is not None:
+            if scan_filter is None:
+                # 只读取了子集时不能据此清理其他文件夹的缓存
+                cache.prune({item.folder_name for item in media_items})
+            cache.save()
+            logger.info(f"列举了 {listed_count} 个.info文件夹，"
+                        f"其余 {len(media_items) - listed_count} 个使用文件名缓存")
+        if scan_filter is not None:
+            logger.info(f"子集过滤（{scan_filter.describe()}）: 跳过 {skipped_count} 个条目")
         logger.info(f"共找到 {len(media_items)} 个媒体文件")
         return media_items
     
@@ -119,9 +465,7 @@ class EagleReader:
             return []
         
         try:
-            with open(metadata_file, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-            return metadata.get('tags', [])
+            return read_metadata(str(metadata_file)).tags
         except Exception as e:
             logger.error(f"读取标签失败 {metadata_file}: {e}")
             return []
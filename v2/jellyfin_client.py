@@ -6,19 +6,175 @@ Jellyfin API客户端模块
 """
 
 import requests
+import json
 import logging
+import os
+import threading
 import time
-import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Tuple
+
+from listing_cache import ListingCache
 
 logger = logging.getLogger(__name__)
 
 
+class AdaptiveThrottle:
+    """
+    基于服务器响应延迟的自适应并发控制（AIMD）
+    响应延迟低于目标且无 5xx/429 时缓慢增加并发（加性增），
+    延迟超标或出现 5xx/429 时并发减半（乘性减），让同步在服务器繁忙时主动让路；
+    分页列表、全库刷新与进度轮询等请求的耗时与单项请求不可比，只占用并发名额、只按 5xx/429 退让
+    """
+    
+    def __init__(self, latency_target_ms: float = 500, min_concurrency: int = 1,
+                 max_concurrency: int = 8, decrease_factor: float = 0.5):
+        """
+        Args:
+            latency_target_ms: 目标响应延迟（毫秒）
+            min_concurrency: 最小并发数
+            max_concurrency: 最大并发数
+            decrease_factor: 拥塞时并发的缩减比例
+        """
+        self.latency_target = latency_target_ms / 1000
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.decrease_factor = decrease_factor
+        self.limit = float(min_concurrency)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+        self._pause_until = 0.0
+        # 统计
+        self._latencies: List[float] = []
+        self._requests = 0
+        self._errors = 0
+        self._throttled = 0
+        self._decreases = 0
+        self._limit_min = self.limit
+        self._limit_max = self.limit
+    
+    def acquire(self):
+        """等待直到当前并发低于限制（以及 Retry-After 暂停结束）"""
+        with self._cond:
+            while True:
+                wait = self._pause_until - time.monotonic()
+                if wait <= 0 and self._in_flight < int(self.limit):
+                    self._in_flight += 1
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+    
+    def release(self, latency: float, status_code: Optional[int], retry_after: Optional[float] = None,
+                adaptive: bool = True):
+        """
+        归还并发名额并根据本次响应调整限制
+        
+        Args:
+            latency: 响应耗时（秒）
+            status_code: HTTP状态码（请求异常时为None）
+            retry_after: 服务器要求的等待时间（秒，来自 Retry-After）
+            adaptive: 是否按延迟调整并发、计入延迟分位数（分页列表、全库刷新、轮询等请求为False）
+        """
+        now = time.monotonic()
+        with self._cond:
+            self._in_flight -= 1
+            self._requests += 1
+            overloaded = status_code is None or status_code >= 500 or status_code == 429
+            if status_code == 429:
+                self._throttled += 1
+            if overloaded:
+                self._errors += 1
+            if adaptive:
+                self._latencies.append(latency)
+            
+            if overloaded or (adaptive and latency > self.latency_target):
+                # 同一个延迟窗口内的多个慢响应只减一次，避免并发被瞬间压到最小
+                if now - self._last_decrease > max(latency, self.latency_target):
+                    self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    self._decreases += 1
+                if retry_after:
+                    self._pause_until = max(self._pause_until, now + retry_after)
+            elif adaptive:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            
+            self._limit_min = min(self._limit_min, self.limit)
+            self._limit_max = max(self._limit_max, self.limit)
+            self._cond.notify_all()
+    
+    def get_metrics(self) -> Dict:
+        """本次运行的请求统计"""
+        with self._cond:
+            latencies = sorted(self._latencies)
+        
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+        
+        return {
+            'requests': self._requests,
+            'errors': self._errors,
+            'throttled_429': self._throttled,
+            'backoffs': self._decreases,
+            'latency_ms_p50': round(percentile(0.50), 1),
+            'latency_ms_p95': round(percentile(0.95), 1),
+            'latency_ms_max': round(latencies[-1] * 1000, 1) if latencies else 0.0,
+            'latency_target_ms': self.latency_target * 1000,
+            'concurrency_min': round(self._limit_min, 2),
+            'concurrency_max': round(self._limit_max, 2),
+            'concurrency_final': round(self.limit, 2)
+        }
+
+
+class PathIdCache:
+    """
+    媒体文件路径 -> Jellyfin条目Id 的内存缓存（线程安全）
+    同一服务器上的多个同步映射共享一份，避免重复获取完整的媒体项列表；
+    键由调用方规范化
+    """
+    
+    def __init__(self):
+        self._ids: Dict[str, str] = {}
+        self._lock = threading.Lock()
+    
+    def update(self, pairs: Dict[str, str]):
+        """登记一批 路径 -> Id"""
+        with self._lock:
+            self._ids.update(pairs)
+    
+    def lookup(self, keys: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        查找一批路径
+        
+        Returns:
+            (找到的Id列表, 缓存中没有的路径列表)
+        """
+        found = []
+        missing = []
+        with self._lock:
+            for key in keys:
+                item_id = self._ids.get(key)
+                if item_id is None:
+                    missing.append(key)
+                else:
+                    found.append(item_id)
+        return found, missing
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
 class JellyfinClient:
     """Jellyfin API客户端"""
     
-    def __init__(self, server_url: str, api_key: str, library_id: str):
+    def __init__(self, server_url: str, api_key: str, library_id: str, *,
+                 latency_target_ms: float = 500, max_concurrency: int = 8,
+                 session: Optional[requests.Session] = None,
+                 throttle: Optional[AdaptiveThrottle] = None,
+                 path_ids: Optional[PathIdCache] = None,
+                 listing_cache: Optional[ListingCache] = None):
         """
         初始化Jellyfin客户端
         
@@ -26,6 +182,13 @@ class JellyfinClient:
             server_url: Jellyfin服务器URL
             api_key: API密钥
             library_id: 媒体库ID
+            latency_target_ms: 自适应并发控制的目标响应延迟（毫秒）
+            max_concurrency: 逐项刷新时的最大并发请求数
+            session: 共享的HTTP会话（可选，同一服务器的多个客户端共用连接池）
+            throttle: 共享的并发控制（可选，提供时忽略 latency_target_ms/max_concurrency，
+                      使同一服务器上所有客户端的并发请求总数受同一上限约束）
+            path_ids: 共享的 路径 -> Id 缓存（可选）
+            listing_cache: 媒体项列表的磁盘缓存（可选，见 listing_cache.ListingCache）
         """
         self.server_url = server_url.rstrip('/')
         self.api_key = api_key
@@ -34,6 +197,61 @@ class JellyfinClient:
             'X-Emby-Token': api_key,
             'Content-Type': 'application/json'
         }
+        self.session = session if session is not None else requests.Session()
+        if throttle is None:
+            throttle = AdaptiveThrottle(latency_target_ms=latency_target_ms,
+                                        max_concurrency=max_concurrency)
+        self.throttle = throttle
+        self.path_ids = path_ids if path_ids is not None else PathIdCache()
+        self.listing_cache = listing_cache
+        self._listing_lock = threading.Lock()
+        # 本客户端触发了全库刷新且尚未等待（供 wait_for_refresh_complete 只跟踪自己的工作）
+        self._library_refresh_pending = False
+    
+    def _request(self, method: str, url: str, adaptive: bool = True, **kwargs) -> requests.Response:
+        """
+        发送请求（复用连接），经过自适应并发控制并记录延迟
+        adaptive=False 用于分页列表、全库刷新与轮询：其耗时不参与并发调整（见 AdaptiveThrottle.release）
+        """
+        self.throttle.acquire()
+        start = time.monotonic()
+        status_code = None
+        retry_after = None
+        try:
+            response = self.session.request(method, url, headers=self.headers, **kwargs)
+            status_code = response.status_code
+            if status_code == 429:
+                try:
+                    retry_after = float(response.headers.get('Retry-After', ''))
+                except ValueError:
+                    retry_after = None
+            return response
+        finally:
+            self.throttle.release(time.monotonic() - start, status_code, retry_after, adaptive)
+    
+    def get_metrics(self) -> Dict:
+        """本次运行的请求统计（请求数、错误率、延迟分位数、并发变化）"""
+        return self.throttle.get_metrics()
+    
+    def export_metrics(self, metrics_file: str, **extra) -> Dict:
+        """
+        将本次运行的请求统计追加写入 JSON Lines 文件
+        
+        Args:
+            metrics_file: 统计文件路径
+            extra: 额外记录的字段
+            
+        Returns:
+            写入的统计
+        """
+        metrics = dict(extra, time=time.strftime('%Y-%m-%d %H:%M:%S'), **self.get_metrics())
+        try:
+            Path(metrics_file).parent.mkdir(parents=True, exist_ok=True)
+            with open(metrics_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(metrics, ensure_ascii=False) + '\n')
+        except Exception as e:
+            logger.warning(f"写入请求统计失败 {metrics_file}: {e}")
+        return metrics
     
     def test_connection(self) -> bool:
         """
@@ -44,7 +262,7 @@ class JellyfinClient:
         """
         try:
             url = f"{self.server_url}/System/Info"
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self._request('GET', url, timeout=10)
             
             if response.status_code == 200:
                 info = response.json()
@@ -81,9 +299,11 @@ class JellyfinClient:
             }
             
             logger.info("正在触发Jellyfin刷新: 覆盖所有元数据...")
-            response = requests.post(url, headers=self.headers, params=params, timeout=30)
+            response = self._request('POST', url, params=params, timeout=30, adaptive=False)
             
             if response.status_code in [200, 204]:
+                # 只有成功触发后才跟踪，失败时不让之后的等待去跟踪一个不存在的刷新
+                self._library_refresh_pending = True
                 logger.info("成功触发刷新: 覆盖所有元数据")
                 return True
             else:
@@ -116,9 +336,11 @@ class JellyfinClient:
             }
             
             logger.info("正在触发Jellyfin刷新: 搜索缺少的元数据...")
-            response = requests.post(url, headers=self.headers, params=params, timeout=30)
+            response = self._request('POST', url, params=params, timeout=30, adaptive=False)
             
             if response.status_code in [200, 204]:
+                # 只有成功触发后才跟踪，失败时不让之后的等待去跟踪一个不存在的刷新
+                self._library_refresh_pending = True
                 logger.info("成功触发刷新: 搜索缺少的元数据")
                 return True
             else:
@@ -129,66 +351,138 @@ class JellyfinClient:
             logger.error(f"触发刷新失败: {e}")
             return False
     
+    def _get_library_refresh_status(self) -> Optional[Tuple[str, Optional[float]]]:
+        """
+        从 /Library/VirtualFolders 获取本媒体库的刷新状态
+        
+        Returns:
+            (RefreshStatus, RefreshProgress)，找不到本媒体库时返回None
+        """
+        url = f"{self.server_url}/Library/VirtualFolders"
+        resp = self._request('GET', url, timeout=10, adaptive=False)
+        if resp.status_code != 200:
+            return None
+        library_id = self.library_id.replace('-', '').lower()
+        for folder in resp.json():
+            if (folder.get('ItemId') or '').replace('-', '').lower() == library_id:
+                return folder.get('RefreshStatus') or 'Idle', folder.get('RefreshProgress')
+        return None
+    
+    @staticmethod
+    def _format_eta(elapsed: float, percent: float) -> str:
+        """按当前进度线性估算剩余时间"""
+        if percent <= 0:
+            return '未知'
+        remaining = elapsed * (100 - percent) / percent
+        return f"{remaining:.0f} 秒"
+    
     def wait_for_refresh_complete(self, check_interval: int = 5, max_wait: int = 300, extra_wait: int = 5) -> bool:
         """
         等待刷新任务完成
+        只跟踪本客户端最近触发的全库刷新（查看本媒体库的刷新进度）；
+        没有可跟踪的刷新时退回检查所有扫描/刷新类计划任务
         
         Args:
             check_interval: 检查间隔（秒）
             max_wait: 最大等待时间（秒）
-            extra_wait: 任务队列空闲后的额外等待时间（秒），确保后台操作真正完成
+            extra_wait: 完成后的额外等待时间（秒），确保后台操作真正完成
             
         Returns:
             是否在规定时间内完成
         """
+        library_pending = self._library_refresh_pending
+        self._library_refresh_pending = False
         try:
-            url = f"{self.server_url}/ScheduledTasks"
-            elapsed = 0
-            idle_count = 0  # 连续空闲次数
-            required_idle_checks = 3  # 需要连续空闲的检查次数
+            if library_pending:
+                done = self._wait_for_library_refresh(check_interval, max_wait)
+            else:
+                done = self._wait_for_any_refresh_task(check_interval, max_wait)
+        except Exception as e:
+            logger.error(f"检查刷新状态失败: {e}")
+            return False
+        
+        if done:
+            logger.info(f"刷新任务已完成，额外等待 {extra_wait} 秒确保后台操作完成...")
+            time.sleep(extra_wait)
+            logger.info("✓ 等待完成，NFO文件应该已稳定")
+        else:
+            logger.warning(f"等待超时（{max_wait}秒），但刷新可能仍在后台进行")
+        return done
+    
+    def _wait_for_library_refresh(self, check_interval: int, max_wait: int) -> bool:
+        """等待本客户端触发的全库刷新完成"""
+        start = time.monotonic()
+        required_idle_checks = 3  # 未观察到刷新开始时，需要连续空闲的检查次数
+        seen_active = False
+        idle_count = 0
+        logger.info(f"等待刷新任务完成（最多等待{max_wait}秒，跟踪本媒体库）...")
+        
+        while True:
+            status = self._get_library_refresh_status()
+            if status is None:
+                logger.debug("无法获取本媒体库的刷新进度，改为检查扫描/刷新类计划任务")
+                remaining = max(0, max_wait - (time.monotonic() - start))
+                return self._wait_for_any_refresh_task(check_interval, remaining)
+            state, progress = status
+            if state != 'Idle':
+                seen_active = True
+                idle_count = 0
+                percent = progress or 0.0
+            else:
+                idle_count += 1
+                # 刷新请求可能尚在队列中，未观察到开始时需连续确认空闲
+                if seen_active or idle_count >= required_idle_checks:
+                    return True
+                percent = 0.0
             
-            logger.info(f"等待刷新任务完成（最多等待{max_wait}秒）...")
+            elapsed = time.monotonic() - start
+            logger.info(f"刷新进度 {percent:.1f}%，已等待 {elapsed:.0f} 秒，"
+                        f"预计剩余 {self._format_eta(elapsed, percent)}")
+            if elapsed + check_interval > max_wait:
+                return False
+            time.sleep(check_interval)
+    
+    def _wait_for_any_refresh_task(self, check_interval: int, max_wait: int) -> bool:
+        """等待所有扫描/刷新类计划任务空闲（无法跟踪具体刷新时的兜底方式）"""
+        url = f"{self.server_url}/ScheduledTasks"
+        elapsed = 0
+        idle_count = 0  # 连续空闲次数
+        required_idle_checks = 3  # 需要连续空闲的检查次数
+        
+        logger.info(f"等待刷新任务完成（最多等待{max_wait}秒）...")
+        
+        while elapsed < max_wait:
+            response = self._request('GET', url, timeout=10, adaptive=False)
             
-            while elapsed < max_wait:
-                response = requests.get(url, headers=self.headers, timeout=10)
+            if response.status_code == 200:
+                tasks = response.json()
                 
-                if response.status_code == 200:
-                    tasks = response.json()
-                    
-                    # 查找刷新任务
-                    refresh_tasks = [
-                        task for task in tasks
-                        if 'Scan' in task.get('Name', '') or 'Refresh' in task.get('Name', '')
-                    ]
-                    
-                    # 检查是否还有运行中的任务
-                    running_tasks = [
-                        task for task in refresh_tasks
-                        if task.get('State') in ['Running', 'Cancelling']
-                    ]
-                    
-                    if not running_tasks:
-                        idle_count += 1
-                        if idle_count >= required_idle_checks:
-                            logger.info(f"刷新任务已完成，额外等待 {extra_wait} 秒确保后台操作完成...")
-                            time.sleep(extra_wait)
-                            logger.info("✓ 等待完成，NFO文件应该已稳定")
-                            return True
-                        else:
-                            logger.debug(f"任务队列空闲 ({idle_count}/{required_idle_checks})，继续确认...")
-                    else:
-                        idle_count = 0  # 重置计数
-                        logger.debug(f"还有 {len(running_tasks)} 个刷新任务运行中...")
+                # 查找刷新任务
+                refresh_tasks = [
+                    task for task in tasks
+                    if 'Scan' in task.get('Name', '') or 'Refresh' in task.get('Name', '')
+                ]
                 
-                time.sleep(check_interval)
-                elapsed += check_interval
-            
-            logger.warning(f"等待超时（{max_wait}秒），但刷新可能仍在后台进行")
-            return False
+                # 检查是否还有运行中的任务
+                running_tasks = [
+                    task for task in refresh_tasks
+                    if task.get('State') in ['Running', 'Cancelling']
+                ]
+                
+                if not running_tasks:
+                    idle_count += 1
+                    if idle_count >= required_idle_checks:
+                        return True
+                    else:
+                        logger.debug(f"任务队列空闲 ({idle_count}/{required_idle_checks})，继续确认...")
+                else:
+                    idle_count = 0  # 重置计数
+                    logger.debug(f"还有 {len(running_tasks)} 个刷新任务运行中...")
             
-        except Exception as e:
-            logger.error(f"检查刷新状态失败: {e}")
-            return False
+            time.sleep(check_interval)
+            elapsed += check_interval
+        
+        return False
     
     def get_library_info(self) -> Optional[dict]:
         """
@@ -199,7 +493,7 @@ class JellyfinClient:
         """
         try:
             url = f"{self.server_url}/Items/{self.library_id}"
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self._request('GET', url, timeout=10)
             
             if response.status_code == 200:
                 return response.json()
@@ -219,7 +513,7 @@ class JellyfinClient:
         try:
             url = f"{self.server_url}/Items/ByPath"
             params = {'Path': file_path}
-            resp = requests.get(url, headers=self.headers, params=params, timeout=10)
+            resp = self._request('GET', url, params=params, timeout=10)
             if resp.status_code == 200:
                 return resp.json()
             else:
@@ -230,21 +524,22 @@ class JellyfinClient:
             return None
 
     def refresh_item(self, item_id: str, *, replace_all_metadata: bool = False,
-                     metadata_refresh_mode: str = 'FullRefresh') -> bool:
+                     metadata_refresh_mode: str = 'FullRefresh', recursive: bool = False) -> bool:
         """
-        刷新单个媒体项
-        注意：replace_all_metadata=False 时会重新解析NFO但不会覆盖手动元数据
+        刷新单个媒体项（或文件夹）
+        注意：replace_all_metadata=False 时会重新解析NFO但不会覆盖手动元数据；
+        刷新文件夹时 recursive=False 刷新其直接子项，recursive=True 刷新其全部后代
         """
         try:
             url = f"{self.server_url}/Items/{item_id}/Refresh"
             params = {
-                'Recursive': 'false',
+                'Recursive': 'true' if recursive else 'false',
                 'MetadataRefreshMode': metadata_refresh_mode,
                 'ImageRefreshMode': 'Default',
                 'ReplaceAllMetadata': 'true' if replace_all_metadata else 'false',
                 'ReplaceAllImages': 'false'
             }
-            resp = requests.post(url, headers=self.headers, params=params, timeout=20)
+            resp = self._request('POST', url, params=params, timeout=20)
             if resp.status_code in [200, 204]:
                 return True
             logger.error(f"刷新单项失败（{resp.status_code}）: {resp.text}")
@@ -253,23 +548,166 @@ class JellyfinClient:
             logger.error(f"刷新单项出错: {e}")
             return False
 
-    def refresh_items_by_paths(self, file_paths: List[str], *, per_item_delay: float = 0.25,
+    def refresh_items_by_paths(self, file_paths: List[str], *, per_item_delay: Optional[float] = None,
                                replace_all_metadata: bool = False,
                                metadata_refresh_mode: str = 'FullRefresh') -> int:
         """
         按路径批量逐项刷新，返回成功数量
+        并发由自适应并发控制决定；per_item_delay 指定时每项之后额外固定等待
         """
-        ok = 0
-        for p in file_paths:
+        def refresh_path(p: str) -> bool:
             item = self.get_item_by_path(p)
             if not item or not item.get('Id'):
                 logger.warning(f"未找到媒体项（按路径）: {p}")
-                continue
-            if self.refresh_item(item['Id'], replace_all_metadata=replace_all_metadata,
-                                  metadata_refresh_mode=metadata_refresh_mode):
-                ok += 1
-            time.sleep(per_item_delay)
+                return False
+            ok = self.refresh_item(item['Id'], replace_all_metadata=replace_all_metadata,
+                                   metadata_refresh_mode=metadata_refresh_mode)
+            if per_item_delay:
+                time.sleep(per_item_delay)
+            return ok
+        
+        return self._run_concurrently(refresh_path, file_paths)
+    
+    def refresh_items(self, item_ids: List[str], *, per_item_delay: Optional[float] = None,
+                      replace_all_metadata: bool = False,
+                      metadata_refresh_mode: str = 'FullRefresh',
+                      recursive: bool = False) -> int:
+        """
+        按Id批量逐项刷新，返回成功数量
+        并发由自适应并发控制决定；per_item_delay 指定时每项之后额外固定等待；
+        recursive 见 refresh_item
+        """
+        def refresh_one(item_id: str) -> bool:
+            ok = self.refresh_item(item_id, replace_all_metadata=replace_all_metadata,
+                                   metadata_refresh_mode=metadata_refresh_mode, recursive=recursive)
+            if per_item_delay:
+                time.sleep(per_item_delay)
+            return ok
+        
+        return self._run_concurrently(refresh_one, item_ids)
+    
+    def _run_concurrently(self, func, args: List) -> int:
+        """在线程池中执行，实际同时进行的请求数由 self.throttle 限制；返回成功数量"""
+        if not args:
+            return 0
+        workers = min(self.throttle.max_concurrency, len(args))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            ok = sum(1 for result in pool.map(func, args) if result)
+        metrics = self.throttle.get_metrics()
+        logger.debug(f"逐项请求完成: 并发 {metrics['concurrency_final']}, "
+                     f"p95延迟 {metrics['latency_ms_p95']} ms, 错误 {metrics['errors']}")
         return ok
+    
+    def get_library_items(self, fields: Optional[List[str]] = None,
+                          page_size: int = 500, folders: bool = False) -> Optional[List[Dict]]:
+        """
+        分页批量获取媒体库中的所有媒体项（不含文件夹）
+        每项都包含 Id 与 ParentId；配置了列表缓存时只获取上次之后保存过的条目并与缓存合并
+        
+        Args:
+            fields: 额外返回的字段，默认 ['Tags', 'Path']
+            page_size: 每页数量
+            folders: 为True时改为获取媒体库中的所有文件夹
+            
+        Returns:
+            媒体项列表，失败返回None
+        """
+        if fields is None:
+            fields = ['Tags', 'Path']
+        kind = '文件夹' if folders else '媒体项'
+        cache = self.listing_cache
+        if cache is None:
+            result = self._fetch_items(fields, page_size, folders)
+            if result is None:
+                return None
+            logger.info(f"共获取 {len(result[0])} 个Jellyfin{kind}")
+            return result[0]
+        
+        fields = sorted(set(fields) | {'DateLastSaved'})
+        key = f"{'folders' if folders else 'items'}:{','.join(fields)}"
+        with self._listing_lock:
+            watermark = cache.get_watermark(key)
+            if watermark is not None:
+                # 先取总数：其响应的 Date 头即本次获取的开始时间
+                count = self._count_items(folders)
+                delta = self._fetch_items(fields, page_size, folders, min_date_last_saved=watermark)
+                if count is not None and delta is not None:
+                    items = cache.merge(key, delta[0], count[0], count[1])
+                    if items is not None:
+                        cache.save()
+                        logger.info(f"共 {len(items)} 个Jellyfin{kind}（缓存，增量获取 {len(delta[0])} 个）")
+                        return items
+                    logger.info(f"缓存的{kind}与服务器不一致（有条目被删除），重新获取完整列表")
+            
+            result = self._fetch_items(fields, page_size, folders)
+            if result is None:
+                return None
+            cache.replace(key, result[0], result[2])
+            cache.save()
+            logger.info(f"共获取 {len(result[0])} 个Jellyfin{kind}（已缓存）")
+            return result[0]
+    
+    def _items_params(self, folders: bool) -> Dict:
+        """媒体项列表请求的公共参数"""
+        return {
+            'ParentId': self.library_id,
+            'Recursive': 'true',
+            'IsFolder': 'true' if folders else 'false',
+            'EnableImages': 'false',
+            'EnableUserData': 'false'
+        }
+    
+    def _count_items(self, folders: bool) -> Optional[Tuple[int, Optional[str]]]:
+        """媒体库中的媒体项（或文件夹）总数与响应的 Date 头，失败返回None"""
+        try:
+            params = dict(self._items_params(folders), Limit=0)
+            resp = self._request('GET', f"{self.server_url}/Items", params=params, timeout=60)
+            if resp.status_code != 200:
+                logger.error(f"获取媒体项数量失败（{resp.status_code}）: {resp.text}")
+                return None
+            return resp.json().get('TotalRecordCount', 0), resp.headers.get('Date')
+        except Exception as e:
+            logger.error(f"获取媒体项数量出错: {e}")
+            return None
+    
+    def _fetch_items(self, fields: List[str], page_size: int, folders: bool,
+                     min_date_last_saved: Optional[str] = None
+                     ) -> Optional[Tuple[List[Dict], int, Optional[str]]]:
+        """
+        分页获取媒体项
+        
+        Returns:
+            (媒体项列表, 服务器返回的总数, 第一个响应的 Date 头)，失败返回None
+        """
+        url = f"{self.server_url}/Items"
+        items: List[Dict] = []
+        start_index = 0
+        total = 0
+        server_date = None
+        try:
+            while True:
+                params = dict(self._items_params(folders), Fields=','.join(fields),
+                              StartIndex=start_index, Limit=page_size)
+                if min_date_last_saved:
+                    params['MinDateLastSaved'] = min_date_last_saved
+                resp = self._request('GET', url, params=params, timeout=60, adaptive=False)
+                if resp.status_code != 200:
+                    logger.error(f"获取媒体项列表失败（{resp.status_code}）: {resp.text}")
+                    return None
+                if start_index == 0:
+                    server_date = resp.headers.get('Date')
+                data = resp.json()
+                page = data.get('Items', [])
+                items.extend(page)
+                start_index += len(page)
+                total = data.get('TotalRecordCount', 0)
+                logger.debug(f"已获取媒体项 {start_index}/{total}")
+                if not page or start_index >= total:
+                    break
+            return items, total, server_date
+        except Exception as e:
+            logger.error(f"获取媒体项列表出错: {e}")
+            return None
 
     def get_metadata_path(self) -> Optional[Path]:
         """
@@ -281,7 +719,7 @@ class JellyfinClient:
         """
         try:
             url = f"{self.server_url}/System/Info"
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self._request('GET', url, timeout=10)
             
             if response.status_code == 200:
                 info = response.json()
@@ -305,17 +743,37 @@ class JellyfinClient:
             logger.error(f"获取元数据路径失败: {e}")
             return None
     
-    def clear_library_metadata_cache(self, backup: bool = True) -> bool:
+    @staticmethod
+    def item_metadata_dir(library_cache: Path, item_id: str) -> Path:
+        """
+        媒体项在Jellyfin元数据缓存中的目录
+        Jellyfin按 metadata/library/<Id前两位>/<Id（无连字符）> 存放
+        """
+        normalized = item_id.replace('-', '').lower()
+        return library_cache / normalized[:2] / normalized
+    
+    def clear_library_metadata_cache(self, backup: bool = True, item_ids: Optional[List[str]] = None,
+                                     backup_mode: str = 'hardlink') -> bool:
         """
         清除指定媒体库的元数据缓存
         这将强制Jellyfin重新读取NFO文件，确保标签删除能够同步
         
         Args:
-            backup: 是否备份元数据目录
+            backup: 是否备份将被清除的缓存
+            item_ids: 只清除这些媒体项的缓存（默认清除整个 metadata/library）
+            backup_mode: 备份方式
+                - 'hardlink': 硬链接到备份目录（几乎不占空间和时间，跨磁盘时退回复制）
+                - 'tar': 写入 gzip 压缩的 tar 包
+                - 'copy': 完整复制（旧行为）
             
         Returns:
             是否成功清除
         """
+        import shutil
+        
+        if backup_mode not in ('hardlink', 'tar', 'copy'):
+            raise ValueError(f"不支持的备份方式: {backup_mode}")
+        
         try:
             metadata_path = self.get_metadata_path()
             if not metadata_path:
@@ -328,18 +786,37 @@ class JellyfinClient:
                 logger.warning(f"媒体库缓存目录不存在: {library_cache}")
                 return False
             
+            if item_ids is None:
+                targets = list(library_cache.iterdir())
+            else:
+                targets = [self.item_metadata_dir(library_cache, item_id) for item_id in item_ids]
+                targets = [target for target in targets if target.exists()]
+                logger.info(f"按条目清除缓存: {len(targets)}/{len(item_ids)} 个条目存在缓存目录")
+            
             # 备份（可选）
-            if backup:
+            if backup and targets:
+                backup_start = time.perf_counter()
                 backup_path = metadata_path.parent / f'metadata_backup_{int(time.time())}'
                 try:
-                    shutil.copytree(library_cache, backup_path / 'library')
-                    logger.info(f"已备份元数据到: {backup_path}")
+                    if backup_mode == 'tar':
+                        backup_path = backup_path.with_name(backup_path.name + '.tar.gz')
+                        self._backup_tar(targets, metadata_path, backup_path)
+                    elif backup_mode == 'hardlink':
+                        self._backup_hardlink(targets, metadata_path, backup_path)
+                    elif item_ids is None:
+                        shutil.copytree(library_cache, backup_path / 'library')
+                    else:
+                        for target in targets:
+                            shutil.copytree(target, backup_path / target.relative_to(metadata_path))
+                    logger.info(f"已备份元数据到: {backup_path}（{backup_mode}，"
+                                f"耗时 {time.perf_counter() - backup_start:.2f} 秒）")
                 except Exception as e:
                     logger.warning(f"备份元数据失败（继续执行清除）: {e}")
             
             # 清除缓存
+            clear_start = time.perf_counter()
             deleted_count = 0
-            for item in library_cache.iterdir():
+            for item in targets:
                 try:
                     if item.is_dir():
                         shutil.rmtree(item)
@@ -349,9 +826,33 @@ class JellyfinClient:
                 except Exception as e:
                     logger.warning(f"删除缓存项失败 {item}: {e}")
             
-            logger.info(f"已清除 {deleted_count} 个元数据缓存项")
+            logger.info(f"已清除 {deleted_count} 个元数据缓存项（耗时 {time.perf_counter() - clear_start:.2f} 秒）")
             return True
             
         except Exception as e:
             logger.error(f"清除元数据缓存失败: {e}")
             return False
+    
+    @staticmethod
+    def _backup_hardlink(targets: List[Path], base: Path, backup_path: Path):
+        """以硬链接方式备份（保持相对 base 的目录结构），无法硬链接时复制该文件"""
+        import shutil
+        
+        for target in targets:
+            files = [target] if target.is_file() else [p for p in target.rglob('*') if p.is_file()]
+            for src in files:
+                dest = backup_path / src.relative_to(base)
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.link(src, dest)
+                except OSError:
+                    shutil.copy2(src, dest)
+    
+    @staticmethod
+    def _backup_tar(targets: List[Path], base: Path, backup_file: Path):
+        """以流式写入的 gzip 压缩 tar 包备份（包内保持相对 base 的路径）"""
+        import tarfile
+        
+        with tarfile.open(backup_file, 'w:gz') as tar:
+            for target in targets:
+                tar.add(str(target), arcname=str(target.relative_to(base)))
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Jellyfin媒体项列表缓存模块
+把分页获取的媒体项列表按 Id 保存到磁盘，下次只用 MinDateLastSaved 获取之后保存过的条目并合并；
+增量合并后的条目数与服务器的总数不一致（有条目被删除）或缓存过旧时重新获取完整列表
+（Jellyfin的 /Items 不返回 ETag/Last-Modified，无法使用条件请求）
+
+水位取获取开始时服务器的时间（响应的 Date 头）再提前 overlap_seconds，而不是已获取条目中最大的
+DateLastSaved：分页获取期间前面页的条目可能被重新保存（如全库 ReplaceAllMetadata 之后立即列举），
+其 DateLastSaved 会早于后面页的条目，按最大值推进水位会永久漏掉这次保存
+
+删除只能通过条目数发现：同一时段内删除与新增的条目数恰好相等时无法发现删除，
+由 max_age_hours 的定期完整获取兜底
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_watermark(server_date: Optional[str], overlap_seconds: float) -> str:
+    """
+    由获取开始时服务器响应的 Date 头计算下一次增量获取的 MinDateLastSaved
+
+    Args:
+        server_date: 第一个响应的 Date 头（HTTP日期，秒级精度；缺失时使用本机时间）
+        overlap_seconds: 提前的重叠时长，覆盖秒级精度、时钟误差与获取开始时正在进行的保存
+
+    Returns:
+        Jellyfin格式的UTC时间（如 2026-01-01T00:00:00.0000000Z）
+    """
+    started = None
+    if server_date:
+        try:
+            started = parsedate_to_datetime(server_date)
+        except (TypeError, ValueError):
+            started = None
+    if started is None or started.tzinfo is None:
+        started = datetime.now(timezone.utc)
+    watermark = started.astimezone(timezone.utc) - timedelta(seconds=overlap_seconds)
+    return watermark.strftime('%Y-%m-%dT%H:%M:%S.0000000Z')
+
+
+class ListingCache:
+    """
+    媒体项列表的磁盘缓存
+    每种列表（媒体项/文件夹 + 字段组合）一个条目: {'fetched': 完整获取时间, 'watermark': 上次获取开始时间, 'items': {Id: 媒体项}}
+    """
+
+    VERSION = 2
+
+    def __init__(self, cache_file: str, max_age_hours: float = 24, overlap_seconds: float = 300):
+        """
+        Args:
+            cache_file: 缓存文件路径（JSON）
+            max_age_hours: 距上次完整获取超过该时长后重新获取完整列表
+            overlap_seconds: 增量获取的重叠时长（见 fetch_watermark）
+        """
+        self.cache_file = Path(cache_file)
+        self.max_age = max_age_hours * 3600
+        self.overlap_seconds = overlap_seconds
+        self._entries: Dict[str, Dict] = {}
+        if self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == self.VERSION:
+                    self._entries = data.get('listings', {})
+            except Exception as e:
+                logger.warning(f"读取媒体项列表缓存失败，将重新获取 {self.cache_file}: {e}")
+
+    def get_watermark(self, key: str) -> Optional[str]:
+        """
+        可用于增量获取的 MinDateLastSaved（没有缓存、缓存过旧或服务器不返回 DateLastSaved 时为None）
+        """
+        entry = self._entries.get(key)
+        if entry is None or not entry.get('watermark'):
+            return None
+        if time.time() - entry.get('fetched', 0) > self.max_age:
+            return None
+        return entry['watermark']
+
+    def merge(self, key: str, delta: List[Dict], total: int,
+              server_date: Optional[str]) -> Optional[List[Dict]]:
+        """
+        把增量合并到缓存
+
+        Args:
+            key: 列表的键
+            delta: 上次之后保存过的媒体项
+            total: 服务器返回的媒体项总数
+            server_date: 本次获取第一个响应的 Date 头
+
+        Returns:
+            合并后的完整列表；条目数与 total 不一致时返回None（需要重新获取完整列表）
+        """
+        entry = self._entries[key]
+        items = entry['items']
+        for item in delta:
+            items[item['Id']] = item
+        if len(items) != total:
+            return None
+        entry['watermark'] = self._next_watermark(delta, server_date)
+        return list(items.values())
+
+    def replace(self, key: str, items: List[Dict], server_date: Optional[str]):
+        """用完整列表替换缓存（server_date 为本次获取第一个响应的 Date 头）"""
+        self._entries[key] = {
+            'fetched': time.time(),
+            'watermark': self._next_watermark(items, server_date),
+            'items': {item['Id']: item for item in items}
+        }
+
+    def _next_watermark(self, items: List[Dict], server_date: Optional[str]) -> Optional[str]:
+        """下一次增量获取的水位（有条目缺少 DateLastSaved 时为None，即服务器不支持增量获取）"""
+        if any(not item.get('DateLastSaved') for item in items):
+            return None
+        return fetch_watermark(server_date, self.overlap_seconds)
+
+    def save(self):
+        """写回缓存文件（先写临时文件再替换）"""
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.cache_file.with_name(self.cache_file.name + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'listings': self._entries}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            logger.warning(f"保存媒体项列表缓存失败 {self.cache_file}: {e}")
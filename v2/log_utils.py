@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志工具模块
+日志记录经 QueueHandler 放入队列，由 QueueListener 在后台线程写入滚动日志文件与控制台，
+逐条目的热循环不再同步等待控制台或网络盘上的日志文件；逐条目的变更日志按批汇总输出
+"""
+
+import atexit
+import logging
+import queue
+import sys
+from typing import List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # logging.handlers 会导入 socket 等模块，只在配置日志时才导入
+    from logging.handlers import QueueHandler, QueueListener
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# 单个日志文件的最大字节数与保留的历史文件数
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+_listener: Optional['QueueListener'] = None
+_queue_handler: Optional['QueueHandler'] = None
+
+
+def setup_queued_logging(log_path: str, level: str = 'INFO', stream=None,
+                         max_bytes: int = LOG_MAX_BYTES,
+                         backup_count: int = LOG_BACKUP_COUNT) -> 'QueueListener':
+    """
+    配置异步日志：根日志记录器只挂一个 QueueHandler，文件与控制台输出在后台线程完成
+
+    Args:
+        log_path: 日志文件路径（按 max_bytes 滚动）
+        level: 日志级别
+        stream: 控制台输出流（默认标准输出）
+        max_bytes: 单个日志文件的最大字节数
+        backup_count: 保留的历史日志文件数
+
+    Returns:
+        已启动的 QueueListener（进程退出时自动停止并写完队列中的日志）
+    """
+    global _listener, _queue_handler
+    from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+    stop_queued_logging()
+
+    formatter = logging.Formatter(LOG_FORMAT, datefmt=DATE_FORMAT)
+    file_handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backup_count,
+                                       encoding='utf-8')
+    console_handler = logging.StreamHandler(stream or sys.stdout)
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    _queue_handler = QueueHandler(log_queue)
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level.upper()))
+    root.addHandler(_queue_handler)
+
+    _listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_queued_logging():
+    """停止后台日志线程（写完队列中的日志并关闭文件）"""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_queued_logging)
+
+
+class BatchedChangeLog:
+    """
+    逐条目变更日志的批量汇总
+    每积累 batch_size 行输出一条多行日志记录，代替每个条目一条记录
+    """
+
+    def __init__(self, logger: logging.Logger, title: str, batch_size: int = 200,
+                 level: int = logging.INFO):
+        """
+        Args:
+            logger: 日志记录器
+            title: 每批日志的标题
+            batch_size: 每批的行数
+            level: 日志级别
+        """
+        self.logger = logger
+        self.title = title
+        self.batch_size = batch_size
+        self.level = level
+        self.enabled = logger.isEnabledFor(level)
+        self.count = 0
+        self._lines: List[str] = []
+
+    def add(self, line: str):
+        """记录一行（日志级别未启用时直接丢弃）"""
+        self.count += 1
+        if not self.enabled:
+            return
+        self._lines.append(line)
+        if len(self._lines) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """输出已积累的行"""
+        if not self._lines:
+            return
+        first = self.count - len(self._lines) + 1
+        body = '\n  '.join(self._lines)
+        self.logger.log(self.level, f"{self.title}（第 {first}-{self.count} 项）:\n  {body}")
+        self._lines = []
+
+    def __enter__(self) -> 'BatchedChangeLog':
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Eagle metadata.json 解析模块
+一次性以字节读取文件，只提取同步需要的字段；
+安装了 orjson 时自动使用 orjson，否则使用标准库 json
+"""
+
+import json
+from typing import Callable, Dict, List, NamedTuple
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+
+class EagleMetadata(NamedTuple):
+    """metadata.json 中同步需要的字段（palettes、annotation、url 等大字段不保留）"""
+    name: str
+    ext: str
+    tags: List[str]
+    folders: List[str]
+    modification_time: int
+
+
+_BACKENDS: Dict[str, Callable[[bytes], object]] = {'json': json.loads}
+if orjson is not None:
+    _BACKENDS['orjson'] = orjson.loads
+
+_backend_name = 'orjson' if orjson is not None else 'json'
+_loads = _BACKENDS[_backend_name]
+
+
+def available_backends() -> List[str]:
+    """可用的解析后端"""
+    return list(_BACKENDS)
+
+
+def get_backend() -> str:
+    """当前使用的解析后端名称"""
+    return _backend_name
+
+
+def set_backend(name: str):
+    """
+    切换解析后端
+
+    Args:
+        name: 'json' 或 'orjson'
+    """
+    global _backend_name, _loads
+    if name not in _BACKENDS:
+        raise ValueError(f"不支持的解析后端: {name}（可用: {', '.join(_BACKENDS)}）")
+    _backend_name = name
+    _loads = _BACKENDS[name]
+
+
+def loads(raw: bytes):
+    """用当前后端解析JSON字节（如Eagle API的响应）"""
+    return _loads(raw)
+
+
+def parse_metadata(raw: bytes) -> EagleMetadata:
+    """
+    从 metadata.json 的原始字节中提取需要的字段
+
+    Args:
+        raw: 文件内容
+
+    Returns:
+        EagleMetadata
+
+    Raises:
+        ValueError: 内容不是合法的JSON（json.JSONDecodeError 与 orjson.JSONDecodeError 均为其子类）
+    """
+    data = _loads(raw)
+    return EagleMetadata(
+        data.get('name', ''),
+        data.get('ext', ''),
+        data.get('tags') or [],
+        data.get('folders') or [],
+        data.get('modificationTime') or 0
+    )
+
+
+def read_metadata(path: str) -> EagleMetadata:
+    """
+    读取并解析 metadata.json（一次系统调用读取整个文件）
+
+    Args:
+        path: metadata.json 路径
+
+    Returns:
+        EagleMetadata
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return parse_metadata(raw)
+
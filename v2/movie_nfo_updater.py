@@ -7,9 +7,13 @@ NFO标签更新模块 - 直接修改movie.nfo添加标签
 
 import logging
 from pathlib import Path
-from typing import List, Set, Tuple
+from typing import List, Optional, Set, Tuple
 import xml.etree.ElementTree as ET
 
+from eagle_reader import MediaItem
+from log_utils import BatchedChangeLog
+from nfo_state import NFOStateStore
+
 logger = logging.getLogger(__name__)
 
 
@@ -101,13 +105,15 @@ class MovieNFOUpdater:
             return False
     
     @staticmethod
-    def batch_update_movie_nfos(media_items: List[dict]) -> Tuple[int, int, int, int, bool, List[dict]]:
+    def batch_update_movie_nfos(media_items: List[MediaItem],
+                                nfo_state: Optional[NFOStateStore] = None) -> Tuple[int, int, int, int, bool, List[dict]]:
         """
         批量更新movie.nfo文件
         支持标签的增加、删除和修改
         
         Args:
-            media_items: 媒体文件信息列表
+            media_items: MediaItem列表（来自EagleReader，标签以全局标签表Id保存）
+            nfo_state: NFO写入状态记录（可选），写入或确认标签正确的movie.nfo会被记录
             
         Returns:
             (成功数量, 失败数量, 跳过数量, 变更数量, 是否有标签删除, 变更项列表)
@@ -118,16 +124,20 @@ class MovieNFOUpdater:
         changed_count = 0
         has_tag_deletions = False  # 标记是否有任何标签被删除
         changed_items: List[dict] = []  # 记录变更的媒体项（用于后续逐项刷新）
+        # 逐条目的日志按批汇总输出，DEBUG 未启用时不格式化逐条目的明细
+        debug = logger.isEnabledFor(logging.DEBUG)
+        change_log = BatchedChangeLog(logger, "检测到标签变更")
         
         for item in media_items:
-            folder_path = Path(item['folder_path'])
+            folder_path = Path(item.folder_path)
             movie_nfo = folder_path / 'movie.nfo'
-            current_tags = set(item['tags'])  # Eagle中的当前标签
+            tag_table = item.tag_table
+            current_ids = item.tag_ids  # Eagle中的当前标签（有序Id元组）
 
             # 如果movie.nfo不存在
             if not movie_nfo.exists():
                 # 只有有标签时才创建
-                if not current_tags:
+                if not current_ids:
                     skip_count += 1
                     continue
                     
@@ -139,15 +149,18 @@ class MovieNFOUpdater:
                         from nfo_writer import NFOWriter  # type: ignore
 
                     title = item.get('item_name') or Path(item['file_path']).stem
-                    base_xml = NFOWriter.create_nfo_content(title=title, tags=list(current_tags))
+                    base_xml = NFOWriter.create_nfo_content(title=title, tags=list(item.tags))
                     movie_nfo.write_text(base_xml, encoding='utf-8')
+                    if nfo_state is not None:
+                        nfo_state.record(str(movie_nfo))
                     success_count += 1
                     changed_count += 1
                     changed_items.append({
                         'file_path': item['file_path'],
-                        'has_deletion': False
+                        'has_deletion': False,
+                        'created': True
                     })
-                    logger.debug(f"已创建movie.nfo并写入{len(current_tags)}个标签: {movie_nfo}")
+                    change_log.add(f"[{item['file_name']}] 新建movie.nfo, {len(current_ids)}个标签")
                     continue
                 except Exception as e:
                     logger.error(f"创建movie.nfo失败 {movie_nfo}: {e}")
@@ -157,9 +170,8 @@ class MovieNFOUpdater:
             # movie.nfo存在：检测标签变更
             existing_tags = MovieNFOUpdater.get_existing_tags(str(movie_nfo))
             
-            # 对比标签变化
-            added_tags = current_tags - existing_tags
-            removed_tags = existing_tags - current_tags
+            # 对比标签变化（NFO中的标签不登记到标签表，删除的标签以字符串返回）
+            added_tags, removed_tags = tag_table.diff(current_ids, existing_tags)
             
             # 如果有标签被删除，设置标志
             if removed_tags:
@@ -168,29 +180,34 @@ class MovieNFOUpdater:
             # 如果没有变化，跳过
             if not added_tags and not removed_tags:
                 skip_count += 1
-                logger.debug(f"标签无变化，跳过: {item['file_name']}")
+                if nfo_state is not None:
+                    nfo_state.record(str(movie_nfo))
+                if debug:
+                    logger.debug(f"标签无变化，跳过: {item['file_name']}")
                 continue
             
             # 记录变更
             if added_tags or removed_tags:
                 changed_count += 1
-                logger.info(f"检测到标签变更 [{item['file_name']}]: "
-                           f"新增{len(added_tags)}个, 删除{len(removed_tags)}个")
-                if added_tags:
-                    logger.debug(f"  新增: {added_tags}")
-                if removed_tags:
-                    logger.debug(f"  删除: {removed_tags}")
+                change_log.add(f"[{item['file_name']}] 新增{len(added_tags)}个, 删除{len(removed_tags)}个")
+                if debug:
+                    logger.debug(f"[{item['file_name']}] 新增: {tag_table.decode(added_tags)}, "
+                                 f"删除: {removed_tags}")
                 changed_items.append({
                     'file_path': item['file_path'],
-                    'has_deletion': len(removed_tags) > 0
+                    'has_deletion': len(removed_tags) > 0,
+                    'created': False
                 })
             
             # 更新NFO（用当前标签完全替换）
-            if MovieNFOUpdater.update_movie_nfo_with_tags(str(movie_nfo), list(current_tags)):
+            if MovieNFOUpdater.update_movie_nfo_with_tags(str(movie_nfo), list(item.tags)):
+                if nfo_state is not None:
+                    nfo_state.record(str(movie_nfo))
                 success_count += 1
             else:
                 fail_count += 1
         
+        change_log.flush()
         logger.info(f"Movie.nfo更新完成: 成功 {success_count}, 失败 {fail_count}, "
                    f"跳过 {skip_count}, 变更 {changed_count}")
         if has_tag_deletions:
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多库/多服务器同步模块
+按配置中的 mappings 把多个Eagle库同步到一个或多个Jellyfin服务器的不同媒体库，
+各映射并发执行；同一服务器上的映射共享HTTP会话、自适应并发上限与 路径 -> Id 缓存
+
+配置示例:
+{
+  "servers": {
+    "nas": {"url": "http://nas:8096", "api_key": "...", "max_concurrency": 8}
+  },
+  "mappings": [
+    {"name": "movies", "eagle_library_path": "E:\\\\Movies.library", "server": "nas", "library_id": "..."},
+    {"name": "clips", "eagle_library_path": "E:\\\\Clips.library", "server": "nas", "library_id": "...",
+     "sync": {"max_item_refreshes": 50}}
+  ],
+  "sync": {},                    // 所有映射的默认同步设置
+  "max_parallel_mappings": 4     // 可选：同时执行的映射数量，默认全部并发
+}
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, TYPE_CHECKING
+
+from eagle_reader import ScanFilter
+from sync_v2_simple import get_listing_cache, get_state_dir, repair_tags, sync_tags_v2
+
+if TYPE_CHECKING:
+    from jellyfin_client import JellyfinClient
+    from listing_cache import ListingCache
+
+
+class Mapping(NamedTuple):
+    """一个 Eagle库 -> Jellyfin媒体库 的同步映射"""
+    name: str
+    server: str
+    config: dict  # 与单库配置相同结构的配置（eagle/jellyfin/sync）
+
+
+def load_mappings(config: dict) -> List[Mapping]:
+    """
+    把多映射配置展开为每个映射各自的单库配置
+    每个映射的运行状态（文件名缓存、NFO写入记录等）保存在状态目录下以映射名命名的子目录中
+
+    Args:
+        config: 配置字典（包含 servers 与 mappings）
+
+    Returns:
+        映射列表
+
+    Raises:
+        ValueError: 映射引用了不存在的服务器、缺少必需字段或映射名重复
+    """
+    servers = config.get('servers', {})
+    default_sync = config.get('sync', {})
+    base_state_dir = get_state_dir(config)
+
+    mappings: List[Mapping] = []
+    names = set()
+    for index, entry in enumerate(config['mappings']):
+        name = entry.get('name') or f'mapping{index + 1}'
+        if name in names:
+            raise ValueError(f"映射名重复: {name}")
+        names.add(name)
+
+        server_name = entry.get('server')
+        if server_name not in servers:
+            raise ValueError(f"映射 {name} 引用了不存在的服务器: {server_name}")
+        for key in ('eagle_library_path', 'library_id'):
+            if not entry.get(key):
+                raise ValueError(f"映射 {name} 缺少 {key}")
+
+        sync_config = dict(default_sync)
+        sync_config.update(entry.get('sync', {}))
+        if not entry.get('sync', {}).get('state_dir'):
+            sync_config['state_dir'] = str(base_state_dir / name)
+
+        eagle_config = {'library_path': entry['eagle_library_path']}
+        if entry.get('eagle_api_url'):
+            # Eagle同一时间只打开一个库，只有该库的映射能通过API读取
+            eagle_config['api_url'] = entry['eagle_api_url']
+        mappings.append(Mapping(name, server_name, {
+            'eagle': eagle_config,
+            'jellyfin': dict(servers[server_name], library_id=entry['library_id']),
+            'sync': sync_config
+        }))
+    return mappings
+
+
+class ServerPool:
+    """同一Jellyfin服务器上所有映射共享的连接、并发控制与 路径 -> Id 缓存"""
+
+    def __init__(self, server_config: dict):
+        # 延迟导入：只有真正访问Jellyfin时才加载 requests
+        import requests
+        from jellyfin_client import AdaptiveThrottle, PathIdCache
+
+        self.server_config = server_config
+        self.session = requests.Session()
+        self.throttle = AdaptiveThrottle(
+            latency_target_ms=server_config.get('latency_target_ms', 500),
+            max_concurrency=server_config.get('max_concurrency', 8)
+        )
+        self.path_ids = PathIdCache()
+        self.clients: List['JellyfinClient'] = []
+
+    def create_client(self, library_id: str,
+                      listing_cache: Optional['ListingCache'] = None) -> 'JellyfinClient':
+        """为一个媒体库创建共享本服务器资源的客户端"""
+        from jellyfin_client import JellyfinClient
+
+        client = JellyfinClient(
+            self.server_config['url'],
+            self.server_config['api_key'],
+            library_id,
+            session=self.session,
+            throttle=self.throttle,
+            path_ids=self.path_ids,
+            listing_cache=listing_cache
+        )
+        self.clients.append(client)
+        return client
+
+
+def run_mappings(config: dict, logger: logging.Logger, dry_run: bool = False,
+                 repair: bool = False, scan_filter: Optional[ScanFilter] = None,
+                 time_budget: Optional[float] = None) -> int:
+    """
+    并发执行所有映射的同步（或修复）
+
+    Args:
+        config: 多映射配置
+        logger: 日志记录器（每个映射使用以映射名命名的子日志记录器）
+        dry_run: 是否模拟运行
+        repair: 是否执行修复模式（见 repair_tags）
+        scan_filter: 子集过滤条件（可选，对每个映射分别生效；
+                     映射的Eagle库中找不到指定文件夹时该映射失败）
+        time_budget: 每个映射的时间预算（秒，可选，仅同步模式）
+
+    Returns:
+        失败的映射数量
+    """
+    mappings = load_mappings(config)
+    if not mappings:
+        logger.warning("配置中没有任何映射")
+        return 0
+
+    pools: Dict[str, ServerPool] = {}
+    if not dry_run:
+        for mapping in mappings:
+            if mapping.server not in pools:
+                pools[mapping.server] = ServerPool(config['servers'][mapping.server])
+
+    def run_one(mapping: Mapping) -> bool:
+        mapping_logger = logger.getChild(mapping.name)
+        client: Optional['JellyfinClient'] = None
+        if mapping.server in pools:
+            client = pools[mapping.server].create_client(
+                mapping.config['jellyfin']['library_id'], get_listing_cache(mapping.config))
+        if repair:
+            return repair_tags(mapping.config, mapping_logger, dry_run=dry_run, client=client,
+                               scan_filter=scan_filter)
+        return sync_tags_v2(mapping.config, mapping_logger, dry_run=dry_run, client=client,
+                            scan_filter=scan_filter, time_budget=time_budget)
+
+    max_workers = config.get('max_parallel_mappings') or len(mappings)
+    logger.info(f"共 {len(mappings)} 个映射，{len(config.get('servers', {}))} 个服务器，"
+                f"最多同时执行 {max_workers} 个")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run_one, mappings))
+
+    failed = [mapping.name for mapping, ok in zip(mappings, results) if not ok]
+
+    metrics_file = str(get_state_dir(config) / 'jellyfin_metrics.jsonl')
+    for server_name, pool in pools.items():
+        if not pool.clients:
+            continue
+        # 同一服务器的客户端共享并发控制，统计按服务器导出一次
+        metrics = pool.clients[0].export_metrics(
+            metrics_file, server=server_name,
+            library_ids=[client.library_id for client in pool.clients]
+        )
+        logger.info(f"[{server_name}] Jellyfin请求统计: {metrics['requests']} 个请求, "
+                    f"错误 {metrics['errors']} 个, p95延迟 {metrics['latency_ms_p95']} ms, "
+                    f"并发 {metrics['concurrency_min']}~{metrics['concurrency_max']}")
+
+    if failed:
+        logger.error(f"以下映射同步失败: {', '.join(failed)}")
+    else:
+        logger.info(f"✓ 全部 {len(mappings)} 个映射已完成")
+    return len(failed)
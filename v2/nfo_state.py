@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+movie.nfo 写入状态记录模块
+记录本工具最后一次写入（或确认）的每个movie.nfo的 mtime、大小与内容哈希，
+用于发现被Jellyfin（库扫描、元数据保存器）自行重写的NFO
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# check() 的返回值
+UNCHANGED = 'unchanged'
+MODIFIED = 'modified'
+MISSING = 'missing'
+UNTRACKED = 'untracked'
+
+
+def _file_digest(path: str) -> str:
+    """计算文件内容的SHA-1"""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class NFOStateStore:
+    """
+    movie.nfo路径 -> [mtime_ns, 大小, SHA-1] 的持久记录
+    先比较 mtime 与大小，只有不一致时才计算哈希（仅被touch等内容未变的情况不算外部修改）
+    """
+
+    VERSION = 1
+
+    def __init__(self, state_file: str):
+        """
+        Args:
+            state_file: 状态文件路径（JSON）
+        """
+        self.state_file = Path(state_file)
+        self._entries: Dict[str, List] = {}
+        self._dirty = False
+        if self.state_file.exists():
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == self.VERSION:
+                    self._entries = data.get('files', {})
+            except Exception as e:
+                logger.warning(f"读取NFO写入状态失败，将重新记录 {self.state_file}: {e}")
+
+    def record(self, nfo_path: str):
+        """
+        记录movie.nfo的当前状态（写入或确认标签正确之后调用）
+
+        Args:
+            nfo_path: movie.nfo文件路径
+        """
+        try:
+            st = os.stat(nfo_path)
+            entry = self._entries.get(nfo_path)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                return
+            self._entries[nfo_path] = [st.st_mtime_ns, st.st_size, _file_digest(nfo_path)]
+            self._dirty = True
+        except OSError as e:
+            logger.debug(f"记录NFO状态失败 {nfo_path}: {e}")
+
+    def check(self, nfo_path: str) -> str:
+        """
+        判断movie.nfo自上次记录以来是否被外部修改
+
+        Args:
+            nfo_path: movie.nfo文件路径
+
+        Returns:
+            UNCHANGED / MODIFIED / MISSING（已记录但文件不存在）/ UNTRACKED（从未记录）
+        """
+        entry = self._entries.get(nfo_path)
+        if entry is None:
+            return UNTRACKED
+        try:
+            st = os.stat(nfo_path)
+        except FileNotFoundError:
+            return MISSING
+        if entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return UNCHANGED
+        try:
+            digest = _file_digest(nfo_path)
+        except OSError:
+            return MISSING
+        if digest == entry[2]:
+            # 内容未变（例如仅被touch），更新记录的mtime以免下次再计算哈希
+            self._entries[nfo_path] = [st.st_mtime_ns, st.st_size, digest]
+            self._dirty = True
+            return UNCHANGED
+        return MODIFIED
+
+    def forget(self, nfo_path: str):
+        """移除记录（例如movie.nfo已被删除）"""
+        if self._entries.pop(nfo_path, None) is not None:
+            self._dirty = True
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, nfo_path: str) -> bool:
+        return nfo_path in self._entries
+
+    def save(self):
+        """有变化时写回状态文件（先写临时文件再替换）"""
+        if not self._dirty:
+            return
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.state_file.with_name(self.state_file.name + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'files': self._entries}, f, ensure_ascii=False)
+            os.replace(tmp_file, self.state_file)
+            self._dirty = False
+        except Exception as e:
+            logger.warning(f"保存NFO写入状态失败 {self.state_file}: {e}")
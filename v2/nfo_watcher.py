@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NFO重建等待模块
+覆盖刷新（ReplaceAllMetadata）之前记录即将被Jellyfin重建的movie.nfo的 mtime 与大小，
+刷新触发后轮询这些文件，全部被重写后立即继续，代替"等待刷新任务结束 + 固定额外等待 + 抽样检查"
+"""
+
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+StatKey = Tuple[int, int]
+
+
+def _stat_key(path: str) -> Optional[StatKey]:
+    """(mtime_ns, 大小)，文件不存在时为None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class NFORebuildWaiter:
+    """
+    等待一组movie.nfo被重建
+    文件的 mtime 或大小与快照不同、并在下一次轮询时保持不变，才算重建完成（避免读到写了一半的文件）。
+    使用 stat 轮询：inotify 等文件系统通知在 SMB/NFS 共享上不可靠，且每轮只检查尚未完成的文件
+    """
+
+    def __init__(self, nfo_paths: Iterable[str]):
+        """
+        记录快照（须在触发刷新之前创建）；不存在的文件不参与等待
+
+        Args:
+            nfo_paths: 即将被重建的movie.nfo路径
+        """
+        self._snapshot: Dict[str, StatKey] = {}
+        for path in nfo_paths:
+            key = _stat_key(path)
+            if key is not None:
+                self._snapshot[path] = key
+        self.stragglers: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._snapshot)
+
+    def wait(self, per_file_timeout: float = 120, max_wait: float = 900,
+             poll_interval: float = 1.0, progress_interval: float = 30) -> bool:
+        """
+        等待所有文件重建完成
+
+        Args:
+            per_file_timeout: 连续这么多秒没有任何文件完成重建时放弃（Jellyfin逐个重建，
+                              每个文件都有这么长的时间）
+            max_wait: 总的最长等待时间（秒）
+            poll_interval: 轮询间隔（秒）
+            progress_interval: 输出进度的间隔（秒）
+
+        Returns:
+            是否全部重建完成；未完成的文件保存在 stragglers
+        """
+        pending = dict(self._snapshot)
+        changed: Dict[str, StatKey] = {}  # 已变化、等待下一轮确认稳定的文件
+        total = len(pending)
+        start = last_progress = last_report = time.monotonic()
+        while pending:
+            time.sleep(poll_interval)
+            now = time.monotonic()
+            for path in list(pending):
+                key = _stat_key(path)
+                if key is None or key == pending[path]:
+                    continue
+                if changed.get(path) == key:
+                    del pending[path]
+                    del changed[path]
+                    last_progress = now
+                else:
+                    changed[path] = key
+
+            if now - last_report >= progress_interval:
+                last_report = now
+                logger.info(f"  NFO重建进度: {total - len(pending)}/{total}，已等待 {now - start:.0f} 秒")
+            if now - last_progress > per_file_timeout:
+                logger.warning(f"{per_file_timeout:.0f} 秒内没有新的NFO完成重建，停止等待")
+                break
+            if now - start > max_wait:
+                logger.warning(f"等待NFO重建超时（{max_wait:.0f} 秒）")
+                break
+
+        self.stragglers = sorted(pending)
+        elapsed = time.monotonic() - start
+        if not self.stragglers:
+            logger.info(f"✓ {total} 个NFO已全部重建（{elapsed:.1f} 秒）")
+            return True
+        logger.warning(f"⚠ {len(self.stragglers)}/{total} 个NFO未被重建（{elapsed:.1f} 秒），"
+                       f"这些条目的标签可能在之后被Jellyfin抹掉，可稍后运行 --repair")
+        for path in self.stragglers[:10]:
+            logger.warning(f"  未重建: {path}")
+        if len(self.stragglers) > 10:
+            logger.warning(f"  ... 还有 {len(self.stragglers) - 10} 个")
+        return False
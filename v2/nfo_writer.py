@@ -6,8 +6,11 @@ NFO文件生成模块
 """
 
 import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Tuple
 import logging
 from xml.etree import ElementTree as ET
 from xml.dom import minidom
@@ -18,6 +21,9 @@ logger = logging.getLogger(__name__)
 class NFOWriter:
     """NFO文件写入器"""
     
+    # 条目数达到该值时才启用多进程渲染（进程启动开销在小批量时得不偿失）
+    PARALLEL_RENDER_THRESHOLD = 2000
+    
     @staticmethod
     def create_nfo_content(title: str, tags: List[str], date: str = "") -> str:
         """
@@ -108,58 +114,171 @@ class NFOWriter:
             return False
     
     @staticmethod
-    def write_all_sidecar_nfos(media_items: List[dict]) -> tuple:
+    def write_all_sidecar_nfos(media_items: List[dict], render_workers: Optional[int] = None,
+                               io_workers: int = 8) -> tuple:
         """
-        为所有媒体文件写入同名NFO
+        为所有媒体文件批量写入同名NFO
+        内容渲染（minidom，CPU密集）在进程池中进行，写入使用有界I/O线程池，
+        内容未变化的文件直接跳过
         
         Args:
-            media_items: 媒体文件信息列表（来自EagleReader）
+            media_items: 媒体文件信息列表（来自EagleReader，媒体文件已确认存在）
+            render_workers: 渲染进程数，默认在条目数达到 PARALLEL_RENDER_THRESHOLD 时使用CPU核数，
+                            0 表示在当前进程内渲染
+            io_workers: 写入线程数
             
         Returns:
-            (成功数量, 失败数量)
+            (成功数量, 失败数量)，内容未变化而跳过的文件计入成功
         """
-        success_count = 0
-        fail_count = 0
+        start_time = time.perf_counter()
+        jobs = [
+            (item['file_path'] + '.nfo', item['item_name'] or Path(item['file_path']).stem, list(item['tags']))
+            for item in media_items
+        ]
+        if render_workers is None:
+            render_workers = (os.cpu_count() or 1) if len(jobs) >= NFOWriter.PARALLEL_RENDER_THRESHOLD else 0
         
-        for item in media_items:
-            file_path = item['file_path']
-            tags = item['tags']
-            title = item['item_name']
-            
-            if NFOWriter.write_sidecar_nfo(file_path, tags, title):
-                success_count += 1
+        counts = {'written': 0, 'unchanged': 0, 'failed': 0}
+        bytes_written = 0
+        # 限制已渲染但未写入的内容数量，避免渲染快于写入时占用过多内存
+        pending = threading.BoundedSemaphore(io_workers * 4)
+        
+        def on_done(future):
+            pending.release()
+        
+        render_pool = ProcessPoolExecutor(render_workers) if render_workers > 1 else None
+        try:
+            if render_pool is not None:
+                rendered = render_pool.map(_render_sidecar_nfo, jobs, chunksize=256)
             else:
-                fail_count += 1
+                rendered = map(_render_sidecar_nfo, jobs)
+            
+            futures = []
+            with ThreadPoolExecutor(max_workers=io_workers) as io_pool:
+                for nfo_path, content, error in rendered:
+                    if content is None:
+                        logger.error(f"写入同名NFO失败 {nfo_path}: {error}")
+                        counts['failed'] += 1
+                        continue
+                    pending.acquire()
+                    future = io_pool.submit(_write_if_changed, nfo_path, content)
+                    future.add_done_callback(on_done)
+                    futures.append(future)
+            
+            for future in futures:
+                status, size = future.result()
+                counts[status] += 1
+                bytes_written += size
+        finally:
+            if render_pool is not None:
+                render_pool.shutdown()
         
-        logger.info(f"同名NFO写入完成: 成功 {success_count}, 失败 {fail_count}")
+        elapsed = max(time.perf_counter() - start_time, 1e-9)
+        success_count = counts['written'] + counts['unchanged']
+        fail_count = counts['failed']
+        logger.info(f"同名NFO写入完成: 成功 {success_count}（写入 {counts['written']}, "
+                    f"未变化跳过 {counts['unchanged']}）, 失败 {fail_count}")
+        logger.info(f"  耗时 {elapsed:.2f} 秒, {len(jobs) / elapsed:.0f} 文件/秒, "
+                    f"写入 {bytes_written / 1024 / 1024 / elapsed:.2f} MB/秒")
         return success_count, fail_count
     
     @staticmethod
-    def delete_movie_nfos(library_path: str) -> int:
+    def delete_movie_nfos(library_path: str, media_items: Optional[List[dict]] = None,
+                          dry_run: bool = False, workers: int = 8) -> int:
         """
-        删除指定路径下所有的movie.nfo文件
+        删除Eagle库中所有的movie.nfo文件
+        只检查可能存在movie.nfo的 images/*.info 文件夹（或给定媒体项的文件夹），
+        不再递归遍历整个库
         
         Args:
             library_path: 库路径
+            media_items: 媒体文件信息列表（可选，提供时直接使用其.info文件夹，无需列举目录）
+            dry_run: 只统计将被删除的文件数量，不实际删除
+            workers: 并行删除的线程数
             
         Returns:
-            删除的文件数量
+            删除（或 dry_run 时将被删除）的文件数量
         """
-        deleted_count = 0
         library_path = Path(library_path)
         
         if not library_path.exists():
             logger.error(f"路径不存在: {library_path}")
             return 0
         
-        # 递归查找所有movie.nfo文件
-        for nfo_file in library_path.rglob('movie.nfo'):
-            try:
-                nfo_file.unlink()
-                deleted_count += 1
-                logger.debug(f"已删除: {nfo_file}")
-            except Exception as e:
-                logger.error(f"删除movie.nfo失败 {nfo_file}: {e}")
+        if media_items is not None:
+            candidates = [os.path.join(item['folder_path'], 'movie.nfo') for item in media_items]
+        else:
+            images_path = library_path / 'images'
+            if images_path.is_dir():
+                with os.scandir(images_path) as entries:
+                    candidates = [
+                        os.path.join(entry.path, 'movie.nfo') for entry in entries
+                        if entry.name.endswith('.info') and entry.is_dir()
+                    ]
+            else:
+                # 不是Eagle库结构时退回递归查找
+                candidates = [str(p) for p in library_path.rglob('movie.nfo')]
+        
+        if dry_run:
+            count = sum(1 for path in candidates if os.path.isfile(path))
+            logger.info(f"[模拟运行] 将删除 {count} 个movie.nfo文件（检查了 {len(candidates)} 个文件夹）")
+            return count
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            deleted_count = sum(pool.map(_unlink_if_exists, candidates))
         
         logger.info(f"共删除 {deleted_count} 个movie.nfo文件")
         return deleted_count
+
+
+def _render_sidecar_nfo(job: Tuple[str, str, List[str]]) -> Tuple[str, Optional[bytes], str]:
+    """
+    渲染单个同名NFO的文件内容（模块级函数，以便在进程池中执行）
+    
+    Returns:
+        (NFO路径, 文件内容, 错误信息)；渲染失败（如标签含XML非法字符）时内容为None，
+        不抛出异常，以免中断整批渲染
+    """
+    nfo_path, title, tags = job
+    try:
+        content = NFOWriter.create_nfo_content(title, tags)
+    except Exception as e:
+        return nfo_path, None, str(e)
+    # 与文本模式写入保持一致的换行符
+    return nfo_path, content.replace('\n', os.linesep).encode('utf-8'), ''
+
+
+def _write_if_changed(nfo_path: str, content: bytes) -> Tuple[str, int]:
+    """
+    内容有变化时才写入
+    
+    Returns:
+        ('written' | 'unchanged' | 'failed', 写入字节数)
+    """
+    try:
+        try:
+            with open(nfo_path, 'rb') as f:
+                if f.read() == content:
+                    return 'unchanged', 0
+        except FileNotFoundError:
+            pass
+        with open(nfo_path, 'wb') as f:
+            f.write(content)
+        logger.debug(f"已写入同名NFO: {nfo_path}")
+        return 'written', len(content)
+    except Exception as e:
+        logger.error(f"写入同名NFO失败 {nfo_path}: {e}")
+        return 'failed', 0
+
+
+def _unlink_if_exists(path: str) -> bool:
+    """删除文件，文件不存在时返回False"""
+    try:
+        os.unlink(path)
+        logger.debug(f"已删除: {path}")
+        return True
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        logger.error(f"删除movie.nfo失败 {path}: {e}")
+        return False
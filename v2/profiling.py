@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段性能剖析模块
+为同步的每个阶段分别采集 cProfile（以及可选的 tracemalloc 内存分配），
+输出 .pstats 文件与前N项的文本摘要；未启用时各方法只做一次布尔判断，
+cProfile/pstats/tracemalloc 也只在启用时才导入
+"""
+
+import io
+import logging
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StageProfiler:
+    """
+    分阶段剖析器
+    begin(name) 开始一个阶段（同时结束上一个阶段），finish() 结束并写出汇总。
+    cProfile 只剖析调用 begin 的线程，线程池中的工作不计入函数明细（墙钟时间仍然准确）
+    """
+
+    def __init__(self, output_dir: Optional[str] = None, trace_memory: bool = False,
+                 top_n: int = 30):
+        """
+        Args:
+            output_dir: 报告输出目录（为None时不启用剖析）
+            trace_memory: 是否同时用 tracemalloc 记录每个阶段的内存分配
+            top_n: 文本摘要中列出的条目数
+        """
+        self.enabled = output_dir is not None
+        self.output_dir = Path(output_dir) if output_dir else None
+        self.trace_memory = trace_memory
+        self.top_n = top_n
+        self._stage: Optional[str] = None
+        self._profile = None  # cProfile.Profile
+        self._stage_start = 0.0
+        self._started_tracemalloc = False
+        # (阶段名, 墙钟秒数, 内存峰值字节数或None)
+        self.results: List[Tuple[str, float, Optional[int]]] = []
+
+    @classmethod
+    def for_run(cls, base_dir: str, trace_memory: bool = False, top_n: int = 30) -> 'StageProfiler':
+        """在 base_dir 下创建以当前时间命名的输出目录"""
+        output_dir = Path(base_dir) / datetime.now().strftime('%Y%m%d_%H%M%S')
+        return cls(str(output_dir), trace_memory=trace_memory, top_n=top_n)
+
+    def begin(self, stage: str):
+        """
+        开始一个阶段（若有未结束的阶段先结束它）
+
+        Args:
+            stage: 阶段名（用于文件名）
+        """
+        if not self.enabled:
+            return
+        import cProfile
+        import tracemalloc
+
+        self.end()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracemalloc = True
+            # 只统计本阶段的分配（同时重置峰值）
+            tracemalloc.clear_traces()
+        self._stage = stage
+        self._stage_start = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def end(self):
+        """结束当前阶段并写出该阶段的报告"""
+        if not self.enabled or self._stage is None:
+            return
+        import pstats
+        import tracemalloc
+
+        self._profile.disable()
+        elapsed = time.perf_counter() - self._stage_start
+        stage, profile = self._stage, self._profile
+        self._stage = None
+        self._profile = None
+
+        snapshot = None
+        peak = None
+        if self.trace_memory and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+        self.results.append((stage, elapsed, peak))
+
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            prefix = self.output_dir / f"{len(self.results):02d}_{stage}"
+            profile.dump_stats(str(prefix) + '.pstats')
+
+            buffer = io.StringIO()
+            buffer.write(f"阶段: {stage}\n墙钟耗时: {elapsed:.3f} 秒\n")
+            if peak is not None:
+                buffer.write(f"内存分配峰值: {peak / 1024 / 1024:.2f} MB\n")
+            buffer.write("\n")
+            pstats.Stats(profile, stream=buffer).sort_stats('cumulative').print_stats(self.top_n)
+            if snapshot is not None:
+                buffer.write(f"\n内存分配前 {self.top_n} 项（按代码行）:\n")
+                for stat in snapshot.statistics('lineno')[:self.top_n]:
+                    buffer.write(f"{stat}\n")
+            with open(str(prefix) + '.txt', 'w', encoding='utf-8') as f:
+                f.write(buffer.getvalue())
+        except Exception as e:
+            logger.warning(f"写入剖析报告失败 {stage}: {e}")
+
+    def finish(self) -> Optional[Path]:
+        """
+        结束剖析并写出各阶段汇总（summary.txt）
+
+        Returns:
+            报告目录（未启用或没有任何阶段时为None）
+        """
+        if not self.enabled:
+            return None
+        self.end()
+        if self._started_tracemalloc:
+            import tracemalloc
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        if not self.results:
+            return None
+
+        total = sum(elapsed for _, elapsed, _ in self.results)
+        lines = [f"{'阶段':<20}{'耗时(秒)':>12}{'占比':>8}{'内存峰值(MB)':>16}"]
+        for stage, elapsed, peak in self.results:
+            share = elapsed / total * 100 if total else 0.0
+            peak_text = f"{peak / 1024 / 1024:.2f}" if peak is not None else '-'
+            lines.append(f"{stage:<20}{elapsed:>12.3f}{share:>7.1f}%{peak_text:>16}")
+        lines.append(f"{'合计':<20}{total:>12.3f}")
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.output_dir / 'summary.txt', 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except Exception as e:
+            logger.warning(f"写入剖析汇总失败 {self.output_dir}: {e}")
+        for line in lines:
+            logger.info(line)
+        return self.output_dir
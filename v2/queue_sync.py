@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+队列同步模块
+超大媒体库由多个工作进程（可在共享同一Eagle库的不同主机上）分担同步：
+  --enqueue  读取Eagle库并计算变更计划，把每个变更条目写成一个 apply 任务（按Eagle修改时间从新到旧）
+  --worker   按批领取任务：apply 任务对删除了标签的条目逐项覆盖刷新、写入movie.nfo，
+             再为标签变更的条目加入 refresh 任务；refresh 任务逐项刷新Jellyfin条目。
+             队列中的任务全部结束后，恰好一个工作进程收尾：需要时触发一次全库刷新并登记NFO写入状态
+
+任务数据中的 .info 文件夹名与文件名相对各工作进程自己配置的Eagle库路径，
+刷新时按规划进程看到的媒体文件路径（与Jellyfin中的路径一致）查找Jellyfin条目
+"""
+
+import logging
+import os
+import socket
+import time
+from pathlib import Path
+from typing import List, Optional, TYPE_CHECKING
+
+from eagle_reader import MediaItem, ScanFilter
+from movie_nfo_updater import MovieNFOUpdater
+from sync_planner import plan_changes
+from sync_v2_simple import (create_client, create_reader, export_client_metrics, find_jellyfin_ids,
+                            get_nfo_state, get_state_dir, refresh_items_replace_all)
+from tag_table import TagTable
+from work_queue import FAILED, Job, LEASED, PENDING, WorkQueue
+
+if TYPE_CHECKING:
+    from jellyfin_client import JellyfinClient
+
+APPLY = 'apply'
+REFRESH = 'refresh'
+
+
+def get_queue(config: dict, queue_path: Optional[str] = None) -> WorkQueue:
+    """
+    打开任务队列（默认为状态目录下的 queue.sqlite，sync.queue_path 可指定共享盘上的路径）
+
+    Args:
+        config: 配置字典
+        queue_path: 队列文件路径（可选，优先于配置）
+    """
+    sync_config = config.get('sync', {})
+    queue_path = queue_path or sync_config.get('queue_path') or str(get_state_dir(config) / 'queue.sqlite')
+    Path(queue_path).parent.mkdir(parents=True, exist_ok=True)
+    return WorkQueue(
+        queue_path,
+        lease_seconds=sync_config.get('queue_lease_seconds', 600),
+        max_attempts=sync_config.get('queue_max_attempts', 3)
+    )
+
+
+def enqueue_sync(config: dict, logger: logging.Logger, queue_path: Optional[str] = None,
+                 scan_filter: Optional[ScanFilter] = None) -> Optional[int]:
+    """
+    计算变更计划并写入任务队列
+
+    Args:
+        config: 配置字典
+        logger: 日志记录器
+        queue_path: 队列文件路径（可选）
+        scan_filter: 子集过滤条件（可选）
+
+    Returns:
+        运行Id（没有需要同步的条目时为None）
+    """
+    start_time = time.time()
+    reader = create_reader(config)
+    media_items = reader.read_all_media_files(scan_filter)
+    plan = plan_changes(media_items, reader.tag_table, find_renames=not scan_filter)
+    logger.info(f"共 {len(media_items)} 个条目，标签变更 {len(plan.changes)} 个，新建NFO {len(plan.creates)} 个")
+
+    jobs = []
+    for change in plan.changes:
+        jobs.append(_apply_job(change.item, replace_all=bool(change.removed_tags)))
+    for item in plan.creates:
+        jobs.append(_apply_job(item, replace_all=False))
+    if not jobs:
+        logger.info("✓ 没有需要同步的条目，未创建任务")
+        return None
+
+    queue = get_queue(config, queue_path)
+    try:
+        run_id = queue.create_run(
+            jobs, description=scan_filter.describe() if scan_filter else config['eagle']['library_path']
+        )
+    finally:
+        queue.close()
+    logger.info(f"✓ 已创建运行 #{run_id}：{len(jobs)} 个 apply 任务（耗时 {time.time() - start_time:.2f} 秒），"
+                f"启动工作进程: python sync_v2_simple.py --worker")
+    return run_id
+
+
+def _apply_job(item: MediaItem, replace_all: bool):
+    """条目 -> (任务类型, 任务数据, 优先级)；最近修改的条目优先"""
+    return APPLY, {
+        'folder': item.folder_name,
+        'file': item.file_name,
+        'name': item.item_name,
+        'tags': list(item.tags),
+        'path': item.file_path,
+        'replace_all': replace_all
+    }, item.modification_time
+
+
+def run_worker(config: dict, logger: logging.Logger, queue_path: Optional[str] = None,
+               run_id: Optional[int] = None, worker_id: Optional[str] = None,
+               client: Optional['JellyfinClient'] = None) -> bool:
+    """
+    工作进程：反复领取并执行任务，直到运行中没有未结束的任务
+
+    Args:
+        config: 配置字典（本机的Eagle库路径与Jellyfin连接）
+        logger: 日志记录器
+        queue_path: 队列文件路径（可选）
+        run_id: 运行Id（默认为最近一次尚未结束的运行）
+        worker_id: 工作进程标识（默认为 主机名:进程号）
+        client: Jellyfin客户端（可选）
+
+    Returns:
+        是否没有最终失败的任务
+    """
+    sync_config = config.get('sync', {})
+    batch_size = sync_config.get('queue_batch_size', 100)
+    poll_interval = sync_config.get('queue_poll_interval', 5)
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+    queue = get_queue(config, queue_path)
+    owns_client = client is None
+    try:
+        if run_id is None:
+            run_id = queue.latest_open_run()
+            if run_id is None:
+                logger.info("队列中没有未结束的运行")
+                return True
+        logger.info(f"工作进程 {worker_id} 处理运行 #{run_id}（每批 {batch_size} 个任务）")
+
+        if client is None:
+            client = create_client(config)
+        if not client.test_connection():
+            logger.error("无法连接到Jellyfin服务器")
+            return False
+
+        images_root = str(Path(config['eagle']['library_path']) / 'images')
+        tag_table = TagTable()
+        processed = 0
+        while True:
+            jobs = queue.claim(run_id, worker_id, batch_size)
+            if not jobs:
+                counts = queue.counts(run_id)
+                if counts[PENDING] or counts[LEASED]:
+                    # 其他进程持有租约或任务等待重试
+                    time.sleep(poll_interval)
+                    continue
+                break
+
+            for kind in (APPLY, REFRESH):
+                batch = [job for job in jobs if job.kind == kind]
+                if not batch:
+                    continue
+                job_ids = [job.id for job in batch]
+                try:
+                    if kind == APPLY:
+                        follow_up, created = _run_apply(client, batch, images_root, tag_table, config, logger)
+                        completed = queue.complete(job_ids, worker_id, follow_up, library_refresh=created)
+                    else:
+                        _run_refresh(client, batch, config, logger)
+                        completed = queue.complete(job_ids, worker_id)
+                    if completed < len(job_ids):
+                        logger.warning(f"{len(job_ids) - completed} 个任务的租约已失效（已由其他进程领取）")
+                except Exception as e:
+                    logger.error(f"{kind} 任务失败（{len(batch)} 个），将重试: {e}")
+                    queue.fail(job_ids, worker_id, str(e))
+            processed += len(jobs)
+            counts = queue.counts(run_id)
+            logger.info(f"已处理 {processed} 个任务；队列: 待处理 {counts[PENDING]}, 进行中 {counts[LEASED]}, "
+                        f"完成 {counts['done']}, 失败 {counts[FAILED]}")
+
+        finalize_run(queue, run_id, worker_id, client, images_root, config, logger)
+        return queue.counts(run_id)[FAILED] == 0
+    finally:
+        queue.close()
+        if owns_client and client is not None:
+            export_client_metrics(client, config, logger)
+
+
+def _run_apply(client: 'JellyfinClient', jobs: List[Job], images_root: str, tag_table: TagTable,
+               config: dict, logger: logging.Logger):
+    """执行一批 apply 任务，返回 (后续 refresh 任务, 是否新建了NFO)"""
+    page_size = config.get('sync', {}).get('verify_page_size', 500)
+    items = []
+    deletion_items = []
+    jellyfin_paths = {}
+    for job in jobs:
+        payload = job.payload
+        item = MediaItem(images_root, payload['folder'], payload['file'], payload['name'],
+                         tag_table.encode(payload['tags']), tag_table)
+        items.append(item)
+        jellyfin_paths[item.file_path] = payload['path']
+        if payload['replace_all']:
+            deletion_items.append(item)
+
+    if deletion_items and not refresh_items_replace_all(client, deletion_items, logger, page_size):
+        raise RuntimeError("逐项覆盖刷新失败")
+
+    # NFO写入状态由收尾进程统一登记（状态文件不支持多进程同时写入）
+    _, fail_count, _, _, _, changed_items = MovieNFOUpdater.batch_update_movie_nfos(items)
+    if fail_count:
+        raise RuntimeError(f"{fail_count} 个movie.nfo写入失败")
+    follow_up = [
+        (REFRESH, {'path': jellyfin_paths[c['file_path']]}, 0)
+        for c in changed_items if not c['created']
+    ]
+    return follow_up, any(c['created'] for c in changed_items)
+
+
+def _run_refresh(client: 'JellyfinClient', jobs: List[Job], config: dict, logger: logging.Logger):
+    """执行一批 refresh 任务（Jellyfin未收录的条目跳过）"""
+    page_size = config.get('sync', {}).get('verify_page_size', 500)
+    item_ids = find_jellyfin_ids(client, (job.payload['path'] for job in jobs), logger, page_size)
+    if item_ids is None:
+        raise RuntimeError("获取Jellyfin媒体项列表失败")
+    refreshed = client.refresh_items(item_ids)
+    if refreshed < len(item_ids):
+        raise RuntimeError(f"逐项刷新只成功 {refreshed}/{len(item_ids)} 个")
+
+
+def finalize_run(queue: WorkQueue, run_id: int, worker_id: str, client: 'JellyfinClient',
+                 images_root: str, config: dict, logger: logging.Logger):
+    """所有任务结束后的收尾（只有一个工作进程会执行）"""
+    needs_library_refresh = queue.begin_finalize(run_id, worker_id)
+    if needs_library_refresh is None:
+        return
+
+    if needs_library_refresh:
+        logger.info("有条目新建了movie.nfo，触发一次全库刷新")
+        if not client.refresh_library_search_missing_metadata():
+            logger.error("触发全库刷新失败，运行保持未结束，可重新启动工作进程收尾")
+            return
+
+    nfo_state = get_nfo_state(config)
+    for payload in queue.payloads(run_id, APPLY):
+        nfo_state.record(os.path.join(images_root, payload['folder'], 'movie.nfo'))
+    nfo_state.save()
+
+    counts = queue.counts(run_id)
+    for kind, payload, error in queue.failures(run_id):
+        logger.error(f"  失败的 {kind} 任务: {payload.get('path')}: {error}")
+    queue.finish_run(run_id)
+    logger.info(f"✓ 运行 #{run_id} 已结束：完成 {counts['done']} 个任务，失败 {counts[FAILED]} 个")
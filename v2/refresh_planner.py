@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+刷新计划模块
+按Jellyfin的父文件夹树合并需要刷新的条目：在逐项刷新、文件夹刷新（非递归刷新该文件夹的直接子项，
+递归刷新其全部后代）与全库刷新之间按代价模型选出总代价最小的组合
+
+代价模型（单位为Jellyfin刷新一个条目的工作量）:
+  每个刷新请求   request_cost
+  被刷新的每个条目 1（文件夹刷新会刷新其覆盖范围内的所有条目，包括不需要刷新的）
+  全库刷新      额外加 library_overhead（扫描文件系统发现新文件等）
+"""
+
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+DEFAULT_REQUEST_COST = 2.0
+
+# 文件夹树的根（媒体库本身，以及父项不在文件夹列表中的条目的父项）
+_ROOT = ''
+
+
+class RefreshPlan(NamedTuple):
+    """一组覆盖全部目标条目的刷新请求"""
+    item_ids: List[str]               # 逐项刷新
+    folder_ids: List[str]             # 非递归文件夹刷新（刷新直接子项）
+    recursive_folder_ids: List[str]   # 递归文件夹刷新（刷新全部后代）
+    library: bool                     # 全库刷新
+    cost: float                       # 代价模型估算的总代价
+
+    @property
+    def requests(self) -> int:
+        """刷新请求数"""
+        if self.library:
+            return 1
+        return len(self.item_ids) + len(self.folder_ids) + len(self.recursive_folder_ids)
+
+    def describe(self) -> str:
+        """一行摘要"""
+        if self.library:
+            return '全库刷新'
+        parts = []
+        if self.item_ids:
+            parts.append(f"逐项刷新 {len(self.item_ids)} 个")
+        if self.folder_ids:
+            parts.append(f"文件夹刷新 {len(self.folder_ids)} 个")
+        if self.recursive_folder_ids:
+            parts.append(f"递归文件夹刷新 {len(self.recursive_folder_ids)} 个")
+        return '，'.join(parts) or '无需刷新'
+
+
+# 子树的最优覆盖: (代价, 逐项, 非递归文件夹, 递归文件夹)
+_Cover = Tuple[float, List[str], List[str], List[str]]
+
+
+def plan_refresh(target_ids: List[str], items: List[Dict], folders: List[Dict],
+                 request_cost: float = DEFAULT_REQUEST_COST,
+                 library_overhead: float = 0.0) -> RefreshPlan:
+    """
+    计算覆盖全部目标条目的最小代价刷新组合
+
+    Args:
+        target_ids: 需要刷新的条目Id
+        items: 媒体库中的全部媒体项（含 Id、ParentId，来自批量列表）
+        folders: 媒体库中的全部文件夹（含 Id、ParentId）；为空时只在逐项与全库之间选择
+        request_cost: 每个刷新请求的代价
+        library_overhead: 全库刷新的额外代价
+
+    Returns:
+        刷新计划
+    """
+    folder_ids = {folder['Id'] for folder in folders}
+
+    def parent_of(entry: Dict) -> str:
+        parent = entry.get('ParentId')
+        return parent if parent in folder_ids else _ROOT
+
+    folder_parent = {folder['Id']: parent_of(folder) for folder in folders}
+    item_parent = {item['Id']: parent_of(item) for item in items}
+
+    # 每个文件夹的直接子项数与后代条目数
+    direct_children: Dict[str, int] = defaultdict(int)
+    for parent in folder_parent.values():
+        direct_children[parent] += 1
+    descendants: Dict[str, int] = defaultdict(int)
+    for parent in item_parent.values():
+        direct_children[parent] += 1
+        node = parent
+        while node != _ROOT:
+            descendants[node] += 1
+            node = folder_parent[node]
+
+    # 目标所在的子树：每个文件夹的直接目标条目与含目标的子文件夹
+    direct_targets: Dict[str, List[str]] = defaultdict(list)
+    target_children: Dict[str, Set[str]] = defaultdict(set)
+    for item_id in dict.fromkeys(target_ids):
+        parent = item_parent.get(item_id, _ROOT)
+        direct_targets[parent].append(item_id)
+        node = parent
+        while node != _ROOT and node not in target_children[folder_parent[node]]:
+            target_children[folder_parent[node]].add(node)
+            node = folder_parent[node]
+
+    def best_cover(folder: str) -> _Cover:
+        """该文件夹子树内所有目标的最优覆盖（不考虑递归刷新该文件夹本身）"""
+        cost = 0.0
+        item_list: List[str] = []
+        folder_list: List[str] = []
+        recursive_list: List[str] = []
+        targets = direct_targets.get(folder, [])
+        if targets:
+            per_item = len(targets) * (request_cost + 1)
+            whole_folder = request_cost + direct_children[folder]
+            if folder != _ROOT and whole_folder < per_item:
+                cost += whole_folder
+                folder_list.append(folder)
+            else:
+                cost += per_item
+                item_list.extend(targets)
+        for child in target_children.get(folder, ()):
+            child_cost, child_items, child_folders, child_recursive = best_cover(child)
+            recursive_cost = request_cost + descendants[child]
+            if recursive_cost < child_cost:
+                cost += recursive_cost
+                recursive_list.append(child)
+            else:
+                cost += child_cost
+                item_list.extend(child_items)
+                folder_list.extend(child_folders)
+                recursive_list.extend(child_recursive)
+        return cost, item_list, folder_list, recursive_list
+
+    cost, item_list, folder_list, recursive_list = best_cover(_ROOT)
+    library_cost = request_cost + len(items) + library_overhead
+    if library_cost < cost:
+        return RefreshPlan([], [], [], True, library_cost)
+    return RefreshPlan(item_list, folder_list, recursive_list, False, cost)
+
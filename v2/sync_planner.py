@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同步计划模块
+对比Eagle标签与movie.nfo中的已有标签，得出每个条目的变更，
+并借助标签倒排索引识别全库范围的标签重命名/合并
+"""
+
+import csv
+import itertools
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Set, TextIO, Tuple
+
+from eagle_reader import MediaItem
+from movie_nfo_updater import MovieNFOUpdater
+from refresh_planner import DEFAULT_REQUEST_COST, plan_refresh
+from tag_table import TagIds, TagTable, build_inverted_index
+
+logger = logging.getLogger(__name__)
+
+
+class ItemChange(NamedTuple):
+    """单个条目的标签变更（删除的标签可能只存在于movie.nfo、不在标签表中，以字符串保存）"""
+    item: MediaItem
+    added_ids: TagIds
+    removed_tags: Tuple[str, ...]
+
+
+class TagRename(NamedTuple):
+    """检测到的标签重命名或合并：old 标签消失，其条目全部带上了 new 标签"""
+    old_tag: str
+    new_id: int
+    item_count: int
+    is_merge: bool
+
+
+class SyncPlan:
+    """一次同步的变更计划"""
+
+    def __init__(self, tag_table: TagTable, changes: List[ItemChange], renames: List[TagRename],
+                 creates: Optional[List[MediaItem]] = None):
+        self.tag_table = tag_table
+        self.changes = changes
+        self.renames = renames
+        # 有标签但还没有movie.nfo、写入阶段将新建NFO的条目
+        self.creates = creates or []
+
+    @property
+    def has_deletions(self) -> bool:
+        """是否有任何标签被删除"""
+        return any(change.removed_tags for change in self.changes)
+
+    @property
+    def unexplained_deletions(self) -> List[ItemChange]:
+        """删除的标签不能全部由重命名/合并解释的条目"""
+        renamed = {rename.old_tag for rename in self.renames}
+        return [
+            change for change in self.changes
+            if any(tag not in renamed for tag in change.removed_tags)
+        ]
+
+    @property
+    def rename_items(self) -> List[MediaItem]:
+        """受重命名/合并影响的条目"""
+        renamed = {rename.old_tag for rename in self.renames}
+        return [
+            change.item for change in self.changes
+            if renamed.intersection(change.removed_tags)
+        ]
+
+    def prerefresh_strategy(self, subset: bool = False) -> str:
+        """
+        写入标签前的预刷新策略
+
+        Args:
+            subset: 是否为子集同步
+
+        Returns:
+            'none'（无标签删除）、'subset_replace'（子集条目逐项覆盖刷新）、
+            'rename_replace'（重命名/合并条目逐项覆盖刷新）或 'library_replace_all'（全库覆盖刷新）
+        """
+        if not self.has_deletions:
+            return 'none'
+        if subset:
+            return 'subset_replace'
+        if self.renames and not self.unexplained_deletions:
+            return 'rename_replace'
+        return 'library_replace_all'
+
+    def describe_renames(self) -> List[str]:
+        """重命名/合并的可读描述"""
+        name = self.tag_table.name
+        return [
+            f"{rename.old_tag} → {name(rename.new_id)} "
+            f"（{'合并' if rename.is_merge else '重命名'}，{rename.item_count} 个条目）"
+            for rename in self.renames
+        ]
+
+
+def _read_existing_tags(movie_nfo: str) -> Optional[Set[str]]:
+    """读取movie.nfo中的标签，文件不存在时返回None"""
+    if not os.path.exists(movie_nfo):
+        return None
+    return MovieNFOUpdater.get_existing_tags(movie_nfo)
+
+
+def plan_changes(media_items: List[MediaItem], tag_table: TagTable,
+                 find_renames: bool = True, workers: Optional[int] = None) -> SyncPlan:
+    """
+    计算所有条目的标签变更（不修改任何文件）
+
+    Args:
+        media_items: MediaItem列表
+        tag_table: 全局标签表
+        find_renames: 是否识别标签重命名/合并（需要完整的媒体项列表，子集同步时应关闭）
+        workers: 并行读取movie.nfo的线程数（默认按CPU核数，最多8个；1 表示串行）
+
+    Returns:
+        同步计划
+    """
+    if workers is None:
+        workers = min(8, os.cpu_count() or 1)
+    paths = [item.movie_nfo_path for item in media_items]
+    if workers > 1 and len(paths) > workers:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            existing_tags = list(pool.map(_read_existing_tags, paths, chunksize=64))
+    else:
+        existing_tags = [_read_existing_tags(path) for path in paths]
+
+    changes: List[ItemChange] = []
+    creates: List[MediaItem] = []
+    # NFO中的标签不编码、不登记到标签表，直接与条目的标签Id对比
+    for item, tags in zip(media_items, existing_tags):
+        if tags is None:
+            if item.tag_ids:
+                creates.append(item)
+            continue
+        added_ids, removed_tags = tag_table.diff(item.tag_ids, tags)
+        if added_ids or removed_tags:
+            changes.append(ItemChange(item, added_ids, removed_tags))
+
+    renames = detect_renames(changes, media_items, tag_table) if find_renames else []
+    return SyncPlan(tag_table, changes, renames, creates)
+
+
+def _pages(count: int, page_size: int) -> int:
+    """分页获取 count 个条目需要的请求数"""
+    return max(1, -(-count // page_size))
+
+
+def estimate_requests(plan: SyncPlan, item_count: int, subset: bool = False,
+                      page_size: int = 500, max_item_refreshes: int = 200,
+                      request_cost: float = DEFAULT_REQUEST_COST,
+                      library_overhead: float = 0.0) -> Dict:
+    """
+    按 sync_tags_v2 的决策估算一次正式运行的刷新策略与Jellyfin请求数
+    （Jellyfin条目数按Eagle条目数估算，不含等待刷新时的状态轮询）
+    最终刷新按 plan_refresh 的代价模型与 max_item_refreshes 请求上限决定；计划模式没有Jellyfin的
+    文件夹树，无法估算文件夹合并，因此刷新请求数是上限，实际只刷新校验时与Eagle不一致的条目
+
+    Args:
+        plan: 同步计划
+        item_count: 参与同步的Eagle条目数
+        subset: 是否为子集同步
+        page_size: 校验阶段每页获取的条目数
+        max_item_refreshes: 刷新请求数上限，超过时改为全库刷新
+        request_cost: 刷新计划代价模型中每个请求的代价
+        library_overhead: 刷新计划代价模型中全库刷新的额外代价
+
+    Returns:
+        策略与请求数估算（requests_upper_bound 为 True 表示请求数是上限）
+    """
+    listing = _pages(item_count, page_size)
+    prerefresh = plan.prerefresh_strategy(subset)
+    estimate = {
+        'prerefresh': prerefresh,
+        'final_refresh': 'none',
+        'nfo_writes': len(plan.changes) + len(plan.creates),
+        'requests': 1,  # 连接测试
+        'requests_upper_bound': False
+    }
+    if not plan.changes and not plan.creates:
+        # 没有任何文件需要更新时同步在写入阶段后结束
+        return estimate
+
+    if prerefresh == 'subset_replace':
+        estimate['requests'] += listing + sum(1 for change in plan.changes if change.removed_tags)
+    elif prerefresh == 'rename_replace':
+        estimate['requests'] += listing + len(plan.rename_items)
+    elif prerefresh == 'library_replace_all':
+        estimate['requests'] += 1
+
+    estimate['requests'] += listing
+    if plan.creates:
+        # 新文件需要Jellyfin扫描收录
+        estimate['final_refresh'] = 'library'
+        estimate['requests'] += 1
+        return estimate
+
+    # 没有父文件夹信息时 plan_refresh 只在逐项与全库之间选择
+    target_ids = [change.item.file_path for change in plan.changes]
+    items = [{'Id': target_id} for target_id in target_ids]
+    items.extend({'Id': index} for index in range(item_count - len(target_ids)))
+    refresh_plan = plan_refresh(target_ids, items, [], request_cost=request_cost,
+                                library_overhead=library_overhead)
+    if len(target_ids) > 1:
+        estimate['requests'] += 1  # 获取文件夹列表（按一页估算）
+    if refresh_plan.library or refresh_plan.requests > max_item_refreshes:
+        estimate['final_refresh'] = 'library'
+        estimate['requests'] += 1
+    else:
+        estimate['final_refresh'] = 'items'
+        estimate['requests'] += refresh_plan.requests
+        estimate['requests_upper_bound'] = True
+    return estimate
+
+
+def write_plan_report(plan: SyncPlan, summary: Dict, fp: TextIO, fmt: str = 'json'):
+    """
+    逐条写出变更计划报告（不在内存中拼出整份报告）
+
+    Args:
+        plan: 同步计划
+        summary: 汇总信息（JSON 报告写在开头；CSV 报告不包含）
+        fp: 输出流
+        fmt: 'json' 或 'csv'
+    """
+    decode = plan.tag_table.decode
+    rows = itertools.chain(
+        (('create', item.file_path, item.tags, ()) for item in plan.creates),
+        (('update', change.item.file_path, decode(change.added_ids), change.removed_tags)
+         for change in plan.changes)
+    )
+    if fmt == 'csv':
+        writer = csv.writer(fp)
+        writer.writerow(['action', 'file_path', 'added', 'removed'])
+        for action, file_path, added, removed in rows:
+            writer.writerow([action, file_path, '|'.join(added), '|'.join(removed)])
+        return
+
+    fp.write('{"summary": ')
+    json.dump(summary, fp, ensure_ascii=False)
+    fp.write(',\n "items": [')
+    for index, (action, file_path, added, removed) in enumerate(rows):
+        fp.write(',\n  ' if index else '\n  ')
+        json.dump({'action': action, 'file_path': file_path,
+                   'added': list(added), 'removed': list(removed)}, fp, ensure_ascii=False)
+    fp.write('\n]}\n')
+
+
+def detect_renames(changes: List[ItemChange], media_items: List[MediaItem],
+                   tag_table: TagTable) -> List[TagRename]:
+    """
+    识别标签重命名/合并
+    某标签在整个库中消失，且失去它的条目当前全部带有同一个新出现的标签，
+    即视为该标签被重命名（新标签只出现在这些条目上）或合并（新标签此前已存在于其他条目）
+
+    Args:
+        changes: 条目变更列表
+        media_items: 全部媒体项（用于判断标签是否仍在库中使用）
+        tag_table: 全局标签表
+
+    Returns:
+        检测到的重命名/合并列表
+    """
+    removed_index: Dict[str, List[int]] = {}
+    for position, change in enumerate(changes):
+        for tag in change.removed_tags:
+            removed_index.setdefault(tag, []).append(position)
+    if not removed_index:
+        return []
+    added_index = build_inverted_index(change.added_ids for change in changes)
+    current_index = build_inverted_index(item.tag_ids for item in media_items)
+
+    renames: List[TagRename] = []
+    for old_tag, positions in removed_index.items():
+        if tag_table.tag_id(old_tag, add=False) in current_index:
+            # 标签仍被其他条目使用，只是局部删除
+            continue
+
+        # 失去旧标签的条目当前共同拥有、且至少在其中一个条目上新增的标签
+        common: Set[int] = set(changes[positions[0]].item.tag_ids)
+        for position in positions[1:]:
+            common.intersection_update(changes[position].item.tag_ids)
+        position_set = set(positions)
+        candidates = [
+            tag_id for tag_id in common
+            if position_set.intersection(added_index.get(tag_id, ()))
+        ]
+        if len(candidates) > 1:
+            # 多个候选时只接受新增位置与删除位置完全一致的那个
+            candidates = [
+                tag_id for tag_id in candidates
+                if set(added_index[tag_id]) == position_set
+            ]
+        if len(candidates) != 1:
+            continue
+
+        new_id = candidates[0]
+        is_merge = len(current_index[new_id]) > len(positions)
+        renames.append(TagRename(old_tag, new_id, len(positions), is_merge))
+
+    return renames
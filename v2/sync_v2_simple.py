@@ -8,7 +8,7 @@ Eagle到Jellyfin标签同步 - V2简化版（自动化版本）
 1. 读取Eagle库中的所有媒体文件和标签
 2. 如果检测到标签删除：先让Jellyfin执行ReplaceAllMetadata（重建NFO）
 3. 然后写入标签到movie.nfo（覆盖Jellyfin刚重建的NFO）
-4. 最后再刷新一次，让Jellyfin读取我们写入的标签
+4. 批量获取Jellyfin当前标签并与Eagle对比，只刷新不一致的条目（已一致则跳过刷新）
 5. 这样就避免了"标签被Jellyfin后续重建NFO时抹掉"的问题
 
 作者: Copilot
@@ -22,31 +22,32 @@ import sys
 import time
 from pathlib import Path
 from datetime import datetime
+from typing import Iterable, List, Optional, Set, Tuple, TYPE_CHECKING
 import argparse
 
 # 导入自定义模块
-from eagle_reader import EagleReader
+from eagle_reader import EagleReader, ScanFilter
+from log_utils import setup_queued_logging
 from movie_nfo_updater import MovieNFOUpdater
-from jellyfin_client import JellyfinClient
+from nfo_state import MISSING, MODIFIED, UNTRACKED, NFOStateStore
+from nfo_watcher import NFORebuildWaiter
+from profiling import StageProfiler
+from refresh_planner import DEFAULT_REQUEST_COST, RefreshPlan, plan_refresh
+from sync_planner import SyncPlan, estimate_requests, plan_changes, write_plan_report
 
+if TYPE_CHECKING:
+    # jellyfin_client 依赖 requests，只在进入Jellyfin阶段时才导入，加快 --dry-run 等场景的启动
+    from jellyfin_client import JellyfinClient
+    from listing_cache import ListingCache
 
-def setup_logging(log_file: str = 'sync_v2.log', level: str = 'INFO'):
-    """配置日志系统"""
+
+def setup_logging(log_file: str = 'sync_v2.log', level: str = 'INFO', stream=None):
+    """
+    配置日志系统
+    日志经队列由后台线程写入滚动日志文件（10MB × 5）与控制台，stream 为控制台输出流（默认标准输出）
+    """
     log_path = Path(__file__).parent / log_file
-    
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    date_format = '%Y-%m-%d %H:%M:%S'
-    
-    logging.basicConfig(
-        level=getattr(logging, level.upper()),
-        format=log_format,
-        datefmt=date_format,
-        handlers=[
-            logging.FileHandler(log_path, encoding='utf-8', mode='a'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    
+    setup_queued_logging(str(log_path), level=level, stream=stream)
     return logging.getLogger(__name__)
 
 
@@ -61,7 +62,391 @@ def load_config(config_file: str = 'config.json') -> dict:
         return json.load(f)
 
 
-def sync_tags_v2(config: dict, logger: logging.Logger, dry_run: bool = False):
+def get_state_dir(config: dict) -> Path:
+    """获取运行状态目录（缓存等），默认为脚本目录下的 state"""
+    state_dir = config.get('sync', {}).get('state_dir')
+    return Path(state_dir) if state_dir else Path(__file__).parent / 'state'
+
+
+def get_nfo_state(config: dict) -> NFOStateStore:
+    """加载movie.nfo写入状态记录"""
+    return NFOStateStore(str(get_state_dir(config) / 'nfo_state.json'))
+
+
+def load_pending(config: dict) -> List[str]:
+    """读取上次运行因时间预算未处理完的条目（媒体文件路径）"""
+    pending_file = get_state_dir(config) / 'pending.json'
+    if not pending_file.exists():
+        return []
+    try:
+        with open(pending_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('items', [])
+    except Exception:
+        return []
+
+
+def save_pending(config: dict, file_paths: List[str]):
+    """记录本次未处理完的条目；为空时删除记录"""
+    pending_file = get_state_dir(config) / 'pending.json'
+    if not file_paths:
+        if pending_file.exists():
+            pending_file.unlink()
+        return
+    pending_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(pending_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'items': file_paths
+        }, f, ensure_ascii=False, indent=2)
+
+
+def load_last_sync(config: dict) -> Optional[int]:
+    """上次完整同步的开始时间（毫秒，用于 --since-last-sync；没有记录时为None）"""
+    last_sync_file = get_state_dir(config) / 'last_sync.json'
+    if not last_sync_file.exists():
+        return None
+    try:
+        with open(last_sync_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('started')
+    except Exception:
+        return None
+
+
+def save_last_sync(config: dict, started: float):
+    """记录本次同步的开始时间（之后在Eagle中修改的条目由下一次 --since-last-sync 处理）"""
+    last_sync_file = get_state_dir(config) / 'last_sync.json'
+    last_sync_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(last_sync_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'time': datetime.fromtimestamp(started).strftime('%Y-%m-%d %H:%M:%S'),
+            'started': int(started * 1000)
+        }, f, ensure_ascii=False, indent=2)
+
+
+def create_reader(config: dict) -> EagleReader:
+    """按配置创建Eagle读取器：配置了 eagle.api_url 时通过Eagle API读取，否则扫描库目录"""
+    eagle_config = config['eagle']
+    if eagle_config.get('api_url'):
+        from eagle_api_reader import EagleApiReader
+        return EagleApiReader(
+            eagle_config['library_path'],
+            eagle_config['api_url'],
+            token=eagle_config.get('api_token'),
+            page_size=eagle_config.get('api_page_size', 1000)
+        )
+    return EagleReader(
+        eagle_config['library_path'],
+        path_cache_file=str(get_state_dir(config) / 'path_cache.json')
+    )
+
+
+def create_client(config: dict) -> 'JellyfinClient':
+    """按配置创建Jellyfin客户端（延迟导入 jellyfin_client）"""
+    from jellyfin_client import JellyfinClient
+    jellyfin_config = config['jellyfin']
+    return JellyfinClient(
+        jellyfin_config['url'],
+        jellyfin_config['api_key'],
+        jellyfin_config['library_id'],
+        latency_target_ms=jellyfin_config.get('latency_target_ms', 500),
+        max_concurrency=jellyfin_config.get('max_concurrency', 8),
+        listing_cache=get_listing_cache(config)
+    )
+
+
+def get_listing_cache(config: dict) -> Optional['ListingCache']:
+    """按配置创建Jellyfin媒体项列表缓存（sync.listing_cache 为false时返回None）"""
+    sync_config = config.get('sync', {})
+    if not sync_config.get('listing_cache', True):
+        return None
+    from listing_cache import ListingCache
+    return ListingCache(
+        str(get_state_dir(config) / f"jellyfin_items_{config['jellyfin']['library_id']}.json"),
+        max_age_hours=sync_config.get('listing_cache_max_age_hours', 24),
+        overlap_seconds=sync_config.get('listing_cache_overlap_seconds', 300)
+    )
+
+
+def export_client_metrics(client: 'JellyfinClient', config: dict, logger: logging.Logger):
+    """把本次运行的Jellyfin请求统计追加到状态目录，并输出摘要"""
+    metrics = client.export_metrics(
+        str(get_state_dir(config) / 'jellyfin_metrics.jsonl'),
+        library_id=client.library_id
+    )
+    logger.info(f"Jellyfin请求统计: {metrics['requests']} 个请求, 错误 {metrics['errors']} 个, "
+                f"p95延迟 {metrics['latency_ms_p95']} ms, "
+                f"并发 {metrics['concurrency_min']}~{metrics['concurrency_max']}")
+
+
+def normalize_media_path(path: str) -> str:
+    """规范化路径用于Eagle与Jellyfin之间的比对（忽略分隔符与大小写差异）"""
+    return path.replace('\\', '/').rstrip('/').casefold()
+
+
+def find_out_of_sync_items(media_items: List[dict], jellyfin_items: List[dict],
+                           created_paths: Set[str]) -> Tuple[List[str], List[str]]:
+    """
+    在内存中对比Eagle标签与Jellyfin当前标签
+    
+    Args:
+        media_items: Eagle媒体项列表
+        jellyfin_items: Jellyfin媒体项列表（需包含Tags和Path字段）
+        created_paths: 本次新建了movie.nfo的媒体文件路径（已规范化）
+        
+    Returns:
+        (标签不一致的Jellyfin Id列表, 本次新建NFO但Jellyfin中找不到的文件路径列表)
+    """
+    jellyfin_by_path = {
+        normalize_media_path(jf_item['Path']): jf_item
+        for jf_item in jellyfin_items if jf_item.get('Path')
+    }
+    
+    out_of_sync_ids = []
+    missing_paths = []
+    for item in media_items:
+        key = normalize_media_path(item['file_path'])
+        jf_item = jellyfin_by_path.get(key)
+        if jf_item is None:
+            # 只有本次新建NFO的条目才需要Jellyfin扫描发现；其余多半是Jellyfin不收录的类型（如图片）
+            if key in created_paths:
+                missing_paths.append(item['file_path'])
+            continue
+        
+        # 没有标签也没有movie.nfo的条目不受本工具管理，Jellyfin中的标签来自其他来源
+        if not item.tag_ids and not (Path(item.folder_path) / 'movie.nfo').exists():
+            continue
+        
+        jellyfin_tags = jf_item.get('Tags') or []
+        # Jellyfin的标签不登记到标签表，直接与条目的标签Id对比
+        if item.tag_table.matches(item.tag_ids, set(jellyfin_tags)):
+            continue
+        # Id不同时再按去除首尾空白后的字符串确认（Jellyfin会裁剪标签两端空白）
+        eagle_tags = {tag.strip() for tag in item.tags if tag.strip()}
+        if eagle_tags != {tag.strip() for tag in jellyfin_tags if tag.strip()}:
+            out_of_sync_ids.append(jf_item['Id'])
+    
+    return out_of_sync_ids, missing_paths
+
+
+def plan_final_refresh(client: 'JellyfinClient', item_ids: List[str], jellyfin_items: List[dict],
+                       sync_config: dict, logger: logging.Logger) -> RefreshPlan:
+    """
+    按Jellyfin父文件夹树与代价模型规划最终刷新（逐项/文件夹/全库）
+    只有两个以上的条目需要刷新时才获取文件夹列表
+    """
+    folders: List[dict] = []
+    if len(item_ids) > 1:
+        folders = client.get_library_items(
+            fields=[], page_size=sync_config.get('verify_page_size', 500), folders=True
+        ) or []
+    request_cost = sync_config.get('refresh_request_cost', DEFAULT_REQUEST_COST)
+    refresh_plan = plan_refresh(
+        item_ids, jellyfin_items, folders, request_cost=request_cost,
+        library_overhead=sync_config.get('library_refresh_overhead', 0.0)
+    )
+    logger.info(f"刷新计划: {refresh_plan.describe()}（{refresh_plan.requests} 个请求，代价 {refresh_plan.cost:.0f}，"
+                f"全部逐项刷新的代价 {len(item_ids) * (request_cost + 1):.0f}）")
+    return refresh_plan
+
+
+def execute_refresh_plan(client: 'JellyfinClient', refresh_plan: RefreshPlan, logger: logging.Logger) -> bool:
+    """执行逐项与文件夹刷新（不等待完成），返回是否全部触发成功"""
+    ok = True
+    if refresh_plan.item_ids:
+        refreshed = client.refresh_items(refresh_plan.item_ids)
+        logger.info(f"逐项刷新完成: {refreshed}/{len(refresh_plan.item_ids)} 个")
+        ok = ok and refreshed == len(refresh_plan.item_ids)
+    if refresh_plan.folder_ids:
+        refreshed = client.refresh_items(refresh_plan.folder_ids)
+        logger.info(f"文件夹刷新完成: {refreshed}/{len(refresh_plan.folder_ids)} 个")
+        ok = ok and refreshed == len(refresh_plan.folder_ids)
+    if refresh_plan.recursive_folder_ids:
+        refreshed = client.refresh_items(refresh_plan.recursive_folder_ids, recursive=True)
+        logger.info(f"递归文件夹刷新完成: {refreshed}/{len(refresh_plan.recursive_folder_ids)} 个")
+        ok = ok and refreshed == len(refresh_plan.recursive_folder_ids)
+    return ok
+
+
+def refresh_library_and_wait(client: 'JellyfinClient', logger: logging.Logger) -> bool:
+    """全库刷新（搜索缺少的元数据，失败时退回覆盖所有元数据）并等待完成"""
+    if not client.refresh_library_search_missing_metadata():
+        logger.warning("标准刷新失败，尝试使用 ReplaceAllMetadata 模式")
+        if not client.refresh_library_replace_all_metadata():
+            logger.error("刷新失败")
+            return False
+    
+    logger.info("\n等待最终刷新完成...")
+    client.wait_for_refresh_complete(check_interval=5, max_wait=600, extra_wait=3)
+    return True
+
+
+def find_jellyfin_ids(client: 'JellyfinClient', file_paths: Iterable[str], logger: logging.Logger,
+                      page_size: int = 500) -> Optional[List[str]]:
+    """
+    按媒体文件路径查找Jellyfin条目Id
+    先查客户端的 路径 -> Id 缓存，只有缓存中缺少时才获取完整的媒体项列表
+    
+    Returns:
+        Id列表（Jellyfin未收录的文件直接跳过），获取媒体项列表失败时返回None
+    """
+    keys = [normalize_media_path(file_path) for file_path in file_paths]
+    item_ids, missing = client.path_ids.lookup(keys)
+    if not missing:
+        return item_ids
+    
+    jellyfin_items = client.get_library_items(fields=['Path'], page_size=page_size)
+    if jellyfin_items is None:
+        return None
+    cache_jellyfin_ids(client, jellyfin_items)
+    
+    found_ids, missing = client.path_ids.lookup(missing)
+    for key in missing:
+        logger.debug(f"Jellyfin未收录，跳过: {key}")
+    return item_ids + found_ids
+
+
+def items_in_jellyfin(client: 'JellyfinClient', media_items: List[dict], logger: logging.Logger,
+                      page_size: int = 500) -> Optional[List[dict]]:
+    """
+    筛选出Jellyfin已收录的条目（按媒体文件路径）
+    
+    Returns:
+        已收录的条目，获取媒体项列表失败时返回None
+    """
+    if find_jellyfin_ids(client, (item['file_path'] for item in media_items), logger, page_size) is None:
+        return None
+    _, missing = client.path_ids.lookup([normalize_media_path(item['file_path']) for item in media_items])
+    missing_keys = set(missing)
+    return [item for item in media_items if normalize_media_path(item['file_path']) not in missing_keys]
+
+
+def cache_jellyfin_ids(client: 'JellyfinClient', jellyfin_items: List[dict]):
+    """把媒体项列表中的 路径 -> Id 登记到客户端的缓存"""
+    client.path_ids.update({
+        normalize_media_path(jf_item['Path']): jf_item['Id']
+        for jf_item in jellyfin_items if jf_item.get('Path')
+    })
+
+
+def refresh_items_replace_all(client: 'JellyfinClient', media_items: List[dict],
+                              logger: logging.Logger, page_size: int = 500) -> bool:
+    """
+    对指定条目逐项执行覆盖刷新（ReplaceAllMetadata），并等待这些条目的movie.nfo被重建
+    
+    Returns:
+        是否成功触发所有条目的刷新（Jellyfin未收录的条目无需刷新，直接跳过）
+    """
+    item_ids = find_jellyfin_ids(
+        client, (item['file_path'] for item in media_items), logger, page_size
+    )
+    if item_ids is None:
+        return False
+    
+    # Jellyfin未收录的条目不会被重建，不等待
+    waiter = NFORebuildWaiter(
+        item.movie_nfo_path for item in items_in_jellyfin(client, media_items, logger, page_size) or []
+    )
+    refreshed = client.refresh_items(item_ids, replace_all_metadata=True)
+    logger.info(f"逐项覆盖刷新: {refreshed}/{len(item_ids)} 个")
+    if refreshed < len(item_ids):
+        return False
+    
+    logger.info(f"\n等待 {len(waiter)} 个movie.nfo被重建...")
+    waiter.wait(max_wait=300)
+    return True
+
+
+def refresh_renamed_items(client: 'JellyfinClient', plan: SyncPlan, logger: logging.Logger,
+                          page_size: int = 500) -> bool:
+    """对受标签重命名/合并影响的条目逐项执行覆盖刷新（ReplaceAllMetadata）"""
+    return refresh_items_replace_all(client, plan.rename_items, logger, page_size)
+
+
+def sync_within_budget(client: 'JellyfinClient', plan: SyncPlan, config: dict,
+                       logger: logging.Logger, deadline: float) -> Tuple[List[str], bool]:
+    """
+    按时间预算分批同步：变更条目按Eagle修改时间从新到旧排序，每批依次
+    对删除了标签的条目逐项覆盖刷新、写入movie.nfo、逐项刷新，预计下一批无法在截止时间前完成时停止
+    
+    Args:
+        client: Jellyfin客户端
+        plan: 同步计划
+        config: 配置字典
+        logger: 日志记录器
+        deadline: 截止时间（time.time() 时间戳）
+        
+    Returns:
+        (未处理的条目（媒体文件路径）, 已处理的条目是否全部写入并刷新成功)
+    """
+    sync_config = config.get('sync', {})
+    page_size = sync_config.get('verify_page_size', 500)
+    chunk_size = sync_config.get('budget_chunk_size', 100)
+    
+    deletion_folders = {change.item.folder_name for change in plan.changes if change.removed_tags}
+    items = sorted([change.item for change in plan.changes] + plan.creates,
+                   key=lambda item: item.modification_time, reverse=True)
+    budget = deadline - time.time()
+    # 预留的余量：预算的 5%，至少 5 秒
+    margin = max(5.0, budget * 0.05)
+    logger.info(f"时间预算剩余 {budget:.0f} 秒，{len(items)} 个变更条目按修改时间从新到旧分批处理（每批 {chunk_size} 个）")
+    
+    nfo_state = get_nfo_state(config)
+    processed = 0
+    chunk_seconds = 0.0  # 最慢一批的耗时，用于预测下一批
+    created = 0
+    changed_total = 0
+    fail_total = 0
+    refresh_ok = True
+    refreshed_total = 0
+    while processed < len(items):
+        remaining_time = deadline - time.time()
+        if remaining_time < chunk_seconds + margin:
+            logger.warning(f"时间预算即将用尽（剩余 {remaining_time:.0f} 秒），停止处理")
+            break
+        
+        chunk_start = time.time()
+        chunk = items[processed:processed + chunk_size]
+        deletion_items = [item for item in chunk if item.folder_name in deletion_folders]
+        if deletion_items and not refresh_items_replace_all(client, deletion_items, logger, page_size):
+            logger.error("逐项覆盖刷新失败，停止处理")
+            refresh_ok = False
+            break
+        
+        _, fail, _, changed, _, changed_items = MovieNFOUpdater.batch_update_movie_nfos(
+            chunk, nfo_state=nfo_state
+        )
+        nfo_state.save()
+        fail_total += fail
+        changed_total += changed
+        created += sum(1 for c in changed_items if c['created'])
+        
+        item_ids = find_jellyfin_ids(client, (c['file_path'] for c in changed_items), logger, page_size)
+        if item_ids is None:
+            logger.error("无法获取Jellyfin媒体项列表，本批条目未刷新")
+            refresh_ok = False
+        elif item_ids:
+            refreshed = client.refresh_items(item_ids)
+            refreshed_total += refreshed
+            refresh_ok = refresh_ok and refreshed == len(item_ids)
+        
+        processed += len(chunk)
+        chunk_seconds = max(chunk_seconds, time.time() - chunk_start)
+        logger.info(f"已处理 {processed}/{len(items)} 个变更条目（本批 {time.time() - chunk_start:.1f} 秒）")
+    
+    if created:
+        # 新建NFO的条目需要Jellyfin扫描收录；只触发全库刷新，不等待完成
+        logger.info(f"{created} 个条目新建了movie.nfo，触发全库刷新（不等待完成）")
+        refresh_ok = client.refresh_library_search_missing_metadata() and refresh_ok
+    
+    logger.info(f"预算内写入 {changed_total} 个movie.nfo（失败 {fail_total} 个），逐项刷新 {refreshed_total} 个条目")
+    return [item.file_path for item in items[processed:]], fail_total == 0 and refresh_ok
+
+
+def sync_tags_v2(config: dict, logger: logging.Logger, dry_run: bool = False,
+                 client: Optional['JellyfinClient'] = None,
+                 profiler: Optional[StageProfiler] = None,
+                 scan_filter: Optional[ScanFilter] = None,
+                 time_budget: Optional[float] = None) -> bool:
     """
     执行标签同步 - V2自动化版本
     自动检测标签删除并选择合适的刷新模式
@@ -70,33 +455,55 @@ def sync_tags_v2(config: dict, logger: logging.Logger, dry_run: bool = False):
         config: 配置字典
         logger: 日志记录器
         dry_run: 是否模拟运行
+        client: 已创建的Jellyfin客户端（可选，多映射运行时共享连接与并发上限；
+                由调用方负责导出请求统计）
+        profiler: 分阶段剖析器（可选，见 --profile）
+        scan_filter: 子集过滤条件（可选）：只读取、写入和刷新选中的条目，
+                     标签删除只对这些条目逐项覆盖刷新，不做全库 ReplaceAllMetadata
+        time_budget: 时间预算（秒，可选）：按修改时间从新到旧分批处理变更条目，
+                     预算将尽时停止，未处理的条目记录到状态目录的 pending.json
+    
+    完整同步（或只按修改时间过滤的同步）没有写入或刷新失败时记录开始时间，供 --since-last-sync 使用
+    
+    Returns:
+        是否成功（连接失败、刷新失败、有条目未能刷新或有movie.nfo写入失败时为False）
     """
     start_time = time.time()
+    owns_client = client is None
+    if profiler is None:
+        profiler = StageProfiler()
+    # 只按修改时间过滤的同步也覆盖了全部变更，可以推进上次同步时间
+    records_last_sync = not (scan_filter and scan_filter.selects_subset)
     
     logger.info("=" * 60)
     logger.info("Eagle到Jellyfin标签同步 - V2自动化版")
     logger.info(f"时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info(f"模式: {'模拟运行' if dry_run else '正式运行'}")
+    if scan_filter:
+        logger.info(f"子集: {scan_filter.describe()}")
     logger.info("=" * 60)
     
     try:
         # 步骤1: 读取Eagle库
         logger.info("\n[步骤 1/4] 读取Eagle库...")
-        eagle_library = config['eagle']['library_path']
-        reader = EagleReader(eagle_library)
-        media_items = reader.read_all_media_files()
+        profiler.begin('read_eagle')
+        reader = create_reader(config)
+        media_items = reader.read_all_media_files(scan_filter)
         
         if not media_items:
             logger.warning("未找到任何媒体文件，同步终止")
-            return
+            return True
         
         logger.info(f"找到 {len(media_items)} 个媒体文件")
         
         # 统计
-        items_with_tags = [item for item in media_items if item['tags']]
-        total_tags = sum(len(item['tags']) for item in media_items)
+        items_with_tags = [item for item in media_items if item.tag_ids]
+        total_tags = sum(len(item.tag_ids) for item in media_items)
         
         logger.info(f"其中 {len(items_with_tags)} 个文件有标签，共 {total_tags} 个标签")
+        pending = load_pending(config)
+        if pending:
+            logger.info(f"上次运行因时间预算还有 {len(pending)} 个条目未处理，本次将重新检测")
         
         if dry_run:
             logger.info("\n[模拟运行] 有标签的文件示例:")
@@ -104,107 +511,397 @@ def sync_tags_v2(config: dict, logger: logging.Logger, dry_run: bool = False):
                 logger.info(f"  {i+1}. {item['file_name']}: {item['tags']}")
             if len(items_with_tags) > 5:
                 logger.info(f"  ... 还有 {len(items_with_tags)-5} 个文件有标签")
-            return
+            return True
         
         # 步骤2: 连接Jellyfin
         logger.info("\n[步骤 2/5] 连接Jellyfin...")
-        jellyfin_config = config['jellyfin']
-        client = JellyfinClient(
-            jellyfin_config['url'],
-            jellyfin_config['api_key'],
-            jellyfin_config['library_id']
-        )
+        profiler.begin('connect')
+        if client is None:
+            client = create_client(config)
         
         if not client.test_connection():
             logger.error("无法连接到Jellyfin服务器")
-            return
+            return False
         
         # 步骤3: 先让Jellyfin刷新（如果有标签删除，使用ReplaceAllMetadata）
         logger.info("\n[步骤 3/5] 检测是否需要预刷新...")
+        profiler.begin('plan_prerefresh')
         
-        # 先快速检测是否有标签删除（不实际更新NFO）
-        has_deletions = False
-        for item in media_items:
-            folder_path = Path(item['folder_path'])
-            movie_nfo = folder_path / 'movie.nfo'
-            if movie_nfo.exists():
-                current_tags = set(item['tags'])
-                existing_tags = MovieNFOUpdater.get_existing_tags(str(movie_nfo))
-                if existing_tags - current_tags:  # 有要删除的标签
-                    has_deletions = True
-                    break
+        # 先计算变更计划（不实际更新NFO），检测标签删除与重命名/合并
+        sync_config = config.get('sync', {})
+        # 子集同步看不到子集外的条目，无法判断标签是否在全库消失，不识别重命名/合并
+        plan = plan_changes(media_items, reader.tag_table, find_renames=not scan_filter)
+        has_deletions = plan.has_deletions
+        prerefresh = plan.prerefresh_strategy(subset=bool(scan_filter))
+        rename_summary = plan.describe_renames()
+        subset_replaced = False
+        logger.info(f"检测到 {len(plan.changes)} 个条目标签有变化")
+        for line in rename_summary:
+            logger.info(f"  检测到标签重命名/合并: {line}")
+        
+        if time_budget is not None:
+            # 有时间预算时不做全库预刷新与全库校验，按优先级分批处理
+            remaining, budget_ok = sync_within_budget(client, plan, config, logger, start_time + time_budget)
+            save_pending(config, remaining)
+            elapsed_time = time.time() - start_time
+            logger.info("\n" + "=" * 60)
+            if budget_ok:
+                logger.info(f"✓ 同步{'完成' if not remaining else '在时间预算内结束'}!")
+            else:
+                logger.warning("✗ 同步结束，但有条目写入或刷新失败")
+            logger.info(f"  总耗时: {elapsed_time:.2f} 秒（预算 {time_budget:.0f} 秒）")
+            if remaining:
+                logger.info(f"  未处理: {len(remaining)} 个条目，已记录到 pending.json，下次运行继续")
+            logger.info("=" * 60)
+            return budget_ok
+        
+        if prerefresh == 'subset_replace':
+            # 子集同步：只对子集中删除了标签的条目覆盖刷新，不动子集外的条目
+            logger.info("✓ 子集同步，仅对删除了标签的条目执行覆盖刷新...")
+            deletion_items = [change.item for change in plan.changes if change.removed_tags]
+            if refresh_items_replace_all(client, deletion_items, logger,
+                                         sync_config.get('verify_page_size', 500)):
+                has_deletions = False
+                subset_replaced = True
+            else:
+                logger.warning("逐项覆盖刷新未能完成，退回全库 ReplaceAllMetadata")
+        elif prerefresh == 'rename_replace':
+            # 删除全部来自重命名/合并：只对受影响的条目做覆盖刷新，避免全库ReplaceAllMetadata
+            logger.info("✓ 标签删除均来自重命名/合并，仅对受影响条目执行覆盖刷新...")
+            if refresh_renamed_items(client, plan, logger, sync_config.get('verify_page_size', 500)):
+                has_deletions = False
+            else:
+                logger.warning("逐项覆盖刷新未能完成，退回全库 ReplaceAllMetadata")
         
         if has_deletions:
             logger.info("✓ 检测到标签删除，先执行 ReplaceAllMetadata 刷新...")
             logger.info("  （这会让Jellyfin重建NFO，但我们稍后会重新写入标签）")
+            # 即将重写的NFO：有标签的条目与标签有变化的条目（快照须在触发刷新之前记录）
+            # Jellyfin未收录的条目（如图片）不会被重建，不等待；获取媒体项列表失败时等待全部
+            rewrite_items = [item for item in media_items if item.tag_ids] + [
+                change.item for change in plan.changes if not change.item.tag_ids
+            ]
+            known_items = items_in_jellyfin(client, rewrite_items, logger,
+                                            sync_config.get('verify_page_size', 500))
+            waiter = NFORebuildWaiter(item.movie_nfo_path for item in
+                                      (known_items if known_items is not None else rewrite_items))
             if not client.refresh_library_replace_all_metadata():
                 logger.error("ReplaceAllMetadata刷新失败")
-                return
-            logger.info("\n等待预刷新完成（包含额外等待时间确保NFO稳定）...")
-            # 等待刷新完成，额外5秒确保NFO真正写入完成
-            client.wait_for_refresh_complete(check_interval=10, max_wait=900, extra_wait=5)
-            
-            # 验证NFO是否真的被重建（检查几个样本）
-            logger.info("\n验证NFO是否已重建...")
-            sample_items = [item for item in media_items if item.get('tags')][:5]
-            nfo_rebuilt_count = 0
-            for item in sample_items:
-                folder_path = Path(item['folder_path'])
-                movie_nfo = folder_path / 'movie.nfo'
-                if movie_nfo.exists():
-                    existing_tags = MovieNFOUpdater.get_existing_tags(str(movie_nfo))
-                    if not existing_tags:  # NFO存在但没有标签，说明被重建了
-                        nfo_rebuilt_count += 1
-            
-            if nfo_rebuilt_count > 0:
-                logger.info(f"✓ 验证通过：检查了 {len(sample_items)} 个样本，{nfo_rebuilt_count} 个NFO已被重建（无标签）")
-            else:
-                logger.warning(f"⚠ 警告：样本NFO中仍有标签，可能刷新未完全完成。继续执行但可能需要二次同步。")
+                return False
+            logger.info(f"\n等待 {len(waiter)} 个movie.nfo被Jellyfin重建...")
+            waiter.wait(
+                per_file_timeout=sync_config.get('nfo_rebuild_timeout', 120),
+                max_wait=sync_config.get('nfo_rebuild_max_wait', 900)
+            )
+        elif subset_replaced:
+            logger.info("✓ 标签删除已通过逐项覆盖刷新处理，跳过全库预刷新")
+        elif rename_summary:
+            logger.info("✓ 重命名/合并已通过逐项覆盖刷新处理，跳过全库预刷新")
         else:
             logger.info("✓ 无标签删除，跳过预刷新")
         
         # 步骤4: 现在写入标签到movie.nfo
         logger.info("\n[步骤 4/5] 修改movie.nfo文件，写入标签...")
-        success, fail, skip, changed, _, _ = MovieNFOUpdater.batch_update_movie_nfos(media_items)
+        profiler.begin('write_nfo')
+        nfo_state = get_nfo_state(config)
+        success, fail, skip, changed, _, changed_items = MovieNFOUpdater.batch_update_movie_nfos(
+            media_items, nfo_state=nfo_state
+        )
+        nfo_state.save()
         logger.info(f"Movie.nfo更新完成: 成功 {success} 个, 失败 {fail} 个, "
                    f"跳过 {skip} 个, 变更 {changed} 个")
         
         if success == 0 and changed == 0:
             logger.warning("没有任何文件需要更新，同步终止")
-            return
+            if fail == 0 and records_last_sync:
+                save_last_sync(config, start_time)
+            return fail == 0
         
-        # 步骤5: 最后再刷新一次，让Jellyfin读取我们写入的标签
-        logger.info("\n[步骤 5/5] 触发最终刷新，读取标签...")
-        if not client.refresh_library_search_missing_metadata():
-            logger.warning("标准刷新失败，尝试使用 ReplaceAllMetadata 模式")
-            if not client.refresh_library_replace_all_metadata():
-                logger.error("刷新失败")
-                return
+        # 步骤5: 校验Jellyfin中的标签，只刷新与Eagle不一致的条目
+        logger.info("\n[步骤 5/5] 校验Jellyfin标签，仅刷新有差异的条目...")
+        profiler.begin('verify_refresh')
+        refresh_strategy = '全库刷新'
+        refresh_ok = True
+        jellyfin_items = client.get_library_items(
+            fields=['Tags', 'Path'],
+            page_size=sync_config.get('verify_page_size', 500)
+        )
         
-        # 等待刷新完成
-        logger.info("\n等待最终刷新完成...")
-        client.wait_for_refresh_complete(check_interval=5, max_wait=600, extra_wait=3)
+        if jellyfin_items is None:
+            logger.warning("无法获取Jellyfin媒体项列表，退回全库刷新")
+            if not refresh_library_and_wait(client, logger):
+                return False
+        else:
+            cache_jellyfin_ids(client, jellyfin_items)
+            created_paths = {
+                normalize_media_path(c['file_path']) for c in changed_items if c['created']
+            }
+            out_of_sync_ids, missing_paths = find_out_of_sync_items(
+                media_items, jellyfin_items, created_paths
+            )
+            max_item_refreshes = sync_config.get('max_item_refreshes', 200)
+            logger.info(f"标签不一致: {len(out_of_sync_ids)} 个, "
+                        f"Jellyfin中尚未收录: {len(missing_paths)} 个")
+            
+            if not out_of_sync_ids and not missing_paths:
+                refresh_strategy = '无需刷新'
+                logger.info("✓ Jellyfin标签已与Eagle一致，跳过最终刷新")
+            elif missing_paths:
+                logger.info("有新文件需要Jellyfin扫描收录，执行全库刷新")
+                if not refresh_library_and_wait(client, logger):
+                    return False
+            else:
+                refresh_plan = plan_final_refresh(client, out_of_sync_ids, jellyfin_items,
+                                                  sync_config, logger)
+                if refresh_plan.library or refresh_plan.requests > max_item_refreshes:
+                    if not refresh_plan.library:
+                        logger.info(f"刷新请求超过 {max_item_refreshes} 个，执行全库刷新")
+                    if not refresh_library_and_wait(client, logger):
+                        return False
+                else:
+                    refresh_strategy = refresh_plan.describe()
+                    refresh_ok = execute_refresh_plan(client, refresh_plan, logger)
         
         # 完成
+        if not scan_filter:
+            save_pending(config, [])
+        if fail == 0 and refresh_ok and records_last_sync:
+            # 有写入或刷新失败的条目时不推进，以免之后的 --since-last-sync 永久跳过它们
+            save_last_sync(config, start_time)
+        elif records_last_sync:
+            logger.warning("有条目写入或刷新失败，未更新上次同步时间（下次 --since-last-sync 会重新检查）")
         elapsed_time = time.time() - start_time
         logger.info("\n" + "=" * 60)
         logger.info("✓ 同步完成!")
         logger.info(f"  总耗时: {elapsed_time:.2f} 秒")
         logger.info(f"  成功更新: {success} 个文件")
         logger.info(f"  标签变更: {changed} 个文件")
-        logger.info(f"  策略: {'预刷新清除 + 写入标签 + 最终刷新' if has_deletions else '直接写入 + 刷新'}")
+        if has_deletions:
+            write_strategy = '预刷新清除 + 写入标签'
+        elif subset_replaced:
+            write_strategy = '子集条目逐项覆盖刷新 + 写入标签'
+        elif rename_summary:
+            write_strategy = '重命名条目逐项覆盖刷新 + 写入标签'
+        else:
+            write_strategy = '直接写入'
+        logger.info(f"  策略: {write_strategy} + {refresh_strategy}")
+        if rename_summary:
+            logger.info(f"  标签重命名/合并: {'; '.join(rename_summary)}")
         logger.info("=" * 60)
+        return fail == 0 and refresh_ok
         
     except KeyboardInterrupt:
         logger.warning("\n用户中断同步")
-        sys.exit(1)
+        return False
     except Exception as e:
         logger.error(f"\n同步过程中发生错误: {e}", exc_info=True)
-        sys.exit(1)
+        return False
+    finally:
+        profile_dir = profiler.finish()
+        if profile_dir is not None:
+            logger.info(f"剖析报告: {profile_dir}")
+        if owns_client and client is not None:
+            export_client_metrics(client, config, logger)
 
 
-def main():
-    """主函数"""
+def repair_tags(config: dict, logger: logging.Logger, dry_run: bool = False,
+                client: Optional['JellyfinClient'] = None,
+                profiler: Optional[StageProfiler] = None,
+                scan_filter: Optional[ScanFilter] = None) -> bool:
+    """
+    修复模式：只处理自上次写入后被外部（Jellyfin）重写的movie.nfo
+    按写入时记录的 mtime/大小/哈希找出被修改或删除的NFO，重新写入标签，
+    并只对这些条目逐项刷新，不做全库对比与全库刷新
+    
+    Args:
+        config: 配置字典
+        logger: 日志记录器
+        dry_run: 是否模拟运行（只报告被外部修改的NFO）
+        client: 已创建的Jellyfin客户端（可选，同 sync_tags_v2）
+        profiler: 分阶段剖析器（可选，同 sync_tags_v2）
+        scan_filter: 子集过滤条件（可选，同 sync_tags_v2）
+    
+    Returns:
+        是否成功（连接失败、写入失败或有条目未能刷新时为False）
+    """
+    start_time = time.time()
+    owns_client = client is None
+    if profiler is None:
+        profiler = StageProfiler()
+    
+    logger.info("=" * 60)
+    logger.info("Eagle到Jellyfin标签同步 - 修复被覆盖的NFO")
+    logger.info(f"时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    logger.info(f"模式: {'模拟运行' if dry_run else '正式运行'}")
+    if scan_filter:
+        logger.info(f"子集: {scan_filter.describe()}")
+    logger.info("=" * 60)
+    
+    try:
+        nfo_state = get_nfo_state(config)
+        if not len(nfo_state):
+            logger.warning("尚无movie.nfo写入记录，请先执行一次完整同步")
+            return True
+        
+        # 步骤1: 读取Eagle库
+        logger.info("\n[步骤 1/3] 读取Eagle库并检查movie.nfo...")
+        profiler.begin('read_check')
+        reader = create_reader(config)
+        media_items = reader.read_all_media_files(scan_filter)
+        
+        repair_items = []
+        untracked = 0
+        for item in media_items:
+            status = nfo_state.check(item.movie_nfo_path)
+            if status == MODIFIED or status == MISSING:
+                logger.debug(f"movie.nfo被外部{'修改' if status == MODIFIED else '删除'}: {item.movie_nfo_path}")
+                repair_items.append(item)
+            elif status == UNTRACKED:
+                untracked += 1
+        logger.info(f"共 {len(media_items)} 个条目, 被外部修改或删除的movie.nfo: {len(repair_items)} 个, "
+                    f"无写入记录: {untracked} 个")
+        
+        if not repair_items:
+            nfo_state.save()
+            logger.info("✓ 没有被外部修改的movie.nfo，无需修复")
+            return True
+        
+        if dry_run:
+            logger.info("\n[模拟运行] 被外部修改的NFO示例:")
+            for i, item in enumerate(repair_items[:5]):
+                logger.info(f"  {i+1}. {item['file_name']}: {item['tags']}")
+            if len(repair_items) > 5:
+                logger.info(f"  ... 还有 {len(repair_items)-5} 个")
+            return True
+        
+        # 步骤2: 重新写入标签（标签仍然正确的NFO只更新记录）
+        logger.info("\n[步骤 2/3] 重新写入标签...")
+        profiler.begin('write_nfo')
+        success, fail, skip, changed, _, changed_items = MovieNFOUpdater.batch_update_movie_nfos(
+            repair_items, nfo_state=nfo_state
+        )
+        nfo_state.save()
+        
+        # 步骤3: 只刷新重新写入了标签的条目
+        logger.info("\n[步骤 3/3] 逐项刷新修复的条目...")
+        profiler.begin('refresh')
+        refreshed = 0
+        item_ids: List[str] = []
+        if changed_items:
+            if client is None:
+                client = create_client(config)
+            if not client.test_connection():
+                logger.error("无法连接到Jellyfin服务器")
+                return False
+            item_ids = find_jellyfin_ids(
+                client, (c['file_path'] for c in changed_items), logger,
+                config.get('sync', {}).get('verify_page_size', 500)
+            )
+            if item_ids is None:
+                logger.error("无法获取Jellyfin媒体项列表，请稍后重试或执行完整同步")
+                return False
+            refreshed = client.refresh_items(item_ids)
+        else:
+            logger.info("✓ 被修改的NFO中标签仍然正确，无需刷新")
+        
+        elapsed_time = time.time() - start_time
+        logger.info("\n" + "=" * 60)
+        logger.info("✓ 修复完成!")
+        logger.info(f"  总耗时: {elapsed_time:.2f} 秒")
+        logger.info(f"  被外部修改: {len(repair_items)} 个, 重新写入标签: {changed} 个, "
+                    f"失败: {fail} 个")
+        logger.info(f"  逐项刷新: {refreshed}/{len(item_ids)} 个")
+        logger.info("=" * 60)
+        return fail == 0 and refreshed == len(item_ids)
+        
+    except KeyboardInterrupt:
+        logger.warning("\n用户中断修复")
+        return False
+    except Exception as e:
+        logger.error(f"\n修复过程中发生错误: {e}", exc_info=True)
+        return False
+    finally:
+        profile_dir = profiler.finish()
+        if profile_dir is not None:
+            logger.info(f"剖析报告: {profile_dir}")
+        if owns_client and client is not None:
+            export_client_metrics(client, config, logger)
+
+
+def plan_sync(config: dict, logger: logging.Logger, output: Optional[str] = None,
+              fmt: str = 'json', scan_filter: Optional[ScanFilter] = None) -> bool:
+    """
+    计划模式：只读取Eagle库与movie.nfo，计算精确的变更集合，
+    估算正式运行会选择的刷新策略与Jellyfin请求数并写出报告；不修改文件、不访问Jellyfin
+    
+    Args:
+        config: 配置字典
+        logger: 日志记录器
+        output: 报告文件路径（默认为状态目录下的 plan.json / plan.csv，'-' 表示标准输出）
+        fmt: 报告格式 'json' 或 'csv'
+        scan_filter: 子集过滤条件（可选）
+        
+    Returns:
+        是否成功写出报告
+    """
+    start_time = time.time()
+    sync_config = config.get('sync', {})
+    
+    reader = create_reader(config)
+    media_items = reader.read_all_media_files(scan_filter)
+    plan = plan_changes(media_items, reader.tag_table, find_renames=not scan_filter)
+    estimate = estimate_requests(
+        plan, len(media_items), subset=bool(scan_filter),
+        page_size=sync_config.get('verify_page_size', 500),
+        max_item_refreshes=sync_config.get('max_item_refreshes', 200),
+        request_cost=sync_config.get('refresh_request_cost', DEFAULT_REQUEST_COST),
+        library_overhead=sync_config.get('library_refresh_overhead', 0.0)
+    )
+    summary = {
+        'generated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'library_path': config['eagle']['library_path'],
+        'subset': scan_filter.describe() if scan_filter else '',
+        'items': len(media_items),
+        'updates': len(plan.changes),
+        'creates': len(plan.creates),
+        'tags_added': sum(len(change.added_ids) for change in plan.changes),
+        'tags_removed': sum(len(change.removed_tags) for change in plan.changes),
+        'renames': plan.describe_renames(),
+        'elapsed_seconds': round(time.time() - start_time, 3),
+        **estimate
+    }
+    
+    if output is None:
+        output = str(get_state_dir(config) / f'plan.{fmt}')
+    try:
+        if output == '-':
+            write_plan_report(plan, summary, sys.stdout, fmt)
+        else:
+            Path(output).parent.mkdir(parents=True, exist_ok=True)
+            with open(output, 'w', encoding='utf-8', newline='') as f:
+                write_plan_report(plan, summary, f, fmt)
+    except OSError as e:
+        logger.error(f"写入计划报告失败 {output}: {e}")
+        return False
+    
+    logger.info(f"计划: {summary['items']} 个条目, 更新 {summary['updates']} 个, 新建NFO {summary['creates']} 个 "
+                f"(新增标签 {summary['tags_added']} 个, 删除 {summary['tags_removed']} 个)")
+    for line in summary['renames']:
+        logger.info(f"  标签重命名/合并: {line}")
+    logger.info(f"  预刷新: {estimate['prerefresh']}, 最终刷新: {estimate['final_refresh']}, "
+                f"预计Jellyfin请求: {'至多 ' if estimate['requests_upper_bound'] else ''}"
+                f"{estimate['requests']} 个（不含等待轮询）")
+    logger.info(f"  计算耗时: {summary['elapsed_seconds']:.2f} 秒, 报告: {output}")
+    return True
+
+
+def main(argv=None) -> int:
+    """
+    主函数
+    
+    Args:
+        argv: 命令行参数（默认使用 sys.argv），供 main.py 在同一进程内调用
+    """
     parser = argparse.ArgumentParser(
         description='Eagle到Jellyfin标签同步工具 V2 - 自动化版',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -212,7 +909,14 @@ def main():
 示例:
   python sync_v2_simple.py              # 标准同步（自动检测标签删除）
   python sync_v2_simple.py --dry-run    # 模拟运行
+  python sync_v2_simple.py --repair     # 只修复被Jellyfin重写的movie.nfo
+  python sync_v2_simple.py --plan       # 只计算变更集合与刷新策略，写出报告
   python sync_v2_simple.py --log-level DEBUG  # 详细日志
+  python sync_v2_simple.py --profile    # 分阶段剖析（报告写入 profiles/<时间>/）
+  python sync_v2_simple.py --eagle-folder 电影/动画 --tag 待整理  # 只同步选中的子集
+  python sync_v2_simple.py --since-last-sync  # 只同步上次完整同步之后在Eagle中修改过的条目
+  python sync_v2_simple.py --time-budget 600  # 最多运行约10分钟，剩余条目留给下次
+  python sync_v2_simple.py --enqueue    # 把变更写入任务队列，再在多个进程/主机上运行 --worker
 
 说明:
   V2.2 版本通过调整刷新顺序解决标签持久化问题：
@@ -228,6 +932,104 @@ def main():
         help='模拟运行，不实际修改文件'
     )
     
+    parser.add_argument(
+        '--repair',
+        action='store_true',
+        help='修复模式：只对自上次写入后被外部重写的movie.nfo重新写入标签并逐项刷新'
+    )
+    
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='计划模式：计算每个条目的标签增删、将选择的刷新策略与预计请求数，写出报告（不修改文件、不访问Jellyfin）'
+    )
+    
+    parser.add_argument(
+        '--plan-format',
+        choices=['json', 'csv'],
+        default='json',
+        help='计划报告格式（默认: json）'
+    )
+    
+    parser.add_argument(
+        '--plan-output',
+        metavar='FILE',
+        help='计划报告路径（默认: 状态目录下的 plan.json/plan.csv，- 表示标准输出）'
+    )
+    
+    parser.add_argument(
+        '--eagle-folder',
+        action='append',
+        default=[],
+        metavar='FOLDER',
+        help='只同步该Eagle文件夹（Id、名称或 父/子 路径，包含子文件夹）中的条目，可重复指定'
+    )
+    
+    parser.add_argument(
+        '--tag',
+        action='append',
+        default=[],
+        help='只同步当前带有该标签的条目，可重复指定（注意：刚在Eagle中删除该标签的条目不会被选中）'
+    )
+    
+    parser.add_argument(
+        '--path-prefix',
+        action='append',
+        default=[],
+        metavar='PREFIX',
+        help='只同步 .info 文件夹路径（绝对路径或相对 images 目录）以该前缀开头的条目，可重复指定'
+    )
+    
+    parser.add_argument(
+        '--since-last-sync',
+        action='store_true',
+        help='只同步上次完整同步开始之后在Eagle中修改过的条目（不识别标签重命名/合并；没有记录时同步全部）'
+    )
+    
+    parser.add_argument(
+        '--time-budget',
+        type=float,
+        metavar='SECONDS',
+        help='时间预算（秒）：变更条目按Eagle修改时间从新到旧分批写入并逐项刷新，预算将尽时停止，剩余条目下次运行处理'
+    )
+    
+    parser.add_argument(
+        '--enqueue',
+        action='store_true',
+        help='队列模式：计算变更计划并写入任务队列（由 --worker 进程执行）'
+    )
+    
+    parser.add_argument(
+        '--worker',
+        action='store_true',
+        help='队列模式：领取并执行队列中的任务，全部结束后由一个工作进程收尾（可同时运行多个）'
+    )
+    
+    parser.add_argument(
+        '--queue',
+        metavar='FILE',
+        help='任务队列文件（默认: sync.queue_path 或状态目录下的 queue.sqlite）'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='按阶段用 cProfile 剖析，.pstats 与文本摘要写入日志旁的 profiles/<时间>/ 目录'
+    )
+    
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help='剖析时同时用 tracemalloc 记录每个阶段的内存分配（开销较大，隐含 --profile）'
+    )
+    
+    parser.add_argument(
+        '--profile-top',
+        type=int,
+        default=30,
+        help='剖析摘要中列出的条目数（默认: 30）'
+    )
+    
     parser.add_argument(
         '--log-level',
         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
@@ -235,10 +1037,12 @@ def main():
         help='日志级别（默认: INFO）'
     )
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # 设置日志
-    logger = setup_logging(level=args.log_level)
+    # 计划报告写到标准输出时，控制台日志改写到标准错误
+    logger = setup_logging(level=args.log_level,
+                           stream=sys.stderr if args.plan and args.plan_output == '-' else None)
     
     # 加载配置
     try:
@@ -247,9 +1051,61 @@ def main():
         logger.error(f"加载配置文件失败: {e}")
         sys.exit(1)
     
+    scan_filter = ScanFilter(args.eagle_folder, args.tag, args.path_prefix)
+    if args.since_last_sync:
+        if 'mappings' in config:
+            logger.error("多库配置暂不支持 --since-last-sync，请为单个库单独运行")
+            return 1
+        scan_filter.modified_since = load_last_sync(config)
+        if scan_filter.modified_since is None:
+            logger.info("没有上次完整同步的记录，本次同步全部条目")
+    
+    profiler = None
+    if args.profile or args.profile_memory:
+        profiler = StageProfiler.for_run(
+            str(Path(__file__).parent / 'profiles'),
+            trace_memory=args.profile_memory,
+            top_n=args.profile_top
+        )
+    
     # 执行同步
-    sync_tags_v2(config, logger, dry_run=args.dry_run)
+    if args.plan:
+        if 'mappings' in config:
+            logger.error("多库配置暂不支持 --plan，请为单个库单独运行")
+            return 1
+        ok = plan_sync(config, logger, output=args.plan_output, fmt=args.plan_format,
+                       scan_filter=scan_filter)
+        return 0 if ok else 1
+    if args.enqueue or args.worker:
+        if 'mappings' in config:
+            logger.error("多库配置暂不支持队列模式，请为单个库单独运行")
+            return 1
+        from queue_sync import enqueue_sync, run_worker
+        if args.enqueue:
+            enqueue_sync(config, logger, queue_path=args.queue, scan_filter=scan_filter)
+            return 0
+        return 0 if run_worker(config, logger, queue_path=args.queue) else 1
+    if 'mappings' in config:
+        # 多库/多服务器配置：并发执行各映射
+        from multi_sync import run_mappings
+        if profiler is not None:
+            # cProfile 不能在多个线程中同时启用
+            logger.warning("多库配置下各映射并发执行，不支持 --profile，已忽略")
+        try:
+            failed = run_mappings(config, logger, dry_run=args.dry_run, repair=args.repair,
+                                  scan_filter=scan_filter, time_budget=args.time_budget)
+        except ValueError as e:
+            logger.error(f"多库配置无效: {e}")
+            return 1
+        return 1 if failed else 0
+    if args.repair:
+        ok = repair_tags(config, logger, dry_run=args.dry_run, profiler=profiler,
+                         scan_filter=scan_filter)
+    else:
+        ok = sync_tags_v2(config, logger, dry_run=args.dry_run, profiler=profiler,
+                          scan_filter=scan_filter, time_budget=args.time_budget)
+    return 0 if ok else 1
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
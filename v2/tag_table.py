@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全局标签表模块
+为每个标签分配整数Id，媒体项只保存有序的标签Id元组，
+使标签对比、指纹和"哪些条目有标签X"之类的全库查询更廉价
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+TagIds = Tuple[int, ...]
+
+
+class TagTable:
+    """全局标签表：标签字符串 <-> 整数Id"""
+
+    def __init__(self, tags: Iterable[str] = ()):
+        """
+        Args:
+            tags: 预先登记的标签（可选，使Id在多次运行间尽量稳定）
+        """
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        for tag in tags:
+            self.tag_id(tag)
+
+    @classmethod
+    def from_eagle_library(cls, library_path: str) -> 'TagTable':
+        """
+        使用Eagle库的 tags.json 预先登记标签
+
+        Args:
+            library_path: Eagle库的根路径
+
+        Returns:
+            标签表（tags.json 不存在或无法解析时为空表）
+        """
+        tags_file = Path(library_path) / 'tags.json'
+        if not tags_file.exists():
+            return cls()
+        try:
+            with open(tags_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            tags = set(data.get('historyTags', [])) | set(data.get('starredTags', []))
+            return cls(sorted(tags))
+        except Exception as e:
+            logger.warning(f"读取tags.json失败 {tags_file}: {e}")
+            return cls()
+
+    def tag_id(self, tag: str, add: bool = True) -> Optional[int]:
+        """
+        获取标签的Id
+
+        Args:
+            tag: 标签字符串
+            add: 标签不存在时是否登记
+
+        Returns:
+            标签Id，不存在且 add=False 时返回None
+        """
+        tag_id = self._ids.get(tag)
+        if tag_id is None and add:
+            tag_id = len(self._names)
+            self._ids[tag] = tag_id
+            self._names.append(tag)
+        return tag_id
+
+    def name(self, tag_id: int) -> str:
+        """获取Id对应的标签字符串"""
+        return self._names[tag_id]
+
+    def intern(self, tag: str) -> str:
+        """返回标签在表中的共享实例"""
+        return self._names[self.tag_id(tag)]
+
+    def encode(self, tags: Iterable[str]) -> TagIds:
+        """
+        将标签集合编码为有序、去重的Id元组
+
+        Args:
+            tags: 标签序列
+
+        Returns:
+            有序的标签Id元组（相同的标签集合总是得到相同的元组）
+        """
+        return tuple(sorted({self.tag_id(tag) for tag in tags}))
+
+    def decode(self, tag_ids: Sequence[int]) -> Tuple[str, ...]:
+        """将Id元组解码为标签字符串元组"""
+        names = self._names
+        return tuple(names[tag_id] for tag_id in tag_ids)
+
+    def matches(self, tag_ids: TagIds, tags: Set[str]) -> bool:
+        """
+        Id元组与外部（movie.nfo、Jellyfin）标签字符串集合是否相同
+        外部标签不编码、不登记到表中；Id元组已去重，长度相同且包含全部Id对应的标签即相同
+
+        Args:
+            tag_ids: 有序、去重的标签Id元组
+            tags: 标签字符串集合
+
+        Returns:
+            是否相同
+        """
+        return len(tag_ids) == len(tags) and tags.issuperset(map(self._names.__getitem__, tag_ids))
+
+    def diff(self, current_ids: TagIds, existing_tags: Set[str]) -> Tuple[TagIds, Tuple[str, ...]]:
+        """
+        对比当前标签Id与外部的已有标签字符串集合
+        已有标签可能不在表中（只存在于movie.nfo），以字符串返回且不登记到表中
+
+        Args:
+            current_ids: 当前（目标）标签Id
+            existing_tags: 已有标签字符串集合
+
+        Returns:
+            (新增的Id, 删除的标签字符串，按字符串排序)
+        """
+        # 绝大多数条目没有变化，先做不构造集合的相等判断
+        if self.matches(current_ids, existing_tags):
+            return (), ()
+        names = self._names
+        added = tuple(tag_id for tag_id in current_ids if names[tag_id] not in existing_tags)
+        removed = tuple(sorted(existing_tags.difference(map(names.__getitem__, current_ids))))
+        return added, removed
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, tag: str) -> bool:
+        return tag in self._ids
+
+
+def build_inverted_index(tag_id_lists: Iterable[TagIds]) -> Dict[int, List[int]]:
+    """
+    构建倒排索引：标签Id -> 拥有该标签的媒体项下标列表
+
+    Args:
+        tag_id_lists: 按媒体项顺序排列的标签Id元组
+
+    Returns:
+        标签Id到媒体项下标列表的映射
+    """
+    index: Dict[int, List[int]] = {}
+    for position, tag_ids in enumerate(tag_id_lists):
+        for tag_id in tag_ids:
+            index.setdefault(tag_id, []).append(position)
+    return index
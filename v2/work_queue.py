@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化任务队列模块
+基于 SQLite 的任务队列：规划进程把一次同步（run）拆成逐条目的任务写入队列，
+多个工作进程按批领取任务（带租约，进程崩溃后租约过期的任务会被重新领取），
+失败的任务延迟重试，全部任务结束后恰好由一个工作进程执行收尾
+
+注意: SQLite 依赖文件锁。多台主机共享同一个队列文件时，该文件所在的共享盘必须正确支持
+字节范围锁（SMB 通常可以，NFS 需要启用 lockd）；队列使用回滚日志模式（WAL 不能用于网络文件系统）
+"""
+
+import json
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# 任务状态
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+# 运行状态
+RUN_OPEN = 'open'
+RUN_FINALIZING = 'finalizing'
+RUN_FINISHED = 'finished'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    status TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    needs_library_refresh INTEGER NOT NULL DEFAULT 0,
+    finalizer TEXT,
+    lease_expires REAL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (run_id, status, priority DESC, id);
+"""
+
+
+class Job(NamedTuple):
+    """一个已领取的任务"""
+    id: int
+    kind: str
+    payload: dict
+    attempts: int
+
+
+class WorkQueue:
+    """
+    SQLite 任务队列
+    每个进程（线程）使用各自的 WorkQueue 实例；领取与完成都在单个写事务中完成
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 600, max_attempts: int = 3,
+                 retry_delay: float = 30, timeout: float = 60):
+        """
+        Args:
+            db_path: 队列数据库文件路径
+            lease_seconds: 任务租约时长（秒），超过后未完成的任务可被其他进程重新领取
+            max_attempts: 每个任务的最大尝试次数（含租约过期），超过后标记为失败
+            retry_delay: 失败重试的基础延迟（秒），按尝试次数线性增加
+            timeout: 等待数据库锁的超时（秒）
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # isolation_level=None：由本类显式管理事务
+        self._conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=DELETE')
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        """关闭数据库连接"""
+        self._conn.close()
+
+    def _write(self):
+        """开始一个写事务（BEGIN IMMEDIATE 立即获取写锁，避免领取时的竞争）"""
+        return _Transaction(self._conn)
+
+    def create_run(self, jobs: Iterable[Tuple[str, dict, int]], description: str = '') -> int:
+        """
+        创建一次运行并写入其全部任务
+
+        Args:
+            jobs: (任务类型, 任务数据, 优先级) 序列，优先级高的先被领取
+            description: 运行说明
+
+        Returns:
+            运行Id
+        """
+        with self._write() as conn:
+            cursor = conn.execute(
+                'INSERT INTO runs (created, status, description) VALUES (?, ?, ?)',
+                (time.time(), RUN_OPEN, description)
+            )
+            run_id = cursor.lastrowid
+            self._insert_jobs(conn, run_id, jobs)
+        return run_id
+
+    @staticmethod
+    def _insert_jobs(conn: sqlite3.Connection, run_id: int, jobs: Iterable[Tuple[str, dict, int]]):
+        conn.executemany(
+            'INSERT INTO jobs (run_id, kind, payload, priority, status) VALUES (?, ?, ?, ?, ?)',
+            ((run_id, kind, json.dumps(payload, ensure_ascii=False), priority, PENDING)
+             for kind, payload, priority in jobs)
+        )
+
+    def latest_open_run(self) -> Optional[int]:
+        """最近一次尚未结束的运行Id（没有时为None）"""
+        row = self._conn.execute(
+            'SELECT id FROM runs WHERE status != ? ORDER BY id DESC LIMIT 1', (RUN_FINISHED,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def claim(self, run_id: int, worker: str, limit: int) -> List[Job]:
+        """
+        领取一批任务（待处理且已到重试时间的任务，以及租约已过期的任务）
+
+        Args:
+            run_id: 运行Id
+            worker: 工作进程标识
+            limit: 最多领取的任务数
+
+        Returns:
+            领取到的任务（可能为空）
+        """
+        now = time.time()
+        with self._write() as conn:
+            # 租约过期且尝试次数已用尽的任务不再领取
+            conn.execute(
+                'UPDATE jobs SET status = ?, last_error = ? '
+                'WHERE run_id = ? AND status = ? AND lease_expires <= ? AND attempts >= ?',
+                (FAILED, '租约过期次数过多', run_id, LEASED, now, self.max_attempts)
+            )
+            rows = conn.execute(
+                'SELECT id, kind, payload, attempts FROM jobs '
+                'WHERE run_id = ? AND ((status = ? AND not_before <= ?) OR (status = ? AND lease_expires <= ?)) '
+                'ORDER BY priority DESC, id LIMIT ?',
+                (run_id, PENDING, now, LEASED, now, limit)
+            ).fetchall()
+            conn.executemany(
+                'UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ? '
+                'WHERE id = ?',
+                ((LEASED, worker, now + self.lease_seconds, row[0]) for row in rows)
+            )
+        return [Job(job_id, kind, json.loads(payload), attempts + 1)
+                for job_id, kind, payload, attempts in rows]
+
+    def complete(self, job_ids: List[int], worker: str,
+                 follow_up: Iterable[Tuple[str, dict, int]] = (),
+                 library_refresh: bool = False) -> int:
+        """
+        标记任务完成，并在同一事务中加入后续任务
+
+        Args:
+            job_ids: 任务Id列表
+            worker: 工作进程标识（只有仍持有租约的任务会被标记）
+            follow_up: 同一运行中的后续任务 (类型, 数据, 优先级)；没有任何任务被标记完成时不加入
+            library_refresh: 收尾时是否需要触发一次全库刷新（同上）
+
+        Returns:
+            标记为完成的任务数（租约已过期并被其他进程领取的任务不计入）
+        """
+        if not job_ids:
+            return 0
+        with self._write() as conn:
+            completed = 0
+            for job_id in job_ids:
+                cursor = conn.execute(
+                    'UPDATE jobs SET status = ?, lease_owner = NULL, lease_expires = NULL '
+                    'WHERE id = ? AND status = ? AND lease_owner = ?',
+                    (DONE, job_id, LEASED, worker)
+                )
+                completed += cursor.rowcount
+            if not completed:
+                # 租约已过期、任务已被其他进程领取，后续任务由该进程加入，避免重复刷新
+                return 0
+            run_id = conn.execute('SELECT run_id FROM jobs WHERE id = ?', (job_ids[0],)).fetchone()[0]
+            self._insert_jobs(conn, run_id, follow_up)
+            if library_refresh:
+                conn.execute('UPDATE runs SET needs_library_refresh = 1 WHERE id = ?', (run_id,))
+        return completed
+
+    def fail(self, job_ids: List[int], worker: str, error: str) -> int:
+        """
+        标记任务失败：尝试次数未用尽时延迟后重试，否则标记为最终失败
+
+        Returns:
+            标记为最终失败的任务数
+        """
+        now = time.time()
+        failed = 0
+        with self._write() as conn:
+            for job_id in job_ids:
+                row = conn.execute(
+                    'SELECT attempts FROM jobs WHERE id = ? AND status = ? AND lease_owner = ?',
+                    (job_id, LEASED, worker)
+                ).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0]
+                if attempts >= self.max_attempts:
+                    status, not_before = FAILED, 0
+                    failed += 1
+                else:
+                    status, not_before = PENDING, now + self.retry_delay * attempts
+                conn.execute(
+                    'UPDATE jobs SET status = ?, not_before = ?, last_error = ?, '
+                    'lease_owner = NULL, lease_expires = NULL WHERE id = ?',
+                    (status, not_before, error, job_id)
+                )
+        return failed
+
+    def counts(self, run_id: int) -> Dict[str, int]:
+        """各状态的任务数"""
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        for status, count in self._conn.execute(
+                'SELECT status, COUNT(*) FROM jobs WHERE run_id = ? GROUP BY status', (run_id,)):
+            counts[status] = count
+        return counts
+
+    def begin_finalize(self, run_id: int, worker: str) -> Optional[bool]:
+        """
+        尝试取得收尾权：所有任务都已完成或失败时，只有一个工作进程能取得
+        （取得收尾权的进程崩溃时，租约过期后可由其他进程接手）
+
+        Returns:
+            取得收尾权时返回是否需要全库刷新；未取得（仍有任务未结束或已由其他进程收尾）时返回None
+        """
+        now = time.time()
+        with self._write() as conn:
+            cursor = conn.execute(
+                'UPDATE runs SET status = ?, finalizer = ?, lease_expires = ? '
+                'WHERE id = ? AND (status = ? OR (status = ? AND lease_expires <= ?)) '
+                'AND NOT EXISTS (SELECT 1 FROM jobs WHERE run_id = ? AND status IN (?, ?))',
+                (RUN_FINALIZING, worker, now + self.lease_seconds,
+                 run_id, RUN_OPEN, RUN_FINALIZING, now, run_id, PENDING, LEASED)
+            )
+            if cursor.rowcount != 1:
+                return None
+            row = conn.execute('SELECT needs_library_refresh FROM runs WHERE id = ?', (run_id,)).fetchone()
+        return bool(row[0])
+
+    def finish_run(self, run_id: int):
+        """收尾完成，结束运行"""
+        with self._write() as conn:
+            conn.execute('UPDATE runs SET status = ?, lease_expires = NULL WHERE id = ?',
+                         (RUN_FINISHED, run_id))
+
+    def is_finished(self, run_id: int) -> bool:
+        """运行是否已结束"""
+        row = self._conn.execute('SELECT status FROM runs WHERE id = ?', (run_id,)).fetchone()
+        return row is None or row[0] == RUN_FINISHED
+
+    def payloads(self, run_id: int, kind: str, status: str = DONE) -> Iterator[dict]:
+        """逐个返回某类型、某状态任务的数据"""
+        for (payload,) in self._conn.execute(
+                'SELECT payload FROM jobs WHERE run_id = ? AND kind = ? AND status = ? ORDER BY id',
+                (run_id, kind, status)):
+            yield json.loads(payload)
+
+    def failures(self, run_id: int, limit: int = 20) -> List[Tuple[str, dict, str]]:
+        """最终失败的任务 (类型, 数据, 最后的错误)"""
+        return [(kind, json.loads(payload), error or '') for kind, payload, error in self._conn.execute(
+            'SELECT kind, payload, last_error FROM jobs WHERE run_id = ? AND status = ? ORDER BY id LIMIT ?',
+            (run_id, FAILED, limit))]
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK 的上下文管理器"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute('COMMIT')
+        else:
+            self.conn.execute('ROLLBACK')